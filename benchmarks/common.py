@@ -0,0 +1,53 @@
+"""
+Scaffolding shared by the benchmarks: the config, a temporary database file
+and the starting data.
+"""
+import os
+import tempfile
+import warnings
+from contextlib import contextmanager
+from decimal import Decimal
+
+from sqlalchemy.exc import SAWarning
+
+from config import Config
+from exchange.database import create_session
+from exchange.models import Base, Currency, User, Wallet
+
+
+class BenchmarkConfig(Config):
+    IS_RATE_CHANGER = False
+    RATE_LIMIT_ENABLED = False
+
+
+def ignore_decimal_warnings():
+    # SQLite doesn't store decimals natively, the warning would be repeated on every trade
+    warnings.filterwarnings('ignore', category=SAWarning)
+
+
+@contextmanager
+def temporary_database():
+    """URI of a file-backed SQLite database, the file is removed afterwards"""
+    db_fd, database_file = tempfile.mkstemp()
+    try:
+        yield f'sqlite:///{database_file}'
+    finally:
+        os.close(db_fd)
+        os.unlink(database_file)
+
+
+def prepare(app, users, currencies=1):
+    """
+    Fresh tables with currencies `currency1`... at the rate of 10
+    and users `user1`... with a balance of a million each
+    """
+    Base.metadata.drop_all(app.db_engine)
+    Base.metadata.create_all(app.db_engine)
+    with create_session() as session:
+        for id_ in range(1, currencies + 1):
+            session.add(
+                Currency(id=id_, name=f'currency{id_}', exchange_rate=Decimal('10'))
+            )
+        for id_ in range(1, users + 1):
+            session.add(User(id=id_, name=f'user{id_}'))
+            session.add(Wallet(id=id_, user_id=id_, balance=Decimal('1000000')))
@@ -0,0 +1,117 @@
+"""
+Payload size and encode time of the responses of the largest read endpoints,
+as JSON and CBOR, plain and compressed.
+
+    python -m benchmarks.encoding --currencies 100 --operations 100
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from exchange.encoding import available_encodings, cbor_dumps, compress
+from exchange.models import CurrencyOperationType
+from exchange.models_schema import (
+    CurrencyInWalletModel,
+    CurrencyOperationModel,
+    ExtendedCurrencyModel,
+    ResponseModel,
+    StatusType,
+    UserModel,
+    WalletModel,
+)
+
+LEVEL = 6
+
+
+def amount(rng):
+    # the columns keep 8 digits after the point
+    return Decimal(rng.randrange(1, 10**12)) / 10**8
+
+
+def payloads(currencies, operations):
+    rng = random.Random(42)
+    now = datetime(2024, 1, 1)
+    return {
+        'currency/all?extended': ResponseModel(
+            status=StatusType.OK,
+            data=[
+                ExtendedCurrencyModel(
+                    id=id_,
+                    name=f'currency{id_}',
+                    exchange_rate=amount(rng),
+                    buying_rate=amount(rng),
+                    selling_rate=amount(rng),
+                )
+                for id_ in range(1, currencies + 1)
+            ],
+        ),
+        'user/<name>': ResponseModel(
+            status=StatusType.OK,
+            data=UserModel(
+                id=1,
+                name='user',
+                registration_date=now,
+                wallet=WalletModel(
+                    balance=amount(rng),
+                    currencies=[
+                        CurrencyInWalletModel(
+                            currency_id=id_, currency_amount=amount(rng)
+                        )
+                        for id_ in range(1, currencies + 1)
+                    ],
+                ),
+            ),
+        ),
+        'user/<name>/operations': ResponseModel(
+            status=StatusType.OK,
+            data=[
+                CurrencyOperationModel(
+                    currency_id=rng.randrange(1, currencies + 1),
+                    wallet_id=1,
+                    type=rng.choice(list(CurrencyOperationType)),
+                    amount=amount(rng),
+                    exchange_rate=amount(rng),
+                    created_at=now + timedelta(seconds=i),
+                )
+                for i in range(operations)
+            ],
+        ),
+    }
+
+
+def measure(encode, number):
+    data = encode()
+    seconds = min(timeit.repeat(encode, number=number, repeat=5)) / number
+    return len(data), seconds * 10**6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--currencies', type=int, default=100)
+    parser.add_argument('--operations', type=int, default=100)
+    parser.add_argument('--number', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f'{"payload":<24} {"format":<12} {"bytes":>8} {"encode, us":>11}')
+    for name, model in payloads(args.currencies, args.operations).items():
+        formats = {
+            'json': lambda model=model: model.json().encode(),
+            'cbor': lambda model=model: cbor_dumps(model.dict()),
+        }
+        for format_name, encode in list(formats.items()):
+            for encoding in available_encodings():
+                formats[
+                    f'{format_name}+{encoding}'
+                ] = lambda encode=encode, encoding=encoding: compress(
+                    encode(), encoding, LEVEL
+                )
+
+        for format_name, encode in formats.items():
+            size, microseconds = measure(encode, args.number)
+            print(f'{name:<24} {format_name:<12} {size:>8} {microseconds:>11.0f}')
+
+
+if __name__ == '__main__':
+    main()
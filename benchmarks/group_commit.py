@@ -0,0 +1,77 @@
+"""
+Trades per second against a file-backed SQLite database by number of threads,
+with group commit off and on.
+
+    python -m benchmarks.group_commit --threads 1 2 4 8 16 --seconds 5
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (
+    BenchmarkConfig,
+    ignore_decimal_warnings,
+    prepare,
+    temporary_database,
+)
+from exchange import create_app
+from exchange.group_commit import GroupCommitter
+
+
+def trade_until(app, user_name, deadline):
+    client = app.test_client()
+    trades = 0
+    while time.monotonic() < deadline:
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'currency1',
+                'user_name': user_name,
+                'operation': 'buy',
+                'currency_amount': '0.01',
+                'exchange_rate': '10',
+            },
+        )
+        assert response.status_code == 200, response.get_json()
+        trades += 1
+    return trades
+
+
+def measure(app, threads, seconds):
+    prepare(app, threads)
+    deadline = time.monotonic() + seconds
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [
+            executor.submit(trade_until, app, f'user{i}', deadline)
+            for i in range(1, threads + 1)
+        ]
+    return sum(future.result() for future in futures) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument(
+        '--window', type=float, default=BenchmarkConfig.GROUP_COMMIT_WINDOW
+    )
+    args = parser.parse_args()
+    ignore_decimal_warnings()
+
+    with temporary_database() as database_uri:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database_uri
+        app = create_app(BenchmarkConfig)
+
+        print(f'{"threads":>8} {"off, trades/s":>15} {"on, trades/s":>15}')
+        for threads in args.threads:
+            app.group_committer = None
+            off = measure(app, threads, args.seconds)
+            app.group_committer = GroupCommitter(
+                args.window, BenchmarkConfig.GROUP_COMMIT_MAX_SIZE
+            )
+            on = measure(app, threads, args.seconds)
+            print(f'{threads:>8} {off:>15.1f} {on:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Memory of a long-running process: trades through the app and rate changer ticks,
+with the resident set size, the memory traced by tracemalloc, the objects tracked
+by the garbage collector and the ORM instances still alive printed every
+`--every` steps. A flat profile means nothing is kept between requests and ticks.
+
+    python -m benchmarks.memory --trades 100000 --ticks 10000
+"""
+import argparse
+import gc
+import os
+import resource
+import tracemalloc
+
+from benchmarks.common import (
+    BenchmarkConfig,
+    ignore_decimal_warnings,
+    prepare,
+    temporary_database,
+)
+from exchange import create_app
+from exchange.database import remove_session
+from exchange.models import Base
+from exchange.rate_changer import RateChanger
+
+
+def rss_megabytes():
+    try:
+        with open('/proc/self/statm', encoding='ascii') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # the peak, in kilobytes on Linux, where the above works anyway
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def report(label, step):
+    gc.collect()
+    objects = gc.get_objects()
+    instances = sum(1 for obj in objects if isinstance(obj, Base))
+    traced, _ = tracemalloc.get_traced_memory()
+    print(
+        f'{label:>6} {step:>8} {rss_megabytes():>8.1f} {traced / 2**20:>10.2f} '
+        f'{len(objects):>10} {instances:>10}'
+    )
+
+
+def trade(client, step, users, currencies):
+    # every user buys a currency and sells it on the next round,
+    # so the holdings don't grow with the number of trades
+    user_number = step % users + 1
+    currency_number = step // users % currencies + 1
+    operation = 'sell' if step // (users * currencies) % 2 else 'buy'
+    response = client.post(
+        '/trade',
+        json={
+            'currency_name': f'currency{currency_number}',
+            'user_name': f'user{user_number}',
+            'operation': operation,
+            'currency_amount': '1',
+            # the rates only change after the trades
+            'exchange_rate': '10',
+        },
+    )
+    assert response.status_code == 200, response.get_json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trades', type=int, default=100_000)
+    parser.add_argument('--ticks', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--currencies', type=int, default=10)
+    parser.add_argument('--every', type=int, default=10_000)
+    args = parser.parse_args()
+    ignore_decimal_warnings()
+
+    with temporary_database() as database_uri:
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database_uri
+        app = create_app(BenchmarkConfig)
+        prepare(app, args.users, args.currencies)
+        try:
+            run(app, args)
+        finally:
+            app.db_engine.dispose()
+
+
+def run(app, args):
+    tracemalloc.start()
+    print(
+        f'{"phase":>6} {"step":>8} {"rss MB":>8} {"traced MB":>10} '
+        f'{"objects":>10} {"instances":>10}'
+    )
+    try:
+        client = app.test_client()
+        report('trades', 0)
+        for step in range(1, args.trades + 1):
+            trade(client, step - 1, args.users, args.currencies)
+            if step % args.every == 0:
+                report('trades', step)
+
+        changer = RateChanger(0, -10, 11, app.commission_schedule)
+        for step in range(1, args.ticks + 1):
+            # the body of the rate changer loop, without the sleep
+            changer.tick()
+            remove_session()
+            if step % args.every == 0:
+                report('ticks', step)
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
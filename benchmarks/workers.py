@@ -0,0 +1,122 @@
+"""
+Requests per second served by `exchange.server` by number of workers,
+against a file-backed SQLite database. Clients are separate processes, each one
+sending requests one after another: 4 reads of a currency for every trade.
+
+    python -m benchmarks.workers --workers 1 2 4 8 --clients 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from multiprocessing import Pool
+
+from benchmarks import common
+from benchmarks.common import ignore_decimal_warnings, prepare, temporary_database
+from exchange import create_app
+
+
+class BenchmarkConfig(common.BenchmarkConfig):
+    # the server is started in another process, which gets the database from here
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCHMARK_DATABASE_URI', '')
+
+
+def wait_until_up(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def send_requests(args):
+    base_url, user_name, deadline = args
+    trade = json.dumps(
+        {
+            'currency_name': 'currency1',
+            'user_name': user_name,
+            'operation': 'buy',
+            'currency_amount': '0.01',
+            'exchange_rate': '10',
+        }
+    ).encode()
+
+    requests = 0
+    while time.monotonic() < deadline:
+        if requests % 5 == 4:
+            request = urllib.request.Request(
+                f'{base_url}/trade',
+                data=trade,
+                headers={'Content-Type': 'application/json'},
+            )
+        else:
+            request = urllib.request.Request(f'{base_url}/currency/currency1')
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        requests += 1
+    return requests
+
+
+def measure(workers, clients, seconds, port):
+    app = create_app(BenchmarkConfig)
+    prepare(app, clients)
+    app.db_engine.dispose()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            '-W',
+            'ignore',
+            '-m',
+            'exchange.server',
+            '--workers',
+            str(workers),
+            '--port',
+            str(port),
+        ],
+        env={**os.environ, 'APP_CONFIG': 'benchmarks.workers.BenchmarkConfig'},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(f'{base_url}/currency/all')
+        deadline = time.monotonic() + seconds
+        with Pool(clients) as pool:
+            requests = pool.map(
+                send_requests,
+                [(base_url, f'user{i}', deadline) for i in range(1, clients + 1)],
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    return sum(requests) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+    ignore_decimal_warnings()
+
+    with temporary_database() as database_uri:
+        os.environ['BENCHMARK_DATABASE_URI'] = database_uri
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database_uri
+
+        print(f'{"workers":>8} {"requests/s":>12}')
+        for workers in args.workers:
+            rate = measure(workers, args.clients, args.seconds, args.port)
+            print(f'{workers:>8} {rate:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
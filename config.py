@@ -1,5 +1,6 @@
 from decimal import Decimal
 from pathlib import Path
+from typing import Optional
 
 
 basedir = Path(__file__).resolve().parent
@@ -13,19 +14,87 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{basedir / "data.db"}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     EXPIRE_ON_COMMIT = True
+    # isolation level of the connections, e.g. 'SERIALIZABLE', None for the driver's default
+    SQLALCHEMY_ISOLATION_LEVEL: Optional[str] = None
+    # a transaction which lost a race for a versioned row is run again this many times
+    TRANSACTION_RETRIES = 3
+    TRANSACTION_RETRY_BACKOFF = 0.005  # in seconds, doubled after every attempt
+    # read-only replicas for GET endpoints, empty means everything goes to the primary
+    SQLALCHEMY_REPLICA_URIS: tuple[str, ...] = ()
+    # how long reads of a user go to the primary after the user's own write
+    READ_YOUR_WRITES_SECONDS = 5
+    # users are hashed into this many slots of the shared registry of recent writes
+    READ_YOUR_WRITES_SLOTS = 4096
 
     # To generate a currency exchange rate
     MIN_EXCHANGE_RATE = 1
     MAX_EXCHANGE_RATE = 100
     COMMISSION_AMOUNT = Decimal('0.06')
+    # commissions of particular currencies by name, instead of COMMISSION_AMOUNT
+    CURRENCY_COMMISSIONS: dict[str, Decimal] = {}
+    # (lowest exchange rate, commission) for currencies without their own commission
+    COMMISSION_TIERS: tuple[tuple[Decimal, Decimal], ...] = ()
+    # seed for the generated rates, None means they are different on every run
+    MARKET_SEED: Optional[int] = None
 
     # To automatically rate change
     IS_RATE_CHANGER = True
-    CHANGER_SLEEP_TIME = 10  # in seconds
+    CHANGER_SLEEP_TIME: float = 10  # in seconds, between the starts of ticks
     CHANGER_LOWER_BOUND = -10  # in percent, "-" means cost reduction
     # In general, the exchange rate increases over time, so we model this behaviour a bit
     CHANGER_UPPER_BOUND = 11  # in percent
 
+    # rows fetched from the database at a time by the operations export
+    EXPORT_CHUNK_SIZE = 1000
+    # rows fetched and sent at a time by the NDJSON list endpoints
+    STREAM_CHUNK_SIZE = 500
+    # responses of at least this many bytes are compressed for clients accepting
+    # gzip, or zstd if `zstandard` is installed; None turns compression off
+    COMPRESSION_MIN_SIZE: Optional[int] = 1024
+    COMPRESSION_LEVEL = 6
+
+    # 'sql' makes every trade a database transaction, 'memory' keeps the wallets
+    # in memory and makes trades durable with a journal file, for a single worker only
+    WALLET_ENGINE = 'sql'
+    WALLET_JOURNAL_PATH = basedir / 'wallets.journal'
+    # how long the journal waits for more trades to fsync them together, in seconds
+    JOURNAL_SYNC_INTERVAL = 0.001
+    # journal records written to the database tables at once
+    JOURNAL_COMPACT_EVERY = 10000
+
+    # concurrent trades arriving within the window share one commit
+    GROUP_COMMIT_ENABLED = False
+    GROUP_COMMIT_WINDOW = 0.002  # in seconds
+    GROUP_COMMIT_MAX_SIZE = 64
+
+    # background jobs, see /admin/jobs
+    JOB_WORKERS = 2
+    # maintenance jobs process rows in chunks, each in its own transaction,
+    # and pause between them to leave the database to the live traffic
+    JOB_CHUNK_SIZE = 500
+    JOB_CHUNK_PAUSE = 0.05  # in seconds
+
+    # user and currency names whose ids are kept in memory
+    NAME_CACHE_SIZE = 10000
+
+    # a wallet is snapshotted once it has this many operations since the last snapshot
+    SNAPSHOT_EVERY_OPERATIONS = 100
+
+    # token buckets for /trade: (tokens per second, burst size)
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_PER_USER = (5, 10)
+    RATE_LIMIT_PER_IP = (20, 40)
+    # 'memory' for buckets of one process, 'shared' for all workers forked from it
+    RATE_LIMIT_BACKEND = 'memory'
+    RATE_LIMIT_SHARED_SLOTS = 4096
+
+    # bearer token for the admin endpoints, None keeps them closed
+    ADMIN_TOKEN: Optional[str] = None
+    # /debug/profile and /debug/routes, for admins only
+    PROFILER_ENABLED = False
+    PROFILER_INTERVAL = 0.005  # between samples, in seconds
+    PROFILER_MAX_SECONDS = 60
+
     DEFAULT_CURRENCIES = ('bitcoin', 'ethereum', 'ripple', 'monero', 'cardano')
 
 
@@ -37,4 +106,15 @@ class TestConfig(Config):
     TESTING = True
     EXPIRE_ON_COMMIT = False
     IS_RATE_CHANGER = False
+    RATE_LIMIT_ENABLED = False
+    ADMIN_TOKEN = 'admin-token'
+    PROFILER_ENABLED = True
+    JOB_CHUNK_PAUSE = 0
     SERVER_NAME = 'localhost.localdomain'
+
+
+class SimulatorConfig(Config):
+    # the simulator ticks the rate changer itself, without waiting
+    IS_RATE_CHANGER = False
+    EXPIRE_ON_COMMIT = False
+    RATE_LIMIT_ENABLED = False
@@ -4,19 +4,34 @@ from typing import Optional, Type
 from flask import Flask, current_app
 
 from config import Config
-from exchange.commands import init_db_command
+from exchange import (
+    group_commit,
+    jobs,
+    name_cache,
+    quotes,
+    rate_changer,
+    rate_limiter,
+    wallet_engine,
+)
+from exchange.admin import admin_bp
+from exchange.commands import (
+    archive_operations_command,
+    export_operations_command,
+    init_db_command,
+    snapshot_balances_command,
+    upgrade_db_command,
+)
 from exchange.database import init_app
-from exchange.rate_changer import RateChanger
+from exchange.history import history_bp
+from exchange.models import market_random
+from exchange.profiling import debug_bp
+from exchange.rate_changer import create_rate_changer
 from exchange.routes import view_bp
+from exchange.trading import trading_bp
 
 
 def start_rate_changer() -> None:
-    app_rate_changer = RateChanger(
-        current_app.config['CHANGER_SLEEP_TIME'],
-        current_app.config['CHANGER_LOWER_BOUND'],
-        current_app.config['CHANGER_UPPER_BOUND'],
-    )
-    app_rate_changer.start()
+    create_rate_changer(current_app).start()
 
 
 # Using "Optional" because config could be None; "Type[]" to accept subclasses
@@ -29,10 +44,29 @@ def create_app(config: Optional[Type[Config]] = None) -> Flask:
         app.config.from_object(config)
 
     init_app(app)
+    rate_limiter.init_app(app)
+    wallet_engine.init_app(app)
+    group_commit.init_app(app)
+    quotes.init_app(app)
+    name_cache.init_app(app)
+    jobs.init_app(app)
+    rate_changer.init_app(app)
+
+    if app.config['MARKET_SEED'] is not None:
+        market_random.seed(app.config['MARKET_SEED'])
 
     app.register_blueprint(view_bp)
+    app.register_blueprint(trading_bp)
+    app.register_blueprint(history_bp)
+    app.register_blueprint(admin_bp)
+    if app.config['PROFILER_ENABLED']:
+        app.register_blueprint(debug_bp)
 
     app.cli.add_command(init_db_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(export_operations_command)
+    app.cli.add_command(snapshot_balances_command)
+    app.cli.add_command(archive_operations_command)
 
     if app.config['IS_RATE_CHANGER']:
         app.before_first_request_funcs.append(start_rate_changer)
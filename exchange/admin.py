@@ -0,0 +1,140 @@
+from http import HTTPStatus
+
+from flask import Blueprint
+from flask import current_app as app
+from flask_pydantic import validate
+
+# registers the maintenance jobs
+import exchange.maintenance  # noqa: F401  # pylint: disable=unused-import
+from exchange.auth import admin_required
+from exchange.database import create_session
+from exchange.models import Job
+from exchange.models_schema import (
+    JobModel,
+    JobQueryModel,
+    RequestJobModel,
+    ResponseModel,
+    StatusType,
+)
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+@admin_bp.route('/jobs', methods=['POST'])
+@admin_required
+@validate()
+def submit_job(body: RequestJobModel) -> tuple[ResponseModel, int]:
+    scheduler = app.job_scheduler  # type: ignore
+
+    error = scheduler.check_params(body.name, body.params)
+    if error is not None:
+        return (
+            ResponseModel(
+                status=StatusType.ERROR,
+                error=error,
+            ),
+            HTTPStatus.BAD_REQUEST,
+        )
+
+    job = scheduler.submit(body.name, body.params)
+
+    return (
+        ResponseModel(
+            status=StatusType.OK,
+            data=JobModel.from_orm(job),
+        ),
+        HTTPStatus.ACCEPTED,
+    )
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_required
+@validate()
+def get_jobs(query: JobQueryModel) -> tuple[ResponseModel, int]:
+    with create_session() as session:
+        jobs = session.query(Job).order_by(Job.id.desc()).limit(query.limit)
+
+        return (
+            ResponseModel(
+                status=StatusType.OK,
+                data=list(map(JobModel.from_orm, jobs)),
+            ),
+            HTTPStatus.OK,
+        )
+
+
+@admin_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+@validate()
+def get_job(job_id: int) -> tuple[ResponseModel, int]:
+    with create_session() as session:
+        job = session.get(Job, job_id)
+
+        if job is None:
+            return (
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='There is no such job!',
+                ),
+                HTTPStatus.NOT_FOUND,
+            )
+
+        return (
+            ResponseModel(
+                status=StatusType.OK,
+                data=JobModel.from_orm(job),
+            ),
+            HTTPStatus.OK,
+        )
+
+
+def rate_changer_not_found() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='The rate changer is not enabled!',
+        ),
+        HTTPStatus.NOT_FOUND,
+    )
+
+
+# The state is in shared memory: with the multi-process server every worker shows
+# and controls the rate changer running in a process of its own.
+
+
+@admin_bp.route('/rate_changer', methods=['GET'])
+@admin_required
+@validate()
+def get_rate_changer() -> tuple[ResponseModel, int]:
+    if not app.config['IS_RATE_CHANGER']:
+        return rate_changer_not_found()
+
+    return (
+        ResponseModel(
+            status=StatusType.OK,
+            data=app.rate_changer_state.model(),  # type: ignore
+        ),
+        HTTPStatus.OK,
+    )
+
+
+@admin_bp.route('/rate_changer/<any(pause, resume):action>', methods=['POST'])
+@admin_required
+@validate()
+def control_rate_changer(action: str) -> tuple[ResponseModel, int]:
+    if not app.config['IS_RATE_CHANGER']:
+        return rate_changer_not_found()
+
+    state = app.rate_changer_state  # type: ignore
+    if action == 'pause':
+        state.pause()
+    else:
+        state.resume()
+
+    return (
+        ResponseModel(
+            status=StatusType.OK,
+            data=state.model(),
+        ),
+        HTTPStatus.OK,
+    )
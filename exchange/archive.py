@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import func, insert, select, union_all
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.sql.selectable import Subquery
+
+from exchange.models import CurrencyOperation, CurrencyOperationArchive
+
+OPERATION_COLUMNS = (
+    'id',
+    'currency_id',
+    'wallet_id',
+    'type',
+    'amount',
+    'exchange_rate',
+    'created_at',
+)
+
+
+def all_operations(where: Callable[[Any], list[ColumnElement]]) -> Subquery:
+    """
+    Operations of both the main and the archive table, as one table with the columns
+    of an operation. `where` gives the conditions for a table, they are applied
+    to each one separately so their indexes can be used.
+    """
+    return union_all(
+        *(
+            select(*(getattr(table, column) for column in OPERATION_COLUMNS)).where(
+                *where(table)
+            )
+            for table in (CurrencyOperation, CurrencyOperationArchive)
+        )
+    ).subquery('operation')
+
+
+def archivable_operations(session: Session, before: datetime) -> Query:
+    """
+    Ids of the operations made before the moment, except the last operation: SQLite
+    gives new rows the id after the greatest one in the table, and tables created
+    without AUTOINCREMENT would otherwise reuse the ids of archived operations.
+    """
+    last_id = session.query(func.max(CurrencyOperation.id)).scalar_subquery()
+    return session.query(CurrencyOperation.id).filter(
+        CurrencyOperation.created_at < before, CurrencyOperation.id < last_id
+    )
+
+
+def archive_chunk(session: Session, before: datetime, chunk_size: int) -> int:
+    """Moves up to `chunk_size` operations made before the moment, returns how many"""
+    operation_ids = [
+        operation_id
+        for operation_id, in archivable_operations(session, before)
+        .order_by(CurrencyOperation.id)
+        .limit(chunk_size)
+    ]
+    if not operation_ids:
+        return 0
+
+    columns = [getattr(CurrencyOperation, column) for column in OPERATION_COLUMNS]
+    session.execute(
+        insert(CurrencyOperationArchive).from_select(
+            OPERATION_COLUMNS,
+            select(*columns).where(CurrencyOperation.id.in_(operation_ids)),
+        )
+    )
+    session.query(CurrencyOperation).filter(
+        CurrencyOperation.id.in_(operation_ids)
+    ).delete(synchronize_session=False)
+
+    return len(operation_ids)
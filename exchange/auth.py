@@ -0,0 +1,42 @@
+import hmac
+from functools import wraps
+from http import HTTPStatus
+from typing import Any, Callable
+
+from flask import Response
+from flask import current_app as app
+from flask import request
+
+from exchange.models_schema import ResponseModel, StatusType
+
+
+def admin_required(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Lets through requests with `Authorization: Bearer <ADMIN_TOKEN>`,
+    nobody gets through while the token isn't configured. Put it above `validate`,
+    so the request isn't looked at before the caller is known.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = app.config['ADMIN_TOKEN']
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+
+        if (
+            token is None
+            or scheme.lower() != 'bearer'
+            or not hmac.compare_digest(credentials.encode(), token.encode())
+        ):
+            # a response of its own, `validate` is not there yet to serialize it
+            return Response(
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='Authentication required',
+                ).json(),
+                status=HTTPStatus.UNAUTHORIZED,
+                mimetype='application/json',
+            )
+
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -1,9 +1,21 @@
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
 import click
+import sqlalchemy as sa
 from flask import Flask, current_app
 from flask.cli import with_appcontext
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
 
-from exchange.database import create_session
+from exchange.archive import archive_chunk
+from exchange.database import create_read_session, create_session
+from exchange.export import OperationsExport
 from exchange.models import Base, Currency
+from exchange.rate_version import bump_rate_version
+from exchange.snapshots import snapshot_wallets
 
 
 def fill_db(app: Flask) -> None:
@@ -17,6 +29,8 @@ def fill_db(app: Flask) -> None:
             currency = Currency(name=currency_name, exchange_rate=exchange_rate)
             session.add(currency)
 
+    bump_rate_version()
+
 
 @click.command('init_db')
 @with_appcontext
@@ -24,3 +38,163 @@ def init_db_command() -> None:
     app = current_app
     Base.metadata.create_all(app.db_engine)  # type: ignore
     fill_db(app)
+
+
+def _column_definition(connection: Connection, column: sa.Column) -> str:
+    default = column.server_default
+    if (
+        connection.dialect.name == 'sqlite'
+        and isinstance(default, sa.DefaultClause)
+        and not isinstance(default.arg, str)
+    ):
+        # SQLite only adds columns with a constant default: the existing rows get
+        # the value the expression has now, as they would on other databases
+        value = connection.execute(
+            sa.select(sa.type_coerce(default.arg, sa.String))
+        ).scalar()
+        column = sa.Column(
+            column.name, column.type, nullable=column.nullable, server_default=value
+        )
+    return str(CreateColumn(column).compile(dialect=connection.dialect))
+
+
+def upgrade_schema(engine: Engine) -> list[str]:
+    """
+    Creates the missing tables and adds the missing columns to the existing ones,
+    returns the added columns as "table.column". Nothing is changed if a column
+    can't be added.
+    """
+    with engine.begin() as connection:
+        inspector = sa.inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        missing: list[sa.Column] = []
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing.extend(
+                column for column in table.columns if column.name not in existing
+            )
+        for column in missing:
+            # the existing rows need a value
+            if not column.nullable and column.server_default is None:
+                raise click.ClickException(
+                    f'{column.table.name}.{column.name} can not be added '
+                    f'to the existing rows, it has no server default'
+                )
+
+        Base.metadata.create_all(connection)
+        for column in missing:
+            definition = _column_definition(connection, column)
+            connection.execute(
+                sa.text(f'ALTER TABLE {column.table.name} ADD COLUMN {definition}')
+            )
+
+    return [f'{column.table.name}.{column.name}' for column in missing]
+
+
+@click.command('upgrade_db')
+@with_appcontext
+def upgrade_db_command() -> None:
+    """Brings a database created by an older version up to the models"""
+    added = upgrade_schema(current_app.db_engine)  # type: ignore
+    click.echo(f'Added columns: {", ".join(added)}' if added else 'Up to date')
+
+
+def read_export_state(state_file: Path) -> tuple[int, Optional[int]]:
+    """
+    The id of the last exported operation and the size of the output file
+    after the export, None for a state file without it.
+    """
+    values = state_file.read_text().split()
+    return int(values[0]), int(values[1]) if len(values) > 1 else None
+
+
+@click.command('export-operations')
+@click.argument('output', type=click.Path(dir_okay=False, path_type=Path))
+@click.option(
+    '--incremental',
+    is_flag=True,
+    help='Append only the operations added since the previous export.',
+)
+@click.option('--chunk-size', type=int, default=None, help='Rows fetched at a time.')
+@with_appcontext
+def export_operations_command(
+    output: Path, incremental: bool, chunk_size: Optional[int]
+) -> None:
+    # the last exported id and the size of the file are kept next to the output file
+    state_file = output.with_name(f'{output.name}.last_id')
+    after_id, size = 0, None
+    if incremental and state_file.exists():
+        after_id, size = read_export_state(state_file)
+
+    # A full export is written aside and renamed over the output once complete.
+    # An incremental one is appended: a part left by a run which crashed is cut off
+    # first, and on errors the file is cut back to where this run started.
+    target = output if incremental else output.with_name(f'{output.name}.tmp')
+    with create_read_session() as session, target.open(
+        'ab' if incremental else 'wb'
+    ) as file:
+        if size is not None and file.tell() > size:
+            file.truncate(size)
+        start = file.tell()
+
+        export = OperationsExport(
+            session,
+            after_id,
+            chunk_size or current_app.config['EXPORT_CHUNK_SIZE'],
+            # the header is written only once, at the beginning of the file
+            header=start == 0,
+        )
+        try:
+            for chunk in export:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.truncate(start)
+            raise
+        size = file.tell()
+
+    if not incremental:
+        os.replace(target, output)
+    state_file.write_text(f'{export.last_id} {size}')
+    click.echo(f'Exported operations up to id {export.last_id} to {output}')
+
+
+@click.command('snapshot-balances')
+@click.option(
+    '--every',
+    type=int,
+    default=None,
+    help='Snapshot wallets with at least this many operations since the last one.',
+)
+@with_appcontext
+def snapshot_balances_command(every: Optional[int]) -> None:
+    count = snapshot_wallets(every or current_app.config['SNAPSHOT_EVERY_OPERATIONS'])
+    click.echo(f'Took {count} wallet snapshots')
+
+
+@click.command('archive-operations')
+@click.option(
+    '--older-than-days',
+    type=int,
+    default=90,
+    help='Move operations made earlier than that many days ago.',
+)
+@click.option('--chunk-size', type=int, default=None, help='Rows moved at a time.')
+@with_appcontext
+def archive_operations_command(older_than_days: int, chunk_size: Optional[int]) -> None:
+    before = datetime.now() - timedelta(days=older_than_days)
+    chunk_size = chunk_size or current_app.config['JOB_CHUNK_SIZE']
+
+    archived = 0
+    while True:
+        # a transaction per chunk, so trades are not held off for long
+        with create_session() as session:
+            count = archive_chunk(session, before, chunk_size)
+        if not count:
+            break
+        archived += count
+
+    click.echo(f'Archived {archived} operations')
@@ -0,0 +1,20 @@
+import random
+import time
+from typing import Callable, TypeVar
+
+from sqlalchemy.orm.exc import StaleDataError
+
+T = TypeVar('T')
+
+
+def retry_on_conflict(run: Callable[[], T], retries: int, backoff: float) -> T:
+    """
+    Runs the transaction again if it lost a race for a row, up to `retries` times,
+    waiting a random part of `backoff` seconds, doubled after every attempt.
+    """
+    for attempt in range(retries):
+        try:
+            return run()
+        except StaleDataError:
+            time.sleep(random.uniform(0, backoff * 2**attempt))
+    return run()
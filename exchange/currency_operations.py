@@ -1,24 +1,98 @@
-from decimal import Decimal
+from decimal import ROUND_DOWN, Decimal
 from http import HTTPStatus
 
-from flask import current_app as app
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import ColumnElement
 
 from exchange.models import (
     Currency,
     CurrencyInWallet,
     CurrencyOperation,
     CurrencyOperationType,
-    User,
+    Wallet,
 )
-from exchange.models_schema import ResponseModel, StatusType
+from exchange.models_schema import ResponseModel, StatusType, SwapResultModel
+from exchange.quotes import Quote, get_quote
+
+# amounts are stored with 8 decimal places
+AMOUNT_PRECISION = Decimal('0.00000001')
+
+
+class TradeFailed(Exception):
+    """
+    A step of a trade failed after an earlier one was made: raised so the transaction
+    is rolled back as a whole, `response` says why.
+    """
+
+    def __init__(self, response: tuple[ResponseModel, int]):
+        super().__init__(response[0].error)
+        self.response = response
+
+
+def outdated_rate_error() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='You are trying to perform an operation '
+            'at an outdated exchange rate, please try again.',
+        ),
+        HTTPStatus.CONFLICT,
+    )
+
+
+def too_small_error() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='The amount is too small to be swapped',
+        ),
+        HTTPStatus.CONFLICT,
+    )
+
+
+def rate_unchanged(currency: Currency) -> ColumnElement:
+    """
+    Condition for the statement making a trade: the currency still has the version
+    its rate was read at. The check is a part of the write, so the row of the currency
+    isn't locked by trades, and a rate changed before the write fails the trade.
+    """
+    return (
+        select(Currency.version).where(Currency.id == currency.id).scalar_subquery()
+        == currency.version
+    )
+
+
+def rate_changed(session: Session, currency: Currency) -> bool:
+    version = session.query(Currency.version).filter(Currency.id == currency.id)
+    return version.scalar() != currency.version
+
+
+def expire_wallet(session: Session, wallet_id: int) -> None:
+    # a wallet loaded in the session doesn't know about the statements of the trade
+    wallet = session.identity_map.get(identity_key(Wallet, wallet_id))
+    if wallet is not None:
+        session.expire(wallet, ['balance', 'version', 'currencies'])
 
 
 def buy_currency(
-    session: Session, user: User, currency: Currency, currency_amount: Decimal
+    session: Session, wallet_id: int, currency: Currency, currency_amount: Decimal
 ) -> tuple[ResponseModel, int]:
-    exchange_rate = currency.generate_buying_rate(app.config['COMMISSION_AMOUNT'])
-    if user.wallet.balance < exchange_rate * currency_amount:
+    exchange_rate = get_quote(currency).buying_rate
+    cost = exchange_rate * currency_amount
+
+    # the check and the write in one statement, so no other trade can come in between
+    paid = session.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet_id, Wallet.balance >= cost, rate_unchanged(currency))
+        .values(balance=Wallet.balance - cost, version=Wallet.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if paid.rowcount != 1:
+        # only on failure, to tell the user why
+        if rate_changed(session, currency):
+            return outdated_rate_error()
         return (
             ResponseModel(
                 status=StatusType.ERROR,
@@ -27,32 +101,39 @@ def buy_currency(
             HTTPStatus.CONFLICT,
         )
 
-    user.wallet.balance -= exchange_rate * currency_amount
-
-    currency_operation = CurrencyOperation(
-        currency_id=currency.id,
-        wallet_id=user.wallet.id,
-        type=CurrencyOperationType.BUY,
-        amount=currency_amount,
+    added = session.execute(
+        update(CurrencyInWallet)
+        .where(
+            CurrencyInWallet.wallet_id == wallet_id,
+            CurrencyInWallet.currency_id == currency.id,
+        )
+        .values(
+            currency_amount=CurrencyInWallet.currency_amount + currency_amount,
+            version=CurrencyInWallet.version + 1,
+        )
+        .execution_options(synchronize_session=False)
     )
-    session.add(currency_operation)
+    # if we don't have yet this currency in the wallet; the update of the wallet
+    # holds off other trades of the wallet, so nobody else can add it meanwhile
+    if added.rowcount == 0:
+        session.add(
+            CurrencyInWallet(
+                currency_id=currency.id,
+                wallet_id=wallet_id,
+                currency_amount=currency_amount,
+            )
+        )
 
-    currency_in_wallet = (
-        session.query(CurrencyInWallet)
-        .filter(CurrencyInWallet.currency_id == currency.id)
-        .one_or_none()
-    )
-    # if we don't have yet this currency in the wallet
-    if currency_in_wallet is None:
-        currency_in_wallet = CurrencyInWallet(
+    session.add(
+        CurrencyOperation(
             currency_id=currency.id,
-            wallet_id=user.wallet.id,
-            currency_amount=currency_amount,
+            wallet_id=wallet_id,
+            type=CurrencyOperationType.BUY,
+            amount=currency_amount,
+            exchange_rate=exchange_rate,
         )
-        session.add(currency_in_wallet)
-    # if we have this currency in the wallet just update its amount
-    else:
-        currency_in_wallet.currency_amount += currency_amount
+    )
+    expire_wallet(session, wallet_id)
 
     return (
         ResponseModel(
@@ -63,48 +144,82 @@ def buy_currency(
 
 
 def sell_currency(
-    session: Session, user: User, currency: Currency, currency_amount: Decimal
+    session: Session, wallet_id: int, currency: Currency, currency_amount: Decimal
 ) -> tuple[ResponseModel, int]:
-    exchange_rate = currency.generate_selling_rate(app.config['COMMISSION_AMOUNT'])
-
-    # check if such cryptocurrency exists in the wallet
-    for currency_in_wallet in user.wallet.currencies:
-        if currency_in_wallet.currency_id == currency.id:
-            current_currency = currency_in_wallet
-            break
-    else:
-        return (
-            ResponseModel(
-                status=StatusType.ERROR,
-                error='You do not have that currency',
+    exchange_rate = get_quote(currency).selling_rate
+
+    holding = (
+        CurrencyInWallet.wallet_id == wallet_id,
+        CurrencyInWallet.currency_id == currency.id,
+    )
+    # Amounts are kept with 8 decimal places, but SQLite compares them as floats:
+    # anything closer than half of the last place to the whole holding sells all of it.
+    tolerance = AMOUNT_PRECISION / 2
+
+    # the row can't be left with a zero amount, so selling everything deletes it
+    sold = session.execute(
+        delete(CurrencyInWallet)
+        .where(
+            *holding,
+            CurrencyInWallet.currency_amount.between(
+                currency_amount - tolerance, currency_amount + tolerance
             ),
-            HTTPStatus.CONFLICT,
+            rate_unchanged(currency),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if sold.rowcount == 0:
+        sold = session.execute(
+            update(CurrencyInWallet)
+            .where(
+                *holding,
+                CurrencyInWallet.currency_amount > currency_amount + tolerance,
+                rate_unchanged(currency),
+            )
+            .values(
+                currency_amount=CurrencyInWallet.currency_amount - currency_amount,
+                version=CurrencyInWallet.version + 1,
+            )
+            .execution_options(synchronize_session=False)
         )
 
-    # check if the user have enough currency to sell
-    if current_currency.currency_amount >= currency_amount:
-        current_currency.currency_amount -= currency_amount
-        user.wallet.balance += exchange_rate * currency_amount
-    else:
+    if sold.rowcount != 1:
+        # only on failure, to tell the user why
+        if rate_changed(session, currency):
+            return outdated_rate_error()
+        has_currency = session.query(
+            session.query(CurrencyInWallet).filter(*holding).exists()
+        ).scalar()
         return (
             ResponseModel(
                 status=StatusType.ERROR,
-                error='You are trying to sell more currency than you have in your wallet',
+                error='You are trying to sell more currency than you have in your wallet'
+                if has_currency
+                else 'You do not have that currency',
             ),
             HTTPStatus.CONFLICT,
         )
 
-    # If the user runs out of such currency, delete the entry
-    if current_currency.currency_amount == Decimal('0'):
-        session.delete(current_currency)
+    session.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet_id)
+        .values(
+            balance=Wallet.balance + exchange_rate * currency_amount,
+            version=Wallet.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
 
-    currency_operation = CurrencyOperation(
-        currency_id=currency.id,
-        wallet_id=user.wallet.id,
-        type=CurrencyOperationType.SELL,
-        amount=currency_amount,
+    session.add(
+        CurrencyOperation(
+            currency_id=currency.id,
+            wallet_id=wallet_id,
+            type=CurrencyOperationType.SELL,
+            amount=currency_amount,
+            exchange_rate=exchange_rate,
+        )
     )
-    session.add(currency_operation)
+    expire_wallet(session, wallet_id)
 
     return (
         ResponseModel(
@@ -112,3 +227,58 @@ def sell_currency(
         ),
         HTTPStatus.OK,
     )
+
+
+def swap_amount(
+    from_quote: Quote, to_quote: Quote, currency_amount: Decimal
+) -> Decimal:
+    """Amount of the `to_quote` currency which can be bought for the sold `currency_amount`"""
+    proceeds = from_quote.selling_rate * currency_amount
+    return (proceeds / to_quote.buying_rate).quantize(
+        AMOUNT_PRECISION, rounding=ROUND_DOWN
+    )
+
+
+def swapped(
+    currency_amount: Decimal, bought_amount: Decimal
+) -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.OK,
+            data=SwapResultModel(
+                sold_amount=currency_amount, bought_amount=bought_amount
+            ),
+        ),
+        HTTPStatus.OK,
+    )
+
+
+def swap_currency(
+    session: Session,
+    wallet_id: int,
+    from_currency: Currency,
+    to_currency: Currency,
+    currency_amount: Decimal,
+) -> tuple[ResponseModel, int]:
+    """
+    Sells `currency_amount` of one currency and buys another one for all the proceeds,
+    both legs use the rates of the given currency objects.
+    """
+    bought_amount = swap_amount(
+        get_quote(from_currency), get_quote(to_currency), currency_amount
+    )
+
+    if bought_amount <= 0:
+        return too_small_error()
+
+    response = sell_currency(session, wallet_id, from_currency, currency_amount)
+    if response[0].status == StatusType.ERROR:
+        return response
+
+    # The amount was rounded down, so the proceeds are enough to pay for it,
+    # but the sold leg must never be committed alone.
+    response = buy_currency(session, wallet_id, to_currency, bought_amount)
+    if response[0].status == StatusType.ERROR:
+        raise TradeFailed(response)
+
+    return swapped(currency_amount, bought_amount)
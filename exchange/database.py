@@ -1,8 +1,12 @@
+import time
+import zlib
 from contextlib import contextmanager
-from typing import Any, Generator
+from itertools import count
+from multiprocessing import Array
+from typing import Any, Generator, Optional
 
-from flask import Flask
-from sqlalchemy import create_engine
+from flask import Flask, current_app
+from sqlalchemy import create_engine, orm
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 # здесь не мог сделать инициализацию, потому что не было доступно приложение
@@ -10,6 +14,9 @@ session_factory = sessionmaker()
 # for thread safety
 Session = scoped_session(session_factory)
 
+# round-robin over replica engines
+_replica_counter = count()
+
 
 # generator typing 1) the type returned with each iteration,
 # 2) the type that the generator will receive (send method),
@@ -28,7 +35,100 @@ def create_session() -> Generator[scoped_session, None, None]:
         new_session.close()
 
 
+@contextmanager
+def create_independent_session() -> Generator[orm.Session, None, None]:
+    """
+    Like `create_session`, but not the session of the current thread,
+    so it can be used while that one is open.
+    """
+    new_session = session_factory()
+
+    try:
+        yield new_session
+        new_session.commit()
+    except Exception:
+        new_session.rollback()
+        raise
+    finally:
+        new_session.close()
+
+
+class RecentWrites:
+    """
+    Monotonic times of the last writes made on behalf of users, reads for such users
+    go to the primary until the replicas catch up.
+
+    Kept in shared memory, so a read served by another worker than the write
+    still sees it. The table has a fixed number of `slots` and must be created before
+    the workers are forked. User names are hashed into slots, users sharing a slot
+    share the time, so a collision can only send a read to the primary needlessly,
+    never to a stale replica.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        # zero means no write
+        self._times = Array('d', slots)
+
+    def _slot(self, user_name: str) -> int:
+        return zlib.crc32(user_name.encode()) % self.slots
+
+    def mark(self, user_name: str, now: float) -> None:
+        slot = self._slot(user_name)
+        with self._times.get_lock():
+            self._times[slot] = max(self._times[slot], now)
+
+    def written_at(self, user_name: str) -> float:
+        return self._times[self._slot(user_name)]  # type: ignore
+
+
+def mark_user_write(user_name: str) -> None:
+    current_app.recent_writes.mark(user_name, time.monotonic())  # type: ignore
+
+
+def has_recent_write(user_name: str) -> bool:
+    window = current_app.config['READ_YOUR_WRITES_SECONDS']
+    written_at = current_app.recent_writes.written_at(user_name)  # type: ignore
+    return written_at != 0 and time.monotonic() - written_at < window
+
+
+@contextmanager
+def create_read_session(
+    user_name: Optional[str] = None,
+) -> Generator[orm.Session, None, None]:
+    """
+    Session for read-only work. Uses one of the replicas if any are configured,
+    except for the user who has just written something (read-your-writes).
+    """
+    replica_engines = current_app.replica_engines  # type: ignore
+
+    if not replica_engines or (user_name is not None and has_recent_write(user_name)):
+        with create_session() as session:
+            yield session
+        return
+
+    engine = replica_engines[next(_replica_counter) % len(replica_engines)]
+    replica_session = session_factory(bind=engine)
+
+    try:
+        yield replica_session
+    finally:
+        replica_session.close()
+
+
+def remove_session(_exception: Optional[BaseException] = None) -> None:
+    """
+    Closes the session of the current thread and drops it from the registry,
+    so nothing loaded by the thread outlives its work: long-running threads call
+    it after every unit of work, the rest get it when their app context ends.
+    """
+    Session.remove()
+
+
 def init_app(app: Flask, **kwargs: Any) -> Flask:
+    if app.config['SQLALCHEMY_ISOLATION_LEVEL'] is not None:
+        kwargs.setdefault('isolation_level', app.config['SQLALCHEMY_ISOLATION_LEVEL'])
+
     db_engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], **kwargs)  # type: ignore
 
     # bind database engine using by our app to our session factory
@@ -37,7 +137,13 @@ def init_app(app: Flask, **kwargs: Any) -> Flask:
         expire_on_commit=app.config['EXPIRE_ON_COMMIT'],
     )
 
+    app.teardown_appcontext(remove_session)
+
     app.db_engine = db_engine  # type: ignore
+    app.recent_writes = RecentWrites(app.config['READ_YOUR_WRITES_SLOTS'])  # type: ignore
+    app.replica_engines = [  # type: ignore
+        create_engine(uri, **kwargs) for uri in app.config['SQLALCHEMY_REPLICA_URIS']
+    ]
 
     # ??
     return app
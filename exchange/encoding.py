@@ -0,0 +1,215 @@
+import gzip
+import struct
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from functools import wraps
+from typing import Any, Callable, Optional, Sequence
+
+from flask import Response, after_this_request
+from flask import current_app as app
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+CBOR_MIMETYPE = 'application/cbor'
+
+
+def prefers(mimetype: str) -> bool:
+    """Whether the client accepts `mimetype` rather than JSON"""
+    # plain JSON stays the default, also for clients sending "Accept: */*"
+    best = request.accept_mimetypes.best_match(['application/json', mimetype])
+    return best == mimetype
+
+
+def _head(major_type: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([major_type << 5 | value])
+    for additional_info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+        if value < 1 << 8 * size:
+            return bytes([major_type << 5 | additional_info]) + value.to_bytes(
+                size, 'big'
+            )
+    raise ValueError(f'{value} does not fit in 64 bits')
+
+
+def _encode_int(value: int, chunks: list[bytes]) -> None:
+    major_type, value = (0, value) if value >= 0 else (1, -1 - value)
+    if value < 1 << 64:
+        chunks.append(_head(major_type, value))
+        return
+    # bignum, tag 2 for positive and 3 for negative numbers
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    chunks.append(_head(6, 2 + major_type) + _head(2, len(data)) + data)
+
+
+def _encode_decimal(value: Decimal, chunks: list[bytes]) -> None:
+    if not value.is_finite():
+        _encode(float(value), chunks)
+        return
+    # decimal fraction, tag 4: [exponent, mantissa], so no precision is lost
+    sign, digits, exponent = value.as_tuple()
+    mantissa = int(''.join(map(str, digits)))
+    chunks.append(_head(6, 4) + _head(4, 2))
+    _encode_int(exponent, chunks)  # type: ignore
+    _encode_int(-mantissa if sign else mantissa, chunks)
+
+
+def _encode_none(_value: None, chunks: list[bytes]) -> None:
+    chunks.append(b'\xf6')
+
+
+def _encode_bool(value: bool, chunks: list[bytes]) -> None:
+    chunks.append(b'\xf5' if value else b'\xf4')
+
+
+def _encode_enum(value: Enum, chunks: list[bytes]) -> None:
+    _encode(value.value, chunks)
+
+
+def _encode_float(value: float, chunks: list[bytes]) -> None:
+    chunks.append(b'\xfb' + struct.pack('>d', value))
+
+
+def _encode_str(value: str, chunks: list[bytes]) -> None:
+    data = value.encode()
+    chunks.append(_head(3, len(data)) + data)
+
+
+def _encode_bytes(value: bytes, chunks: list[bytes]) -> None:
+    chunks.append(_head(2, len(value)) + value)
+
+
+def _encode_datetime(value: datetime, chunks: list[bytes]) -> None:
+    # standard date/time string, tag 0
+    chunks.append(_head(6, 0))
+    _encode_str(value.isoformat(), chunks)
+
+
+def _encode_map(value: dict[Any, Any], chunks: list[bytes]) -> None:
+    chunks.append(_head(5, len(value)))
+    for key, item in value.items():
+        _encode(key, chunks)
+        _encode(item, chunks)
+
+
+def _encode_array(value: Sequence[Any], chunks: list[bytes]) -> None:
+    chunks.append(_head(4, len(value)))
+    for item in value:
+        _encode(item, chunks)
+
+
+# looked up along the MRO of the value, so bool comes before int
+# and the subclasses of the types are encoded like them
+_ENCODERS: dict[type, Callable[[Any, list[bytes]], None]] = {
+    type(None): _encode_none,
+    bool: _encode_bool,
+    Enum: _encode_enum,
+    int: _encode_int,
+    float: _encode_float,
+    Decimal: _encode_decimal,
+    str: _encode_str,
+    bytes: _encode_bytes,
+    datetime: _encode_datetime,
+    dict: _encode_map,
+    list: _encode_array,
+    tuple: _encode_array,
+}
+
+
+def _encode(value: Any, chunks: list[bytes]) -> None:
+    for cls in type(value).__mro__:
+        encoder = _ENCODERS.get(cls)
+        if encoder is not None:
+            encoder(value, chunks)
+            return
+    raise TypeError(f'{type(value).__name__} can not be encoded to CBOR')
+
+
+def cbor_dumps(value: Any) -> bytes:
+    """
+    Encodes the value to CBOR (RFC 8949). Decimals are decimal fractions:
+    the exponent and the scaled integer, e.g. 273.15 is [-2, 27315].
+    """
+    chunks: list[bytes] = []
+    _encode(value, chunks)
+    return b''.join(chunks)
+
+
+def cbor_negotiable(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Encodes the ResponseModel returned by the view to CBOR for clients asking for it,
+    the rest get JSON from `validate`, so it has to be put below it.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        @after_this_request
+        def add_vary(response: Response) -> Response:
+            response.vary.add('Accept')
+            return response
+
+        result = view(*args, **kwargs)
+        if not prefers(CBOR_MIMETYPE) or isinstance(result, Response):
+            return result
+
+        model, status = result
+        return Response(
+            cbor_dumps(model.dict()),
+            status=status,
+            mimetype=CBOR_MIMETYPE,
+        )
+
+    return wrapper
+
+
+def available_encodings() -> list[str]:
+    # in the order of preference
+    return ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'zstd':  # pragma: no cover
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    # without the modification time, so equal bodies are compressed equally
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _should_skip(response: Response) -> bool:
+    # streams are sent as they are produced, responses without a body have nothing
+    # to compress, and an encoded body isn't encoded twice
+    return (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in {204, 304}
+        or 'Content-Encoding' in response.headers
+    )
+
+
+def compress_response(response: Response) -> Response:
+    """Compresses large enough responses with the best encoding the client accepts"""
+    min_size: Optional[int] = app.config['COMPRESSION_MIN_SIZE']
+    if min_size is None or _should_skip(response):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding, app.config['COMPRESSION_LEVEL']))
+    response.headers['Content-Encoding'] = encoding
+    # the compressed body is still the same representation, conditional requests
+    # compare tags weakly, so the tag of the plain body keeps matching
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,62 @@
+import csv
+import io
+import zlib
+from typing import Any, Iterator
+
+from sqlalchemy.orm import Session
+
+from exchange.archive import OPERATION_COLUMNS, all_operations
+
+# zlib window size that makes the compressor produce a gzip container
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class OperationsExport:
+    """
+    Streams currency operations with id greater than `after_id` as gzipped CSV.
+
+    Rows are fetched from a server-side cursor `chunk_size` at a time and every chunk
+    is compressed as soon as it is read, so memory does not depend on the table size.
+    Each export is a complete gzip member, therefore incremental exports can be
+    appended to the same file. `last_id` holds the id of the last exported operation.
+    """
+
+    def __init__(
+        self, session: Session, after_id: int, chunk_size: int, header: bool = True
+    ):
+        self.session = session
+        self.last_id = after_id
+        self.chunk_size = chunk_size
+        self.header = header
+
+    def _rows(self) -> Iterator[Any]:
+        # archived operations included, they keep their ids
+        operations = all_operations(lambda table: [table.id > self.last_id])
+        return iter(
+            self.session.query(operations)
+            .order_by(operations.c.id)
+            .execution_options(stream_results=True)
+            .yield_per(self.chunk_size)
+        )
+
+    def __iter__(self) -> Iterator[bytes]:
+        compressor = zlib.compressobj(wbits=GZIP_WBITS)
+        text = io.StringIO()
+        writer = csv.writer(text)
+
+        if self.header:
+            writer.writerow(OPERATION_COLUMNS)
+
+        for number, row in enumerate(self._rows(), start=1):
+            writer.writerow((*row[:3], row.type.value, *row[4:]))
+            self.last_id = row.id
+
+            if number % self.chunk_size == 0:
+                compressed = compressor.compress(text.getvalue().encode())
+                text.seek(0)
+                text.truncate()
+                # the compressor buffers small inputs, an empty chunk would end the stream
+                if compressed:
+                    yield compressed
+
+        yield compressor.compress(text.getvalue().encode()) + compressor.flush()
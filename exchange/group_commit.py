@@ -0,0 +1,138 @@
+import time
+from threading import Event, Lock
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from flask import Flask, current_app
+from sqlalchemy.orm import Session
+
+from exchange.concurrency import retry_on_conflict
+from exchange.database import create_session
+
+T = TypeVar('T')
+
+
+class _Transaction(Generic[T]):
+    def __init__(self, work: Callable[[Session], T]):
+        self.work = work
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.is_leader = False
+        # set when the transaction is done or its caller has to lead the next group
+        self.ready = Event()
+
+
+class GroupCommitter:
+    """
+    Shares one commit between transactions arriving at about the same time.
+
+    The caller finding no group in progress becomes the leader: it waits `window`
+    seconds for others to queue up, runs all the queued work in one session and
+    commits once, then hands the leadership over to the first caller which came
+    in the meantime. If anything in the group fails, every transaction of the group
+    is run again in its own session, so each caller gets its own result or error.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._queue: list[_Transaction[Any]] = []
+        self._has_leader = False
+        self._lock = Lock()
+
+    def run(self, work: Callable[[Session], T]) -> T:
+        transaction = _Transaction(work)
+
+        with self._lock:
+            self._queue.append(transaction)
+            if not self._has_leader:
+                self._has_leader = transaction.is_leader = True
+
+        if not transaction.is_leader:
+            transaction.ready.wait()
+
+        if transaction.is_leader:
+            self._lead()
+
+        if transaction.error is not None:
+            raise transaction.error
+        return transaction.result  # type: ignore
+
+    def _lead(self) -> None:
+        time.sleep(self.window)
+
+        with self._lock:
+            group = self._queue[: self.max_size]
+            del self._queue[: self.max_size]
+
+        try:
+            self._commit(group)
+        finally:
+            with self._lock:
+                if self._queue:
+                    self._queue[0].is_leader = True
+                    self._queue[0].ready.set()
+                else:
+                    self._has_leader = False
+
+            for transaction in group:
+                transaction.is_leader = False
+                transaction.ready.set()
+
+    @staticmethod
+    def _commit(group: list[_Transaction[Any]]) -> None:
+        try:
+            with create_session() as session:
+                for transaction in group:
+                    transaction.result = transaction.work(session)
+                    session.flush()
+            return
+        except Exception as e:  # pylint: disable=broad-except
+            if len(group) == 1:
+                group[0].error = e
+                return
+
+        # one of the transactions spoiled the whole group, run them one by one
+        for transaction in group:
+            transaction.result = None
+            try:
+                with create_session() as session:
+                    transaction.result = transaction.work(session)
+            except Exception as e:  # pylint: disable=broad-except
+                transaction.error = e
+
+
+def run_transaction(work: Callable[[Session], T]) -> T:
+    """
+    Runs the work in a transaction, shared with others if group commit is on.
+    The work is run again from scratch if another transaction changed its rows.
+    """
+    committer = current_app.group_committer  # type: ignore
+
+    def run() -> T:
+        if committer is None:
+            with create_session() as session:
+                return work(session)
+        return committer.run(work)
+
+    return retry_on_conflict(
+        run,
+        current_app.config['TRANSACTION_RETRIES'],
+        current_app.config['TRANSACTION_RETRY_BACKOFF'],
+    )
+
+
+def init_app(app: Flask) -> Flask:
+    app.group_committer = None  # type: ignore
+
+    if app.config['GROUP_COMMIT_ENABLED']:
+        # A failed group is run again transaction by transaction, the engine would
+        # make the trades of the group which did go through a second time
+        if app.wallet_engine is not None:  # type: ignore
+            raise ValueError(
+                'Group commit can not be used with the in-memory wallet engine'
+            )
+        app.group_committer = GroupCommitter(  # type: ignore
+            app.config['GROUP_COMMIT_WINDOW'], app.config['GROUP_COMMIT_MAX_SIZE']
+        )
+
+    return app
@@ -0,0 +1,143 @@
+from http import HTTPStatus
+from typing import Iterator, Union
+
+from flask import Blueprint, Response
+from flask import current_app as app
+from flask import stream_with_context
+from flask_pydantic import validate
+from sqlalchemy.orm import Query, Session
+
+from exchange.archive import all_operations
+from exchange.auth import admin_required
+from exchange.database import create_read_session
+from exchange.encoding import cbor_negotiable, compress_response, prefers
+from exchange.export import OperationsExport
+from exchange.models_schema import (
+    BalanceQueryModel,
+    CurrencyOperationModel,
+    ExportQueryModel,
+    QueryModel,
+    ResponseModel,
+    StatusType,
+)
+from exchange.name_cache import user_ids
+from exchange.profiling import time_routes
+from exchange.snapshots import balance_at
+from exchange.streaming import NDJSON_MIMETYPE, ndjson_response
+from exchange.wallet_engine import compact_wallet_engine
+
+history_bp = Blueprint('history', __name__)
+time_routes(history_bp)
+history_bp.after_request(compress_response)
+
+
+@history_bp.route('/user/<user_name>/balance', methods=['GET'])
+@validate()
+@cbor_negotiable
+def get_user_balance_at(
+    user_name: str, query: BalanceQueryModel
+) -> tuple[ResponseModel, int]:
+    # the history is read from the tables, which the in-memory wallets are ahead of
+    compact_wallet_engine()
+
+    with create_read_session(user_name) as session:
+        ids = user_ids(session, user_name)
+
+        if ids is None:
+            return (
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='There is no such user!',
+                ),
+                HTTPStatus.NOT_FOUND,
+            )
+
+        wallet = balance_at(session, ids[1], query.at)
+
+        if wallet is None:
+            return (
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='There is no balance history for this moment!',
+                ),
+                HTTPStatus.NOT_FOUND,
+            )
+
+        return (
+            ResponseModel(
+                status=StatusType.OK,
+                data=wallet,
+            ),
+            HTTPStatus.OK,
+        )
+
+
+def query_operations(session: Session, wallet_id: int, query: QueryModel) -> Query:
+    # archived operations are older, so pages of the history go on into the archive
+    operations = all_operations(lambda table: [table.wallet_id == wallet_id])
+    return (
+        session.query(operations)
+        .order_by(operations.c.id)
+        .limit(query.limit)
+        .offset(query.limit * query.page)
+    )
+
+
+@history_bp.route('/user/<user_name>/operations', methods=['GET'])
+@validate()
+@cbor_negotiable
+def get_user_operations_info(
+    user_name: str, query: QueryModel
+) -> Union[tuple[ResponseModel, int], Response]:
+    compact_wallet_engine()
+
+    with create_read_session(user_name) as session:
+        ids = user_ids(session, user_name)
+
+        if ids is None:
+            return (
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='There is no such user!',
+                ),
+                HTTPStatus.NOT_FOUND,
+            )
+
+        _, wallet_id = ids
+
+        if not prefers(NDJSON_MIMETYPE):
+            operations = query_operations(session, wallet_id, query).all()
+
+            return (
+                ResponseModel(
+                    status=StatusType.OK,
+                    data=operations,
+                ),
+                HTTPStatus.OK,
+            )
+
+    # the user is checked before streaming, the status can't be changed afterwards
+    return ndjson_response(
+        lambda session: query_operations(session, wallet_id, query),
+        CurrencyOperationModel,
+        user_name,
+    )
+
+
+@history_bp.route('/operations/export', methods=['GET'])
+@admin_required
+@validate()
+def export_operations(query: ExportQueryModel) -> Response:
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+
+    def generate() -> Iterator[bytes]:
+        compact_wallet_engine()
+
+        with create_read_session() as session:
+            yield from OperationsExport(session, query.after_id, chunk_size)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': 'attachment; filename=operations.csv.gz'},
+    )
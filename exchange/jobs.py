@@ -0,0 +1,141 @@
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import sqlalchemy as sa
+from flask import Flask
+
+from exchange.database import create_independent_session
+from exchange.models import Job, JobStatus
+
+# job name -> function taking a JobContext and the params of the job
+JOBS: dict[str, Callable[..., None]] = {}
+
+
+def job(name: str) -> Callable[[Callable[..., None]], Callable[..., None]]:
+    def register(function: Callable[..., None]) -> Callable[..., None]:
+        JOBS[name] = function
+        return function
+
+    return register
+
+
+def update_job(job_id: int, **values: Any) -> None:
+    with create_independent_session() as session:
+        session.query(Job).filter(Job.id == job_id).update(
+            values, synchronize_session=False
+        )
+
+
+class JobContext:
+    """Passed to a running job to report its progress"""
+
+    def __init__(self, job_id: int, chunk_size: int, chunk_pause: float):
+        self.job_id = job_id
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.progress = 0
+
+    def set_total(self, total: int) -> None:
+        update_job(self.job_id, total=total)
+
+    def advance(self, count: int) -> None:
+        """Reports `count` more rows done and pauses before the next chunk"""
+        self.progress += count
+        update_job(self.job_id, progress=self.progress)
+        time.sleep(self.chunk_pause)
+
+
+class JobScheduler:
+    """
+    Runs jobs in a pool of threads of this process, each job has a row in the job table
+    with its status and progress. Jobs which haven't finished when the process stops
+    are not resumed, they are marked as failed when the app is created again.
+    """
+
+    def __init__(self, app: Flask, workers: int, chunk_size: int, chunk_pause: float):
+        self.app = app
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        # threads are started on the first submitted job
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='job')
+
+    @staticmethod
+    def check_params(name: str, params: dict[str, Any]) -> Optional[str]:
+        """Error message if there is no such job or it doesn't take these params"""
+        if name not in JOBS:
+            return 'There is no such job!'
+        try:
+            inspect.signature(JOBS[name]).bind(None, **params)
+        except TypeError as e:
+            return f'Wrong job params: {e}'
+        return None
+
+    def submit(self, name: str, params: dict[str, Any]) -> Job:
+        with create_independent_session() as session:
+            new_job = Job(name=name, params=params, status=JobStatus.QUEUED)
+            session.add(new_job)
+            session.flush()
+            # the job may start running before the caller reads it
+            session.refresh(new_job)
+            session.expunge(new_job)
+
+        self._executor.submit(self._run, new_job.id, name, params)
+        return new_job
+
+    def _run(self, job_id: int, name: str, params: dict[str, Any]) -> None:
+        with self.app.app_context():
+            update_job(job_id, status=JobStatus.RUNNING, started_at=datetime.now())
+            try:
+                JOBS[name](
+                    JobContext(job_id, self.chunk_size, self.chunk_pause), **params
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                self.app.logger.exception('Job %s (%s) failed', job_id, name)
+                update_job(
+                    job_id,
+                    status=JobStatus.FAILED,
+                    error=str(e) or type(e).__name__,
+                    finished_at=datetime.now(),
+                )
+            else:
+                update_job(job_id, status=JobStatus.DONE, finished_at=datetime.now())
+
+    @staticmethod
+    def fail_interrupted() -> int:
+        """Marks the jobs left queued or running by a stopped process as failed"""
+        unfinished = Job.status.in_((JobStatus.QUEUED, JobStatus.RUNNING))
+        with create_independent_session() as session:
+            return (
+                session.query(Job)
+                .filter(unfinished)
+                .update(
+                    {
+                        Job.status: JobStatus.FAILED,
+                        Job.error: 'interrupted',
+                        Job.finished_at: datetime.now(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def init_app(app: Flask) -> Flask:
+    app.job_scheduler = JobScheduler(  # type: ignore
+        app,
+        app.config['JOB_WORKERS'],
+        app.config['JOB_CHUNK_SIZE'],
+        app.config['JOB_CHUNK_PAUSE'],
+    )
+
+    # The app is created once per server, before any job is submitted, so the jobs
+    # left unfinished are those of a process which is gone. A new database has no table.
+    if sa.inspect(app.db_engine).has_table(Job.__tablename__):  # type: ignore
+        app.job_scheduler.fail_interrupted()  # type: ignore
+
+    return app
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from pathlib import Path
+from threading import Condition
+from typing import Any, BinaryIO, Iterator, Optional
+
+
+class Journal:
+    """
+    Append-only file of JSON lines.
+
+    Writers are acknowledged only once their records are fsynced. Whoever finds
+    no fsync running waits `sync_interval` for more writers to join and fsyncs
+    for all of them at once, so the number of fsyncs doesn't grow with the load.
+    """
+
+    def __init__(self, path: Path, sync_interval: float):
+        self.path = path
+        # records moved out of the way by `rotate`, not compacted into the database yet
+        self.old_path = path.with_name(f'{path.name}.old')
+        self.sync_interval = sync_interval
+        self._file: Optional[BinaryIO] = None
+        self._written = 0
+        self._durable = 0
+        self._syncing = False
+        self._condition = Condition()
+
+    def records(self) -> Iterator[dict[str, Any]]:
+        for path in (self.old_path, self.path):
+            if not path.exists():
+                continue
+            with path.open('rb') as file:
+                for line in file:
+                    # the last line is torn if the process died while writing it
+                    if line.endswith(b'\n'):
+                        yield json.loads(line)
+
+    def write(self, record: dict[str, Any]) -> int:
+        """
+        Writes the record as one line, returns a ticket for `wait_durable`.
+        A line is replayed whole or not at all, so everything which has to survive
+        a crash together goes into one record.
+        """
+        with self._condition:
+            if self._file is None:
+                self._file = self.path.open('ab')
+            end = self._file.tell()
+            try:
+                self._file.write(json.dumps(record).encode() + b'\n')
+                # flushed to the OS, so any fsync from now on covers the record
+                self._file.flush()
+            except BaseException:
+                # the next record must not be glued to a part of this one
+                self._file.truncate(end)
+                raise
+            self._written += 1
+            return self._written
+
+    def wait_durable(self, ticket: int) -> None:
+        with self._condition:
+            while self._durable < ticket:
+                if self._syncing:
+                    self._condition.wait()
+                    continue
+
+                self._syncing = True
+                self._condition.release()
+                try:
+                    time.sleep(self.sync_interval)
+                    with self._condition:
+                        target = self._written
+                        fileno = self._file.fileno()  # type: ignore
+                    os.fsync(fileno)
+                finally:
+                    self._condition.acquire()
+                    self._syncing = False
+                    self._condition.notify_all()
+
+                self._durable = max(self._durable, target)
+
+    def rotate(self) -> None:
+        """Moves all the records into the old file, the journal starts empty"""
+        with self._condition:
+            while self._syncing:
+                self._condition.wait()
+
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self._durable = self._written
+
+            if not self.path.exists():
+                return
+            if self.old_path.exists():
+                with self.old_path.open('ab') as old_file:
+                    old_file.write(self.path.read_bytes())
+                    os.fsync(old_file.fileno())
+                self.path.unlink()
+            else:
+                self.path.rename(self.old_path)
+
+    def remove_old(self) -> None:
+        self.old_path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self._condition:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
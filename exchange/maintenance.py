@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from flask import current_app as app
+from sqlalchemy import func, text
+from sqlalchemy.orm import Query, Session
+
+from exchange.archive import archivable_operations, archive_chunk
+from exchange.commands import fill_db
+from exchange.database import create_session
+from exchange.jobs import JobContext, job
+from exchange.models import (
+    CurrencyInWallet,
+    CurrencyInWalletSnapshot,
+    CurrencyOperation,
+    Wallet,
+    WalletSnapshot,
+)
+from exchange.snapshots import balance_at, snapshot_wallets
+
+
+def check_sql_wallets() -> None:
+    if app.wallet_engine is not None:  # type: ignore
+        # the tables are behind the engine, which overwrites them on compaction
+        raise RuntimeError('Wallets are kept by the in-memory engine, not the tables')
+
+
+def wallet_id_chunks(context: JobContext) -> Iterator[list[int]]:
+    """Ids of all wallets, a chunk at a time; the progress is reported after each one"""
+    with create_session() as session:
+        context.set_total(session.query(Wallet).count())
+
+    last_id = 0
+    while True:
+        with create_session() as session:
+            wallet_ids = [
+                wallet_id
+                for wallet_id, in session.query(Wallet.id)
+                .filter(Wallet.id > last_id)
+                .order_by(Wallet.id)
+                .limit(context.chunk_size)
+            ]
+        if not wallet_ids:
+            return
+
+        yield wallet_ids
+        last_id = wallet_ids[-1]
+        context.advance(len(wallet_ids))
+
+
+def lock_wallets(session: Session, wallet_ids: list[int]) -> None:
+    # A write to the rows: it holds off trades of these wallets until the commit,
+    # on SQLite by starting a write transaction, elsewhere by row locks.
+    session.query(Wallet).filter(Wallet.id.in_(wallet_ids)).update(
+        {Wallet.balance: Wallet.balance}, synchronize_session=False
+    )
+
+
+@job('rebuild_holdings')
+def rebuild_holdings(context: JobContext) -> None:
+    """Rewrites the currencies in every wallet from its last snapshot and operations"""
+    check_sql_wallets()
+
+    for wallet_ids in wallet_id_chunks(context):
+        with create_session() as session:
+            lock_wallets(session, wallet_ids)
+            for wallet_id in wallet_ids:
+                wallet = balance_at(session, wallet_id, datetime.now())
+                # no history to rebuild from
+                if wallet is None:
+                    continue
+
+                session.query(CurrencyInWallet).filter(
+                    CurrencyInWallet.wallet_id == wallet_id
+                ).delete(synchronize_session=False)
+                session.add_all(
+                    CurrencyInWallet(
+                        wallet_id=wallet_id,
+                        currency_id=currency.currency_id,
+                        currency_amount=currency.currency_amount,
+                    )
+                    for currency in wallet.currencies or []
+                )
+
+
+@job('recompute_balances')
+def recompute_balances(context: JobContext) -> None:
+    """Rewrites the balance of every wallet from its last snapshot and operations"""
+    check_sql_wallets()
+
+    for wallet_ids in wallet_id_chunks(context):
+        with create_session() as session:
+            lock_wallets(session, wallet_ids)
+            for wallet_id in wallet_ids:
+                wallet = balance_at(session, wallet_id, datetime.now())
+                if wallet is not None:
+                    session.query(Wallet).filter(Wallet.id == wallet_id).update(
+                        {
+                            Wallet.balance: wallet.balance,
+                            Wallet.version: Wallet.version + 1,
+                        },
+                        synchronize_session=False,
+                    )
+
+
+def prunable_operations(session: Session, cutoff: datetime) -> Query:
+    last_snapshots = (
+        session.query(
+            WalletSnapshot.wallet_id,
+            func.max(WalletSnapshot.operation_id).label('operation_id'),
+        )
+        .group_by(WalletSnapshot.wallet_id)
+        .subquery()
+    )
+    return (
+        session.query(CurrencyOperation.id)
+        .join(last_snapshots, last_snapshots.c.wallet_id == CurrencyOperation.wallet_id)
+        .filter(CurrencyOperation.id <= last_snapshots.c.operation_id)
+        .filter(CurrencyOperation.created_at < cutoff)
+    )
+
+
+def delete_superseded_snapshots(session: Session, operation_ids: list[int]) -> None:
+    """
+    Deletes the snapshots the operations are replayed on top of: without them
+    the balance history is missing, rather than wrong, before the last snapshot kept
+    """
+    pruned = (
+        session.query(
+            CurrencyOperation.wallet_id, func.max(CurrencyOperation.id).label('id')
+        )
+        .filter(CurrencyOperation.id.in_(operation_ids))
+        .group_by(CurrencyOperation.wallet_id)
+        .subquery()
+    )
+    snapshot_ids = [
+        snapshot_id
+        for snapshot_id, in session.query(WalletSnapshot.id)
+        .join(pruned, pruned.c.wallet_id == WalletSnapshot.wallet_id)
+        .filter(WalletSnapshot.operation_id < pruned.c.id)
+    ]
+    session.query(CurrencyInWalletSnapshot).filter(
+        CurrencyInWalletSnapshot.snapshot_id.in_(snapshot_ids)
+    ).delete(synchronize_session=False)
+    session.query(WalletSnapshot).filter(WalletSnapshot.id.in_(snapshot_ids)).delete(
+        synchronize_session=False
+    )
+
+
+@job('prune_operations')
+def prune_operations(context: JobContext, older_than_days: int = 365) -> None:
+    """
+    Deletes operations older than that, but only those already covered by
+    the last snapshot of their wallet, so the current balances can still be rebuilt.
+    The older snapshots of the wallet which need them go too.
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    with create_session() as session:
+        context.set_total(prunable_operations(session, cutoff).count())
+
+    while True:
+        with create_session() as session:
+            operation_ids = [
+                operation_id
+                for operation_id, in prunable_operations(session, cutoff)
+                .order_by(CurrencyOperation.id)
+                .limit(context.chunk_size)
+            ]
+            delete_superseded_snapshots(session, operation_ids)
+            session.query(CurrencyOperation).filter(
+                CurrencyOperation.id.in_(operation_ids)
+            ).delete(synchronize_session=False)
+
+        if not operation_ids:
+            return
+        context.advance(len(operation_ids))
+
+
+@job('archive_operations')
+def archive_operations(context: JobContext, older_than_days: int = 90) -> None:
+    """Moves operations older than that to the archive table"""
+    before = datetime.now() - timedelta(days=older_than_days)
+
+    with create_session() as session:
+        context.set_total(archivable_operations(session, before).count())
+
+    while True:
+        with create_session() as session:
+            count = archive_chunk(session, before, context.chunk_size)
+        if not count:
+            return
+        context.advance(count)
+
+
+@job('vacuum')
+def vacuum(_: JobContext) -> None:
+    """Gives the space of deleted rows back to the file system"""
+    engine = app.db_engine  # type: ignore
+    if engine.dialect.name != 'sqlite':
+        raise RuntimeError('Vacuum is only supported for SQLite')
+
+    # VACUUM can't run inside a transaction
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text('VACUUM'))
+
+
+@job('fill_db')
+def fill_db_job(_: JobContext) -> None:
+    fill_db(app)  # type: ignore
+
+
+@job('snapshot_balances')
+def snapshot_balances(_: JobContext, every: Optional[int] = None) -> None:
+    snapshot_wallets(every or app.config['SNAPSHOT_EVERY_OPERATIONS'])
@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+from flask import current_app as app
+
+from exchange.currency_operations import swap_amount, swapped, too_small_error
+from exchange.models import CurrencyOperationType
+from exchange.models_schema import ResponseModel, StatusType
+from exchange.quotes import Quote
+from exchange.wallet_state import Leg
+
+# Trades on the in-memory wallet engine aren't made in a database transaction:
+# the rates come from the quote table and the engine checks them to be still
+# of the current rate version, under the same lock as the balances.
+
+
+def trade_in_memory(
+    wallet_id: int,
+    quote: Quote,
+    operation: CurrencyOperationType,
+    currency_amount: Decimal,
+    rate_version: int,
+) -> tuple[ResponseModel, int]:
+    exchange_rate = (
+        quote.buying_rate
+        if operation == CurrencyOperationType.BUY
+        else quote.selling_rate
+    )
+    return app.wallet_engine.execute(  # type: ignore
+        wallet_id,
+        [Leg(operation, quote.id, currency_amount, exchange_rate)],
+        rate_version,
+    )
+
+
+def swap_in_memory(
+    wallet_id: int,
+    from_quote: Quote,
+    to_quote: Quote,
+    currency_amount: Decimal,
+    rate_version: int,
+) -> tuple[ResponseModel, int]:
+    bought_amount = swap_amount(from_quote, to_quote, currency_amount)
+
+    if bought_amount <= 0:
+        return too_small_error()
+
+    # both legs in one call, so they are journaled together
+    response = app.wallet_engine.execute(  # type: ignore
+        wallet_id,
+        [
+            Leg(
+                CurrencyOperationType.SELL,
+                from_quote.id,
+                currency_amount,
+                from_quote.selling_rate,
+            ),
+            Leg(
+                CurrencyOperationType.BUY,
+                to_quote.id,
+                bought_amount,
+                to_quote.buying_rate,
+            ),
+        ],
+        rate_version,
+    )
+    if response[0].status == StatusType.ERROR:
+        return response
+
+    return swapped(currency_amount, bought_amount)
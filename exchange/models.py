@@ -1,7 +1,7 @@
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
-from random import randint
+from random import Random
 
 import sqlalchemy as sa
 from sqlalchemy.ext.declarative import declarative_base
@@ -10,12 +10,23 @@ from sqlalchemy.orm.decl_api import DeclarativeMeta  # for mypy
 
 Base: DeclarativeMeta = declarative_base()
 
+# Source of randomness for the market (initial and changing rates),
+# seed it to make the rates reproducible
+market_random = Random()
+
 
 class CurrencyOperationType(Enum):
     BUY = 'buy'
     SELL = 'sell'
 
 
+class JobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
 class User(Base):
     __tablename__ = 'user'
 
@@ -34,6 +45,10 @@ class Wallet(Base):
     id = sa.Column(sa.Integer, primary_key=True)
     user_id = sa.Column(sa.Integer, sa.ForeignKey(User.id))
     balance = sa.Column(sa.Numeric(10, 8), default=1000, nullable=False)
+    # bumped on every update, an update of an outdated row fails with StaleDataError
+    version = sa.Column(sa.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     # (Wallet, User) - one to one relationship
     user = relationship('User', back_populates='wallet')
@@ -54,18 +69,15 @@ class Currency(Base):
     id = sa.Column(sa.Integer, primary_key=True)
     name = sa.Column(sa.String(10), unique=True, nullable=False)
     exchange_rate = sa.Column(sa.Numeric(10, 8), nullable=False)
+    version = sa.Column(sa.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     @staticmethod
     def generate_exchange_rate(
         min_exchange_rate: int, max_exchange_rate: int
     ) -> Decimal:
-        return Decimal(randint(min_exchange_rate, max_exchange_rate))
-
-    def generate_buying_rate(self, commission_amount: Decimal) -> Decimal:
-        return self.exchange_rate * (1 + commission_amount)
-
-    def generate_selling_rate(self, commission_amount: Decimal) -> Decimal:
-        return self.exchange_rate * (1 - commission_amount)
+        return Decimal(market_random.randint(min_exchange_rate, max_exchange_rate))
 
 
 class CurrencyInWallet(Base):
@@ -76,6 +88,9 @@ class CurrencyInWallet(Base):
     currency_amount = sa.Column(sa.Numeric(10, 8), nullable=False)
     currency_id = sa.Column(sa.Integer, sa.ForeignKey(Currency.id))
     wallet_id = sa.Column(sa.Integer, sa.ForeignKey(Wallet.id))
+    version = sa.Column(sa.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     # (Wallet, CurrencyInWallet) - one to many relationship
     wallet = relationship('Wallet', back_populates='currencies', uselist=False)
@@ -83,12 +98,98 @@ class CurrencyInWallet(Base):
 
 class CurrencyOperation(Base):
     __tablename__ = 'currency_operation'
+    # ids are never reused, those of archived operations stay unique across both tables
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = sa.Column(sa.Integer, primary_key=True)
     currency_id = sa.Column(sa.Integer, sa.ForeignKey(Currency.id))
     wallet_id = sa.Column(sa.Integer, sa.ForeignKey(Wallet.id))
     type = sa.Column(sa.Enum(CurrencyOperationType), nullable=False)
     amount = sa.Column(sa.Numeric(10, 8), nullable=False)
+    # rate the operation was executed at, commission included
+    exchange_rate = sa.Column(sa.Numeric(10, 8))
+    # the server default fills in the operations made before the column was added
+    created_at = sa.Column(
+        sa.DateTime(),
+        default=datetime.now,
+        server_default=sa.func.now(),
+        nullable=False,
+    )
 
     # (Wallet, CurrencyOperation) - one to many relationship
     wallet = relationship('Wallet', back_populates='operations', uselist=False)
+
+
+class CurrencyOperationArchive(Base):
+    """Old operations moved out of currency_operation, with their ids kept"""
+
+    __tablename__ = 'currency_operation_archive'
+    __table_args__ = (
+        sa.Index('ix_currency_operation_archive_wallet_id', 'wallet_id', 'id'),
+    )
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    currency_id = sa.Column(sa.Integer, sa.ForeignKey(Currency.id))
+    wallet_id = sa.Column(sa.Integer, sa.ForeignKey(Wallet.id))
+    type = sa.Column(sa.Enum(CurrencyOperationType), nullable=False)
+    amount = sa.Column(sa.Numeric(10, 8), nullable=False)
+    exchange_rate = sa.Column(sa.Numeric(10, 8))
+    created_at = sa.Column(sa.DateTime(), nullable=False)
+
+
+class WalletSnapshot(Base):
+    """State of the wallet right after the operation `operation_id`"""
+
+    __tablename__ = 'wallet_snapshot'
+    __table_args__ = (
+        sa.Index('ix_wallet_snapshot_wallet_id', 'wallet_id', 'created_at'),
+    )
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    wallet_id = sa.Column(sa.Integer, sa.ForeignKey(Wallet.id), nullable=False)
+    # 0 for the snapshot taken before the first operation
+    operation_id = sa.Column(sa.Integer, nullable=False)
+    balance = sa.Column(sa.Numeric(10, 8), nullable=False)
+    created_at = sa.Column(sa.DateTime(), default=datetime.now, nullable=False)
+
+    # (WalletSnapshot, CurrencyInWalletSnapshot) - one to many relationship
+    currencies = relationship('CurrencyInWalletSnapshot', uselist=True)
+
+
+class CurrencyInWalletSnapshot(Base):
+    __tablename__ = 'currency_in_wallet_snapshot'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    snapshot_id = sa.Column(sa.Integer, sa.ForeignKey(WalletSnapshot.id))
+    currency_id = sa.Column(sa.Integer, sa.ForeignKey(Currency.id))
+    currency_amount = sa.Column(sa.Numeric(10, 8), nullable=False)
+
+
+class JournalCheckpoint(Base):
+    """Sequence number of the last wallet journal record written to the tables"""
+
+    __tablename__ = 'journal_checkpoint'
+
+    # the table has a single row
+    ID = 1
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    seq = sa.Column(sa.Integer, nullable=False)
+
+
+class Job(Base):
+    """Background job, see exchange.jobs"""
+
+    __tablename__ = 'job'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(50), nullable=False)
+    params = sa.Column(sa.JSON, nullable=False, default=dict)
+    status = sa.Column(sa.Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    # rows processed so far out of `total`, which is unknown for some jobs
+    progress = sa.Column(sa.Integer, default=0, nullable=False)
+    total = sa.Column(sa.Integer)
+    error = sa.Column(sa.Text)
+    created_at = sa.Column(sa.DateTime(), default=datetime.now, nullable=False)
+    started_at = sa.Column(sa.DateTime())
+    finished_at = sa.Column(sa.DateTime())
@@ -1,11 +1,11 @@
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
-from typing import Optional, Union
+from typing import Any, Optional, Union
 
 from pydantic import BaseModel
 
-from exchange.models import CurrencyOperationType
+from exchange.models import CurrencyOperationType, JobStatus
 
 
 class StatusType(Enum):
@@ -73,16 +73,71 @@ class OperationModel(BaseModel):
     exchange_rate: Decimal
 
 
+class SwapModel(BaseModel):
+    user_name: str
+    from_currency_name: str
+    to_currency_name: str
+    # amount of the currency being sold
+    currency_amount: Decimal
+    from_exchange_rate: Decimal
+    to_exchange_rate: Decimal
+
+
+class SwapResultModel(BaseModel):
+    sold_amount: Decimal
+    bought_amount: Decimal
+
+
 class CurrencyOperationModel(BaseModel):
     currency_id: int
     wallet_id: int
     type: CurrencyOperationType
     amount: Decimal
+    exchange_rate: Optional[Decimal]
+    created_at: datetime
 
     class Config:
         orm_mode = True
 
 
+class RouteTimingModel(BaseModel):
+    endpoint: str
+    count: int
+    total_ms: float
+    max_ms: float
+
+
+class RateChangerModel(BaseModel):
+    paused: bool
+    ticks: int
+    overruns: int
+    failed_ticks: int
+    last_lag_ms: float
+    max_lag_ms: float
+    mean_lag_ms: float
+
+
+class JobModel(BaseModel):
+    id: int
+    name: str
+    params: dict[str, Any]
+    status: JobStatus
+    progress: int
+    total: Optional[int]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+
+class RequestJobModel(BaseModel):
+    name: str
+    params: dict[str, Any] = {}
+
+
 class ResponseModel(BaseModel):
     status: StatusType
     # Important! We should include the most specific type first in Union
@@ -90,9 +145,16 @@ class ResponseModel(BaseModel):
         Union[
             ExtendedCurrencyModel,
             CurrencyModel,
+            list[ExtendedCurrencyModel],
             list[CurrencyModel],
             UserModel,
+            WalletModel,
             list[CurrencyOperationModel],
+            SwapResultModel,
+            list[RouteTimingModel],
+            RateChangerModel,
+            JobModel,
+            list[JobModel],
         ]
     ]
     error: Optional[str]
@@ -101,3 +163,29 @@ class ResponseModel(BaseModel):
 class QueryModel(BaseModel):
     limit: int
     page: int
+
+
+class CurrencyListQueryModel(BaseModel):
+    extended: bool = False
+
+
+class JobQueryModel(BaseModel):
+    limit: int = 100
+
+
+class ExportQueryModel(BaseModel):
+    after_id: int = 0
+
+
+class BalanceQueryModel(BaseModel):
+    at: datetime
+
+
+class ProfileFormat(Enum):
+    COLLAPSED = 'collapsed'
+    SPEEDSCOPE = 'speedscope'
+
+
+class ProfileQueryModel(BaseModel):
+    seconds: float = 5
+    format: ProfileFormat = ProfileFormat.COLLAPSED
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, Optional, TypeVar
+
+from flask import Flask, current_app
+from sqlalchemy.orm import Session
+
+from exchange.models import Currency, User
+from exchange.quotes import Quote, QuoteTable
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    """Keeps the `maxsize` most recently used entries"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[K, V] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NameCache:
+    def __init__(self, maxsize: int):
+        # user name -> (user id, wallet id)
+        self.users: LRUCache[str, tuple[int, int]] = LRUCache(maxsize)
+        # currency name -> currency id
+        self.currencies: LRUCache[str, int] = LRUCache(maxsize)
+
+
+def cache_user(user_name: str, user_id: int, wallet_id: int) -> None:
+    current_app.name_cache.users.put(user_name, (user_id, wallet_id))  # type: ignore
+
+
+def invalidate_user(user_name: str) -> None:
+    current_app.name_cache.users.invalidate(user_name)  # type: ignore
+
+
+def cache_currency(currency_name: str, currency_id: int) -> None:
+    current_app.name_cache.currencies.put(currency_name, currency_id)  # type: ignore
+
+
+def invalidate_currency(currency_name: str) -> None:
+    current_app.name_cache.currencies.invalidate(currency_name)  # type: ignore
+
+
+# A cached id is only a hint: the row it points to is checked to still have that name,
+# so a removed or renamed row costs one more query instead of a wrong answer.
+# A wallet is created together with its user and never changes owner.
+
+
+def user_ids(session: Session, user_name: str) -> Optional[tuple[int, int]]:
+    """(user id, wallet id) of the user, None if there is no such user"""
+    ids = current_app.name_cache.users.get(user_name)  # type: ignore
+    if ids is not None:
+        user = session.get(User, ids[0])
+        if user is not None and user.name == user_name:
+            return ids
+        invalidate_user(user_name)
+
+    user = session.query(User).filter(User.name == user_name).one_or_none()
+    if user is None:
+        return None
+    cache_user(user.name, user.id, user.wallet.id)
+    return user.id, user.wallet.id
+
+
+def get_user(session: Session, user_name: str) -> Optional[User]:
+    ids = user_ids(session, user_name)
+    # already in the identity map of the session, no query is made
+    return None if ids is None else session.get(User, ids[0])
+
+
+def get_currency(session: Session, currency_name: str) -> Optional[Currency]:
+    currency_id = current_app.name_cache.currencies.get(currency_name)  # type: ignore
+    if currency_id is not None:
+        currency = session.get(Currency, currency_id)
+        if currency is not None and currency.name == currency_name:
+            return currency
+        invalidate_currency(currency_name)
+
+    currency = (
+        session.query(Currency).filter(Currency.name == currency_name).one_or_none()
+    )
+    if currency is not None:
+        cache_currency(currency.name, currency.id)
+    return currency
+
+
+def get_currency_quote(table: QuoteTable, currency_name: str) -> Optional[Quote]:
+    """Quote of the currency from the table, without reading the currency itself"""
+    currency_id = current_app.name_cache.currencies.get(currency_name)  # type: ignore
+    if currency_id is not None:
+        quote = table.quotes.get(currency_id)
+        if quote is not None and quote.name == currency_name:
+            return quote
+        invalidate_currency(currency_name)
+
+    for quote in table.quotes.values():
+        if quote.name == currency_name:
+            cache_currency(quote.name, quote.id)
+            return quote
+    return None
+
+
+def init_app(app: Flask) -> Flask:
+    app.name_cache = NameCache(app.config['NAME_CACHE_SIZE'])  # type: ignore
+    return app
@@ -0,0 +1,206 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http import HTTPStatus
+from types import FrameType
+from typing import Any, Iterator, Optional, Union
+
+from flask import Blueprint, Response
+from flask import current_app as app
+from flask import g, json, request
+from flask_pydantic import validate
+
+from exchange.auth import admin_required
+from exchange.models_schema import (
+    ProfileFormat,
+    ProfileQueryModel,
+    ResponseModel,
+    RouteTimingModel,
+    StatusType,
+)
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+# a stack is a tuple of (function, file, line) frames, from the outermost one
+Stack = tuple[tuple[str, str, int], ...]
+
+
+def frame_stack(frame: Optional[FrameType]) -> Stack:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter[Stack]:
+    """
+    Samples stacks of all the other threads of the process every `interval` seconds.
+    The cost is paid by the calling thread only, the sampled ones are not instrumented.
+    """
+    ignored = threading.get_ident()
+    stacks: Counter[Stack] = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for (
+            thread_id,
+            frame,
+        ) in sys._current_frames().items():  # pylint: disable=protected-access
+            if thread_id != ignored:
+                stacks[frame_stack(frame)] += 1
+        time.sleep(interval)
+
+    return stacks
+
+
+def to_collapsed(stacks: Counter[Stack]) -> str:
+    """The format of flamegraph.pl and most flamegraph tools"""
+    return ''.join(
+        ';'.join(f'{name} ({file}:{line})' for name, file, line in stack)
+        + f' {count}\n'
+        for stack, count in stacks.most_common()
+    )
+
+
+def to_speedscope(stacks: Counter[Stack], interval: float) -> dict[str, Any]:
+    frames: dict[tuple[str, str, int], int] = {}
+    samples = [
+        [frames.setdefault(frame, len(frames)) for frame in stack] for stack in stacks
+    ]
+    weights = [count * interval for count in stacks.values()]
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {
+            'frames': [
+                {'name': name, 'file': file, 'line': line}
+                for name, file, line in frames
+            ]
+        },
+        'profiles': [
+            {
+                'type': 'sampled',
+                'name': 'exchange',
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }
+        ],
+    }
+
+
+@dataclass
+class RouteTiming:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+class RouteTimings:
+    """Cumulative count, total and max time of requests per endpoint"""
+
+    def __init__(self) -> None:
+        self._timings: dict[str, RouteTiming] = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, elapsed: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(endpoint, RouteTiming())
+            timing.count += 1
+            timing.total += elapsed
+            timing.max = max(timing.max, elapsed)
+
+    def models(self) -> list[RouteTimingModel]:
+        with self._lock:
+            return [
+                RouteTimingModel(
+                    endpoint=endpoint,
+                    count=timing.count,
+                    total_ms=timing.total * 1000,
+                    max_ms=timing.max * 1000,
+                )
+                for endpoint, timing in sorted(self._timings.items())
+            ]
+
+
+route_timings = RouteTimings()
+
+
+def time_routes(blueprint: Blueprint) -> None:
+    @blueprint.before_request
+    def start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @blueprint.teardown_request
+    def stop_timer(_: Optional[BaseException]) -> None:
+        if 'request_started' in g:
+            route_timings.add(
+                request.endpoint or '', time.perf_counter() - g.request_started
+            )
+
+
+# one profile at a time, concurrent samplers would only measure each other
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def acquired_or_busy(lock: threading.Lock) -> Iterator[bool]:
+    """Takes the lock if it's free, yields whether it was taken"""
+    locked = lock.acquire(blocking=False)
+    try:
+        yield locked
+    finally:
+        if locked:
+            lock.release()
+
+
+@debug_bp.route('/profile', methods=['GET'])
+@admin_required
+@validate()
+def profile(query: ProfileQueryModel) -> Union[tuple[ResponseModel, int], Response]:
+    if not 0 < query.seconds <= app.config['PROFILER_MAX_SECONDS']:
+        return (
+            ResponseModel(
+                status=StatusType.ERROR,
+                error=f'Profile for up to {app.config["PROFILER_MAX_SECONDS"]} seconds',
+            ),
+            HTTPStatus.BAD_REQUEST,
+        )
+
+    interval = app.config['PROFILER_INTERVAL']
+    with acquired_or_busy(_profile_lock) as locked:
+        if not locked:
+            return (
+                ResponseModel(
+                    status=StatusType.ERROR,
+                    error='Another profile is being taken',
+                ),
+                HTTPStatus.CONFLICT,
+            )
+        stacks = sample_stacks(query.seconds, interval)
+
+    if query.format == ProfileFormat.SPEEDSCOPE:
+        return Response(
+            json.dumps(to_speedscope(stacks, interval)), mimetype='application/json'
+        )
+    return Response(to_collapsed(stacks), mimetype='text/plain')
+
+
+@debug_bp.route('/routes', methods=['GET'])
+@admin_required
+@validate()
+def get_route_timings() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.OK,
+            data=route_timings.models(),
+        ),
+        HTTPStatus.OK,
+    )
@@ -0,0 +1,135 @@
+from decimal import Decimal
+from threading import Lock
+from typing import Any, NamedTuple, Optional
+
+from flask import Flask, current_app
+
+from exchange.database import create_independent_session
+from exchange.models import Currency
+from exchange.rate_version import get_rate_version
+
+
+class Quote(NamedTuple):
+    id: int
+    name: str
+    exchange_rate: Decimal
+    buying_rate: Decimal
+    selling_rate: Decimal
+
+
+class QuoteTable(NamedTuple):
+    # the rate version the quotes were computed for
+    version: int
+    # currency id -> quote
+    quotes: dict[int, Quote]
+
+
+class CommissionSchedule:
+    """
+    Commission of a currency: its own one if it has it, else the one of the highest
+    tier its exchange rate reaches, else the default one.
+    """
+
+    def __init__(
+        self,
+        default: Decimal,
+        per_currency: dict[str, Decimal],
+        tiers: tuple[tuple[Decimal, Decimal], ...],
+    ):
+        self.default = default
+        self.per_currency = per_currency
+        # (lowest exchange rate, commission), the highest tier first
+        self.tiers = sorted(tiers, reverse=True)
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> 'CommissionSchedule':
+        return cls(
+            config['COMMISSION_AMOUNT'],
+            config['CURRENCY_COMMISSIONS'],
+            config['COMMISSION_TIERS'],
+        )
+
+    def commission(self, name: str, exchange_rate: Decimal) -> Decimal:
+        if name in self.per_currency:
+            return self.per_currency[name]
+        for lowest_rate, commission in self.tiers:
+            if exchange_rate >= lowest_rate:
+                return commission
+        return self.default
+
+    def quote(self, currency_id: int, name: str, exchange_rate: Decimal) -> Quote:
+        commission = self.commission(name, exchange_rate)
+        return Quote(
+            id=currency_id,
+            name=name,
+            exchange_rate=exchange_rate,
+            buying_rate=exchange_rate * (1 + commission),
+            selling_rate=exchange_rate * (1 - commission),
+        )
+
+
+_quote_table: Optional[QuoteTable] = None
+_quote_table_lock = Lock()
+
+
+def build_quote_table(schedule: CommissionSchedule) -> QuoteTable:
+    # read before the rates: if they change in between, the table is just rebuilt again
+    version = get_rate_version()
+
+    with create_independent_session() as session:
+        quotes = {
+            currency_id: schedule.quote(currency_id, name, exchange_rate)
+            for currency_id, name, exchange_rate in session.query(
+                Currency.id, Currency.name, Currency.exchange_rate
+            ).order_by(Currency.id)
+        }
+
+    return QuoteTable(version, quotes)
+
+
+def refresh_quote_table(schedule: CommissionSchedule) -> QuoteTable:
+    global _quote_table  # pylint: disable=global-statement
+
+    with _quote_table_lock:
+        _quote_table = build_quote_table(schedule)
+        return _quote_table
+
+
+def get_quote_table() -> QuoteTable:
+    """
+    The table of the current rate version. It is built by the rate changer on every
+    tick and rebuilt here only if the rates changed some other way,
+    e.g. a currency was added or the rate changer runs in another process.
+    """
+    global _quote_table  # pylint: disable=global-statement
+
+    table = _quote_table
+    if table is not None and table.version == get_rate_version():
+        return table
+
+    with _quote_table_lock:
+        # somebody could have rebuilt it while we were waiting
+        table = _quote_table
+        if table is None or table.version != get_rate_version():
+            table = _quote_table = build_quote_table(
+                current_app.commission_schedule  # type: ignore
+            )
+        return table
+
+
+def get_quote(currency: Currency) -> Quote:
+    """Quote for the rate of the currency object, which trades are checked against"""
+    quote = get_quote_table().quotes.get(currency.id)
+
+    # the rate has changed since the table was built
+    if quote is None or quote.exchange_rate != currency.exchange_rate:
+        quote = current_app.commission_schedule.quote(  # type: ignore
+            currency.id, currency.name, currency.exchange_rate
+        )
+
+    return quote
+
+
+def init_app(app: Flask) -> Flask:
+    app.commission_schedule = CommissionSchedule.from_config(app.config)  # type: ignore
+    return app
@@ -1,37 +1,213 @@
+import logging
 import time
 from decimal import Decimal
-from random import randrange
-from threading import Thread
+from multiprocessing import Array
+from multiprocessing import Event as SharedEvent
+from threading import Event, Thread
+from typing import Optional
 
-from exchange.database import create_session
-from exchange.models import Currency
+from flask import Flask
+
+from exchange.database import create_session, remove_session
+from exchange.models import Currency, market_random
+from exchange.models_schema import RateChangerModel
+from exchange.quotes import CommissionSchedule, refresh_quote_table
+from exchange.rate_version import bump_rate_version
+
+logger = logging.getLogger(__name__)
+
+# how often a paused rate changer checks whether it has been stopped
+PAUSED_POLL_INTERVAL = 0.1
+
+# slots of the shared stats
+_TICKS, _OVERRUNS, _FAILED_TICKS, _LAST_LAG, _MAX_LAG, _TOTAL_LAG = range(6)
+
+
+class TickStats:
+    """
+    How late the ticks start after their deadlines, overruns: deadlines skipped
+    because the tick before took longer than the period, and ticks which failed.
+
+    Kept in shared memory, like the pause flag of `RateChangerState`.
+    """
+
+    def __init__(self) -> None:
+        self._values = Array('d', 6)
+
+    @property
+    def ticks(self) -> int:
+        return int(self._values[_TICKS])
+
+    @property
+    def overruns(self) -> int:
+        return int(self._values[_OVERRUNS])
+
+    @property
+    def failed_ticks(self) -> int:
+        return int(self._values[_FAILED_TICKS])
+
+    def add(self, lag: float) -> None:
+        with self._values.get_lock():
+            self._values[_TICKS] += 1
+            self._values[_LAST_LAG] = lag
+            self._values[_MAX_LAG] = max(self._values[_MAX_LAG], lag)
+            self._values[_TOTAL_LAG] += lag
+
+    def add_overruns(self, missed: int) -> None:
+        with self._values.get_lock():
+            self._values[_OVERRUNS] += missed
+
+    def add_failure(self) -> None:
+        with self._values.get_lock():
+            self._values[_FAILED_TICKS] += 1
+
+    def model(self, paused: bool) -> RateChangerModel:
+        with self._values.get_lock():
+            ticks, overruns, failed_ticks, last_lag, max_lag, total_lag = self._values[
+                :
+            ]
+        return RateChangerModel(
+            paused=paused,
+            ticks=ticks,
+            overruns=overruns,
+            failed_ticks=failed_ticks,
+            last_lag_ms=last_lag * 1000,
+            max_lag_ms=max_lag * 1000,
+            mean_lag_ms=total_lag / ticks * 1000 if ticks else 0.0,
+        )
+
+
+class RateChangerState:
+    """
+    The stats and the pause flag of a rate changer. Created with the app before
+    the workers are forked, so with the multi-process server the workers show and
+    control the rate changer running in a process of its own.
+    """
+
+    def __init__(self) -> None:
+        self.stats = TickStats()
+        # cleared while paused
+        self.resumed = SharedEvent()
+        self.resumed.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self.resumed.is_set()
+
+    def pause(self) -> None:
+        self.resumed.clear()
+
+    def resume(self) -> None:
+        self.resumed.set()
+
+    def model(self) -> RateChangerModel:
+        return self.stats.model(self.paused)
 
 
 class RateChanger(Thread):
     def __init__(
         self,
-        sleep_time: int,
+        sleep_time: float,
         changer_lower_bound: int,
         changer_upper_bound: int,
+        commission_schedule: Optional[CommissionSchedule] = None,
     ):
-        super().__init__()
+        # a daemon, so it never keeps the interpreter from exiting
+        super().__init__(name='rate-changer', daemon=True)
         self.sleep_time = sleep_time
         self.lower_bound = changer_lower_bound
         self.upper_bound = changer_upper_bound
+        # quotes are precomputed on every tick if the schedule is given
+        self.commission_schedule = commission_schedule
+        # replaced by the shared one of the app in `create_rate_changer`
+        self.state = RateChangerState()
+        self._stopped = Event()
+
+    @property
+    def stats(self) -> TickStats:
+        return self.state.stats
+
+    @property
+    def paused(self) -> bool:
+        return self.state.paused
+
+    def pause(self) -> None:
+        self.state.pause()
+
+    def resume(self) -> None:
+        self.state.resume()
+
+    def stop(self) -> None:
+        """Stops the loop, a tick being made is finished first"""
+        self._stopped.set()
+
+    def _wait_resumed(self) -> None:
+        # the flag may be set by another process, so the stop is polled for
+        while not self.state.resumed.wait(PAUSED_POLL_INTERVAL):
+            if self._stopped.is_set():
+                return
 
     def run(self) -> None:
-        while True:
-            time.sleep(self.sleep_time)
-
-            with create_session() as session:
-                for currency in session.query(Currency).all():
-                    percent_change = self.generate_random_decimal(
-                        self.lower_bound, self.upper_bound
-                    )
-                    currency.exchange_rate = currency.exchange_rate * (
-                        1 + percent_change
-                    )
+        # Deadlines are a fixed grid on the monotonic clock: the next one is a period
+        # after the previous deadline, not after the end of the tick, so the time ticks
+        # take doesn't add up. A tick running past deadlines skips them.
+        deadline = time.monotonic() + self.sleep_time
+        while not self._stopped.wait(max(0.0, deadline - time.monotonic())):
+            if self.paused:
+                self._wait_resumed()
+                # the ticks missed while paused are not made up for
+                deadline = time.monotonic() + self.sleep_time
+                continue
+
+            self.stats.add(time.monotonic() - deadline)
+            try:
+                self.tick()
+            except Exception:  # pylint: disable=broad-except
+                # e.g. the database is locked for a moment, the next tick is made
+                # on the grid as usual
+                logger.exception('A tick of the rate changer failed')
+                self.stats.add_failure()
+            finally:
+                # the thread never ends, its session must not hold the last tick
+                remove_session()
+
+            deadline += self.sleep_time
+            late = time.monotonic() - deadline
+            if late > 0 and self.sleep_time > 0:
+                missed = int(late // self.sleep_time) + 1
+                self.stats.add_overruns(missed)
+                deadline += missed * self.sleep_time
+
+    def tick(self) -> None:
+        with create_session() as session:
+            for currency in session.query(Currency).all():
+                percent_change = self.generate_random_decimal(
+                    self.lower_bound, self.upper_bound
+                )
+                currency.exchange_rate = currency.exchange_rate * (1 + percent_change)
+
+        # only after the commit, so the new version never describes the old rates
+        bump_rate_version()
+
+        if self.commission_schedule is not None:
+            refresh_quote_table(self.commission_schedule)
 
     @staticmethod
     def generate_random_decimal(lower_bound: int, upper_bound: int) -> Decimal:
-        return Decimal(randrange(lower_bound, upper_bound)) / 100
+        return Decimal(market_random.randrange(lower_bound, upper_bound)) / 100
+
+
+def create_rate_changer(app: Flask) -> RateChanger:
+    rate_changer = RateChanger(
+        app.config['CHANGER_SLEEP_TIME'],
+        app.config['CHANGER_LOWER_BOUND'],
+        app.config['CHANGER_UPPER_BOUND'],
+        app.commission_schedule,  # type: ignore
+    )
+    rate_changer.state = app.rate_changer_state  # type: ignore
+    return rate_changer
+
+
+def init_app(app: Flask) -> Flask:
+    app.rate_changer_state = RateChangerState()  # type: ignore
+    return app
@@ -0,0 +1,168 @@
+import math
+import time
+import zlib
+from functools import wraps
+from http import HTTPStatus
+from multiprocessing import Array
+from threading import Lock
+from typing import Any, Callable, Optional, Protocol
+
+from flask import Flask, Response, after_this_request, current_app, request
+
+from exchange.models_schema import ResponseModel, StatusType
+
+
+def refill(
+    tokens: float, updated_at: float, now: float, rate: float, capacity: float
+) -> float:
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+
+class RateLimiter(Protocol):
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Takes a token for the key, returns 0 or seconds to wait if there are none."""
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets of this process, `rate` tokens per second up to `capacity`.
+
+    Every active key costs one (tokens, updated_at) pair. A bucket left alone for
+    `capacity / rate` seconds is full again, which is the same as having no bucket,
+    so such keys are evicted by a sweep running at most once in that period.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.idle_time = capacity / rate
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = Lock()
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            tokens = refill(tokens, updated_at, now, self.rate, self.capacity)
+
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def _sweep(self, now: float) -> None:
+        idle_keys = [
+            key
+            for key, (_, updated_at) in self._buckets.items()
+            if now - updated_at >= self.idle_time
+        ]
+        for key in idle_keys:
+            del self._buckets[key]
+        self._next_sweep = now + self.idle_time
+
+
+class SharedTokenBucketLimiter:
+    """
+    Token buckets in shared memory, so limits hold across workers on one host.
+
+    The table has a fixed number of `slots` and must be created before the workers
+    are forked. Keys are hashed into slots, keys sharing a slot share a bucket,
+    so a collision can only make a limit stricter, never looser.
+    """
+
+    def __init__(self, rate: float, capacity: float, slots: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.slots = slots
+        # (tokens, updated_at) of every slot, zero time means a full bucket
+        self._table = Array('d', 2 * slots)
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        index = 2 * (zlib.crc32(key.encode()) % self.slots)
+
+        with self._table.get_lock():
+            tokens, updated_at = self._table[index], self._table[index + 1]
+            if updated_at == 0:
+                tokens = self.capacity
+            else:
+                tokens = refill(tokens, updated_at, now, self.rate, self.capacity)
+
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._table[index] = tokens - 1 if wait == 0 else tokens
+            self._table[index + 1] = now
+            return wait
+
+
+def create_limiter(app: Flask, rate: float, capacity: float) -> RateLimiter:
+    if app.config['RATE_LIMIT_BACKEND'] == 'shared':
+        return SharedTokenBucketLimiter(
+            rate, capacity, app.config['RATE_LIMIT_SHARED_SLOTS']
+        )
+    return TokenBucketLimiter(rate, capacity)
+
+
+def init_app(app: Flask) -> Flask:
+    app.user_rate_limiter = None  # type: ignore
+    app.ip_rate_limiter = None  # type: ignore
+
+    if app.config['RATE_LIMIT_ENABLED']:
+        app.user_rate_limiter = create_limiter(  # type: ignore
+            app, *app.config['RATE_LIMIT_PER_USER']
+        )
+        app.ip_rate_limiter = create_limiter(  # type: ignore
+            app, *app.config['RATE_LIMIT_PER_IP']
+        )
+
+    return app
+
+
+def rate_limited(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Limits requests per client IP and per `body.user_name`.
+
+    Goes right under `validate`, so a rejected request costs no database work.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        limits = (
+            (current_app.ip_rate_limiter, f'ip:{request.remote_addr}'),  # type: ignore
+            (current_app.user_rate_limiter, f'user:{kwargs["body"].user_name}'),  # type: ignore
+        )
+
+        wait = 0.0
+        for limiter, key in limits:
+            if limiter is not None:
+                wait = limiter.acquire(key)
+            if wait:
+                break
+        else:
+            return view(*args, **kwargs)
+
+        retry_after = str(math.ceil(wait))
+
+        @after_this_request
+        def add_retry_after(response: Response) -> Response:
+            response.headers['Retry-After'] = retry_after
+            return response
+
+        return (
+            ResponseModel(
+                status=StatusType.ERROR,
+                error='Too many requests, please slow down.',
+            ),
+            HTTPStatus.TOO_MANY_REQUESTS,
+        )
+
+    return wrapper
@@ -0,0 +1,64 @@
+from functools import wraps
+from http import HTTPStatus
+from multiprocessing import Value
+from typing import Any, Callable
+from uuid import uuid4
+
+from flask import Response, make_response, request
+
+from exchange.encoding import CBOR_MIMETYPE, prefers
+from exchange.streaming import NDJSON_MIMETYPE
+
+# Global version of the exchange rates, bumped on every change of any rate.
+# Both are created on import, so worker processes forked from the same parent
+# share the counter with each other and with the process running the rate changer.
+_rate_version = Value('Q', 0)
+# distinguishes versions of different server runs, the counter starts from 0 each time
+_epoch = uuid4().hex[:8]
+
+
+def get_rate_version() -> int:
+    return _rate_version.value  # type: ignore
+
+
+def bump_rate_version() -> int:
+    with _rate_version.get_lock():
+        _rate_version.value += 1  # type: ignore
+        return _rate_version.value  # type: ignore
+
+
+def rates_etag() -> str:
+    etag = f'{_epoch}-{get_rate_version()}'
+    # different representations of the same data must have different tags
+    if prefers(NDJSON_MIMETYPE):
+        etag += '-ndjson'
+    elif prefers(CBOR_MIMETYPE):
+        etag += '-cbor'
+    return etag
+
+
+def rates_conditional(view: Callable[..., Any]) -> Callable[..., Response]:
+    """
+    Conditional GET for views which only depend on the exchange rates.
+
+    Answers `If-None-Match` with 304 before the view runs, so no session is opened.
+    The version is read before the view reads the database: if the rates change
+    in between, the client just gets a fresh response on its next poll.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Response:
+        etag = rates_etag()
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=HTTPStatus.NOT_MODIFIED)
+        else:
+            response = make_response(view(*args, **kwargs))
+
+        # Weak, the tag stands for the version of the rates rather than for the bytes:
+        # the 200 may be compressed, and a 304 has to carry the same tag as the 200
+        if response.status_code in {HTTPStatus.OK, HTTPStatus.NOT_MODIFIED}:
+            response.set_etag(etag, weak=True)
+        response.vary.add('Accept')
+        return response
+
+    return wrapper
@@ -1,32 +1,34 @@
 from http import HTTPStatus
+from typing import Union
 
-from flask import Blueprint
+from flask import Blueprint, Response
 from flask import current_app as app
 from flask_pydantic import validate
 from sqlalchemy.exc import IntegrityError
 
-from exchange.currency_operations import buy_currency, sell_currency
-from exchange.database import create_session
-from exchange.models import (
-    Currency,
-    CurrencyOperation,
-    CurrencyOperationType,
-    User,
-    Wallet,
-)
+from exchange.database import create_read_session, create_session, mark_user_write
+from exchange.encoding import cbor_negotiable, compress_response, prefers
+from exchange.models import Currency, User, Wallet
 from exchange.models_schema import (
+    CurrencyListQueryModel,
     CurrencyModel,
     ExtendedCurrencyModel,
-    OperationModel,
-    QueryModel,
     RequestCurrencyModel,
     RequestUserModel,
     ResponseModel,
     StatusType,
     UserModel,
 )
+from exchange.name_cache import cache_currency, cache_user, get_currency, get_user
+from exchange.profiling import time_routes
+from exchange.quotes import get_quote, get_quote_table
+from exchange.rate_version import bump_rate_version, rates_conditional
+from exchange.snapshots import take_snapshot
+from exchange.streaming import NDJSON_MIMETYPE, ndjson_response
 
 view_bp = Blueprint('view', __name__)
+time_routes(view_bp)
+view_bp.after_request(compress_response)
 
 
 @view_bp.route('/currency/add', methods=['POST'])
@@ -42,6 +44,8 @@ def add_currency(body: RequestCurrencyModel) -> tuple[ResponseModel, int]:
             session.flush()
             currency_data = CurrencyModel.from_orm(currency)
 
+        cache_currency(currency_data.name, currency_data.id)
+
     except IntegrityError:
         return (
             ResponseModel(
@@ -51,6 +55,8 @@ def add_currency(body: RequestCurrencyModel) -> tuple[ResponseModel, int]:
             HTTPStatus.CONFLICT,
         )
 
+    bump_rate_version()
+
     return (
         ResponseModel(
             status=StatusType.OK,
@@ -61,12 +67,13 @@ def add_currency(body: RequestCurrencyModel) -> tuple[ResponseModel, int]:
 
 
 @view_bp.route('/currency/<currency_name>', methods=['GET'])
+@rates_conditional
 @validate()
+@cbor_negotiable
 def get_currency_info(currency_name: str) -> tuple[ResponseModel, int]:
+    # the primary: a lagging replica would serve old rates under the new ETag
     with create_session() as session:
-        currency = (
-            session.query(Currency).filter(Currency.name == currency_name).one_or_none()
-        )
+        currency = get_currency(session, currency_name)
 
         if currency is None:
             return (
@@ -77,15 +84,7 @@ def get_currency_info(currency_name: str) -> tuple[ResponseModel, int]:
                 HTTPStatus.NOT_FOUND,
             )
 
-        currency_data = CurrencyModel.from_orm(currency)
-
-        currency_ext = ExtendedCurrencyModel(
-            **currency_data.dict(),
-            buying_rate=currency.generate_buying_rate(app.config['COMMISSION_AMOUNT']),
-            selling_rate=currency.generate_selling_rate(
-                app.config['COMMISSION_AMOUNT']
-            ),
-        )
+        currency_ext = ExtendedCurrencyModel(**get_quote(currency)._asdict())
 
         return (
             ResponseModel(
@@ -97,8 +96,31 @@ def get_currency_info(currency_name: str) -> tuple[ResponseModel, int]:
 
 
 @view_bp.route('/currency/all', methods=['GET'])
+@rates_conditional
 @validate()
-def get_all_currencies() -> tuple[ResponseModel, int]:
+@cbor_negotiable
+def get_all_currencies(
+    query: CurrencyListQueryModel,
+) -> Union[tuple[ResponseModel, int], Response]:
+    if query.extended:
+        # precomputed for the current rates, no need to touch the database
+        return (
+            ResponseModel(
+                status=StatusType.OK,
+                data=[
+                    ExtendedCurrencyModel(**quote._asdict())
+                    for quote in get_quote_table().quotes.values()
+                ],
+            ),
+            HTTPStatus.OK,
+        )
+
+    if prefers(NDJSON_MIMETYPE):
+        return ndjson_response(
+            lambda session: session.query(Currency), CurrencyModel, from_primary=True
+        )
+
+    # the primary, like `get_currency_info`
     with create_session() as session:
         currencies = session.query(Currency).all()
 
@@ -114,6 +136,8 @@ def get_all_currencies() -> tuple[ResponseModel, int]:
 @view_bp.route('/user/registration', methods=['POST'])
 @validate()
 def register_user(body: RequestUserModel) -> tuple[ResponseModel, int]:
+    mark_user_write(body.name)
+
     try:
         with create_session() as session:
             new_user = User(name=body.name)
@@ -124,7 +148,13 @@ def register_user(body: RequestUserModel) -> tuple[ResponseModel, int]:
             session.add(wallet)
             session.flush()
 
+            # the starting point for the balance history
+            take_snapshot(session, wallet.id)
+
             user_data = UserModel.from_orm(new_user)
+            wallet_id = wallet.id
+
+        cache_user(user_data.name, user_data.id, wallet_id)
 
     except IntegrityError:
         return (
@@ -146,35 +176,10 @@ def register_user(body: RequestUserModel) -> tuple[ResponseModel, int]:
 
 @view_bp.route('/user/<user_name>', methods=['GET'])
 @validate()
+@cbor_negotiable
 def get_user_info(user_name: str) -> tuple[ResponseModel, int]:
-    with create_session() as session:
-        user = session.query(User).filter(User.name == user_name).one_or_none()
-
-        if user is None:
-            return (
-                ResponseModel(
-                    status=StatusType.ERROR,
-                    error='There is no such user!',
-                ),
-                HTTPStatus.NOT_FOUND,
-            )
-
-        return (
-            ResponseModel(
-                status=StatusType.OK,
-                data=UserModel.from_orm(user),
-            ),
-            HTTPStatus.OK,
-        )
-
-
-@view_bp.route('/user/<user_name>/operations', methods=['GET'])
-@validate()
-def get_user_operations_info(
-    user_name: str, query: QueryModel
-) -> tuple[ResponseModel, int]:
-    with create_session() as session:
-        user = session.query(User).filter(User.name == user_name).one_or_none()
+    with create_read_session(user_name) as session:
+        user = get_user(session, user_name)
 
         if user is None:
             return (
@@ -185,63 +190,15 @@ def get_user_operations_info(
                 HTTPStatus.NOT_FOUND,
             )
 
-        operations = (
-            session.query(CurrencyOperation)
-            .filter(CurrencyOperation.wallet_id == user.wallet.id)
-            .limit(query.limit)
-            .offset(query.limit * query.page)
-            .all()
-        )
+        user_data = UserModel.from_orm(user)
+        # the tables are behind the in-memory wallets until the next compaction
+        if app.wallet_engine is not None:  # type: ignore
+            user_data.wallet = app.wallet_engine.wallet_model(user.wallet.id)  # type: ignore
 
         return (
             ResponseModel(
                 status=StatusType.OK,
-                data=operations,
+                data=user_data,
             ),
             HTTPStatus.OK,
         )
-
-
-@view_bp.route('/trade', methods=['POST'])
-@validate()
-def make_operation(body: OperationModel) -> tuple[ResponseModel, int]:
-    with create_session() as session:
-        currency = (
-            session.query(Currency)
-            .filter(Currency.name == body.currency_name)
-            .one_or_none()
-        )
-
-        if currency is None:
-            return (
-                ResponseModel(
-                    status=StatusType.ERROR,
-                    error='There is no such cryptocurrency!',
-                ),
-                HTTPStatus.NOT_FOUND,
-            )
-
-        user = session.query(User).filter(User.name == body.user_name).one_or_none()
-
-        if user is None:
-            return (
-                ResponseModel(
-                    status=StatusType.ERROR,
-                    error='There is no such user!',
-                ),
-                HTTPStatus.NOT_FOUND,
-            )
-
-        if not currency.exchange_rate == body.exchange_rate:
-            return (
-                ResponseModel(
-                    status=StatusType.ERROR,
-                    error='You are trying to perform an operation '
-                    'at an outdated exchange rate, please try again.',
-                ),
-                HTTPStatus.CONFLICT,
-            )
-
-        if body.operation == CurrencyOperationType.BUY:
-            return buy_currency(session, user, currency, body.currency_amount)
-        return sell_currency(session, user, currency, body.currency_amount)
@@ -0,0 +1,174 @@
+"""
+Pre-fork server using every core: the app is created once, then worker processes
+forked from it serve the same listening socket with the threaded werkzeug server.
+The rate changer runs in a process of its own.
+
+    APP_CONFIG=config.ProductionConfig python -m exchange.server --workers 4
+"""
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Any, Callable, NoReturn, Optional
+
+import click
+from flask import Flask
+from werkzeug.serving import make_server
+
+from exchange import create_app, rate_limiter, start_rate_changer
+from exchange.database import Session
+from exchange.rate_changer import create_rate_changer
+
+# a process dying sooner than this after its start is restarted with a growing delay
+MIN_UPTIME = 10.0
+RESTART_DELAY_MIN = 0.1
+RESTART_DELAY_MAX = 30.0
+
+
+def reset_after_fork(app: Flask) -> None:
+    # Pooled connections were inherited from the parent, using them from two processes
+    # corrupts them. The pools are replaced without closing them, that would close
+    # the connections for the parent too (what `dispose(close=False)` does since
+    # SQLAlchemy 1.4.33). New connections are opened by each process on demand.
+    for engine in [app.db_engine, *app.replica_engines]:  # type: ignore
+        engine.pool = engine.pool.recreate()
+    Session.remove()
+
+
+def prepare_app(app: Flask, workers: int) -> None:
+    """Makes the app created in the parent ready to be shared by the workers"""
+    if workers > 1 and app.wallet_engine is not None:  # type: ignore
+        raise click.UsageError(
+            'The in-memory wallet engine keeps wallets of one process, run one worker'
+        )
+
+    # the workers don't change rates, a process of its own does
+    app.before_first_request_funcs = [
+        function
+        for function in app.before_first_request_funcs
+        if function is not start_rate_changer
+    ]
+
+    # buckets of every worker would let a client through `workers` times as often
+    if workers > 1 and app.config['RATE_LIMIT_BACKEND'] == 'memory':
+        app.config['RATE_LIMIT_BACKEND'] = 'shared'
+        rate_limiter.init_app(app)
+
+
+def fork(target: Callable[[], Any]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        _run_child(target)
+    return pid
+
+
+def _run_child(target: Callable[[], Any]) -> NoReturn:
+    # the handlers of the parent stop the children
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    code = 0
+    try:
+        target()
+    except KeyboardInterrupt:
+        pass
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # never return into the code of the parent
+        os._exit(code)  # pylint: disable=protected-access
+
+
+def run_worker(app: Flask, listener: socket.socket) -> None:
+    reset_after_fork(app)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def run_rate_changer(app: Flask) -> None:
+    reset_after_fork(app)
+    rate_changer = create_rate_changer(app)
+    # let the tick being made finish
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: rate_changer.stop())
+    rate_changer.run()
+
+
+def restart_delay(previous: float, uptime: float) -> float:
+    """
+    Seconds to wait before starting a process again, doubled every time it dies
+    soon after the start, so a crashing process doesn't make the server spin
+    """
+    if uptime >= MIN_UPTIME:
+        return 0.0
+    return min(max(previous * 2, RESTART_DELAY_MIN), RESTART_DELAY_MAX)
+
+
+def serve(app: Flask, host: str, port: int, workers: int) -> None:
+    prepare_app(app, workers)
+
+    listener = socket.create_server((host, port), backlog=1024)
+    listener.set_inheritable(True)
+
+    # pid -> how to start the process again if it dies, when it was started
+    processes: dict[int, tuple[Callable[[], Any], float]] = {}
+    # the last restart delay of the process
+    delays: dict[Callable[[], Any], float] = {}
+
+    def start(target: Callable[[], Any]) -> None:
+        processes[fork(target)] = (target, time.monotonic())
+
+    for _ in range(workers):
+        start(lambda: run_worker(app, listener))
+    if app.config['IS_RATE_CHANGER']:
+        start(lambda: run_rate_changer(app))
+
+    click.echo(f'Serving on http://{host}:{port} with {workers} workers')
+
+    stopping = False
+
+    def stop(_signum: int, _frame: Optional[Any]) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in processes:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while processes:
+        pid, status = os.wait()
+        target, started_at = processes.pop(pid)
+        if stopping:
+            continue
+
+        delay = restart_delay(delays.get(target, 0.0), time.monotonic() - started_at)
+        delays[target] = delay
+        click.echo(
+            f'Process {pid} exited with {status}, starting a new one in {delay:.1f}s'
+        )
+        time.sleep(delay)
+        if not stopping:
+            start(target)
+
+    listener.close()
+
+
+@click.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=5000, show_default=True)
+@click.option(
+    '--workers', type=int, default=os.cpu_count() or 1, help='Defaults to the CPUs.'
+)
+def serve_command(host: str, port: int, workers: int) -> None:
+    """Serves the app configured by APP_CONFIG with a process per worker."""
+    serve(create_app(), host, port, workers)
+
+
+if __name__ == '__main__':
+    serve_command()  # pylint: disable=no-value-for-parameter
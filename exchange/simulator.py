@@ -0,0 +1,203 @@
+import hashlib
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+from pathlib import Path
+from random import Random
+from typing import Any
+
+import click
+from flask import Flask
+from pydantic import BaseModel
+
+from config import SimulatorConfig
+from exchange import create_app
+from exchange.database import create_session
+from exchange.models import Base, Currency, CurrencyOperationType, market_random
+from exchange.rate_changer import RateChanger
+
+
+class TraderGroupModel(BaseModel):
+    count: int
+    # chance of every trader in the group to make a trade on a tick
+    trade_probability: float
+    # chance that the trade is a purchase rather than a sale
+    buy_probability: float = 0.5
+    max_amount: Decimal = Decimal('1')
+
+
+class ScenarioModel(BaseModel):
+    currency_count: int = 5
+    # simulated time in seconds, a day by default
+    duration: int = 86400
+    # simulated seconds between two changes of the rates
+    tick_interval: float = 10
+    # rates change by up to this many percent per tick, in both directions
+    volatility: int = 10
+    traders: list[TraderGroupModel]
+
+
+class LatencyModel(BaseModel):
+    count: int
+    p50_ms: float
+    p99_ms: float
+
+
+class SimulationReportModel(BaseModel):
+    seed: int
+    ticks: int
+    requests: int
+    statuses: dict[int, int]
+    elapsed_seconds: float
+    requests_per_second: float
+    latency: dict[str, LatencyModel]
+    # equal for runs of the same scenario with the same seed
+    rates_digest: str
+
+
+class Simulator:
+    """
+    Replays the scenario against the app through its test client.
+
+    Time is simulated: the rate changer is ticked directly instead of sleeping,
+    so the duration of the scenario only affects the number of ticks.
+    All randomness comes from the seed, both for the market and for the traders.
+    """
+
+    def __init__(self, app: Flask, scenario: ScenarioModel, seed: int):
+        self.app = app
+        self.scenario = scenario
+        self.seed = seed
+        self.random = Random(seed)
+        self.client = app.test_client()
+        self.statuses: Counter[int] = Counter()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.currencies = [f'coin{i}' for i in range(scenario.currency_count)]
+        groups = [group for group in scenario.traders for _ in range(group.count)]
+        self.traders = [(f'trader{i}', group) for i, group in enumerate(groups)]
+
+    def request(self, name: str, method: str, url: str, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statuses[response.status_code] += 1
+        return response.get_json()
+
+    def trade(self, user_name: str, group: TraderGroupModel) -> None:
+        currency_name = self.random.choice(self.currencies)
+        operation = (
+            CurrencyOperationType.BUY
+            if self.random.random() < group.buy_probability
+            else CurrencyOperationType.SELL
+        )
+        amount = (
+            group.max_amount * Decimal(self.random.randint(1, 100)) / 100
+        ).quantize(Decimal('0.01'))
+
+        currency = self.request('currency', 'GET', f'/currency/{currency_name}')
+        self.request(
+            'trade',
+            'POST',
+            '/trade',
+            json={
+                'currency_name': currency_name,
+                'user_name': user_name,
+                'operation': operation.value,
+                'currency_amount': str(amount),
+                'exchange_rate': currency['data']['exchange_rate'],
+            },
+        )
+
+    def run(self) -> SimulationReportModel:
+        market_random.seed(self.seed)
+        rate_changer = RateChanger(
+            0,
+            -self.scenario.volatility,
+            self.scenario.volatility + 1,
+            self.app.commission_schedule,  # type: ignore
+        )
+        ticks = int(self.scenario.duration / self.scenario.tick_interval)
+        started = time.perf_counter()
+
+        with self.app.app_context():
+            for name in self.currencies:
+                self.request(
+                    'add_currency', 'POST', '/currency/add', json={'name': name}
+                )
+            for user_name, _ in self.traders:
+                self.request(
+                    'registration',
+                    'POST',
+                    '/user/registration',
+                    json={'name': user_name},
+                )
+
+            for _ in range(ticks):
+                for user_name, group in self.traders:
+                    if self.random.random() < group.trade_probability:
+                        self.trade(user_name, group)
+                rate_changer.tick()
+
+            rates_digest = self.rates_digest()
+
+        elapsed = time.perf_counter() - started
+        requests = sum(self.statuses.values())
+        return SimulationReportModel(
+            seed=self.seed,
+            ticks=ticks,
+            requests=requests,
+            statuses=dict(self.statuses),
+            elapsed_seconds=elapsed,
+            requests_per_second=requests / elapsed,
+            latency={
+                name: LatencyModel(
+                    count=len(values),
+                    p50_ms=statistics.median(values) * 1000,
+                    p99_ms=percentile(values, 0.99) * 1000,
+                )
+                for name, values in self.latencies.items()
+            },
+            rates_digest=rates_digest,
+        )
+
+    @staticmethod
+    def rates_digest() -> str:
+        with create_session() as session:
+            rates = session.query(Currency.name, Currency.exchange_rate).order_by(
+                Currency.name
+            )
+            return hashlib.sha256(repr(rates.all()).encode()).hexdigest()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@click.command('simulate')
+@click.argument('scenario_file', type=click.Path(exists=True, path_type=Path))
+@click.option('--seed', type=int, default=0, show_default=True)
+def simulate_command(scenario_file: Path, seed: int) -> None:
+    """Replays the scenario against a fresh database and prints a report."""
+    scenario = ScenarioModel.parse_file(scenario_file)
+
+    db_fd, database_file = tempfile.mkstemp()
+    SimulatorConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_file}'
+    app = create_app(SimulatorConfig)
+
+    try:
+        Base.metadata.create_all(app.db_engine)  # type: ignore  # pylint: disable=no-member
+        report = Simulator(app, scenario, seed).run()
+    finally:
+        app.db_engine.dispose()  # type: ignore  # pylint: disable=no-member
+        os.close(db_fd)
+        os.unlink(database_file)
+
+    click.echo(report.json(indent=2))
+
+
+if __name__ == '__main__':
+    simulate_command()  # pylint: disable=no-value-for-parameter
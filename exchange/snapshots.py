@@ -0,0 +1,134 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from exchange.archive import all_operations
+from exchange.database import create_session
+from exchange.models import (
+    CurrencyInWallet,
+    CurrencyInWalletSnapshot,
+    CurrencyOperation,
+    CurrencyOperationType,
+    Wallet,
+    WalletSnapshot,
+)
+from exchange.models_schema import CurrencyInWalletModel, WalletModel
+
+
+def take_snapshot(session: Session, wallet_id: int) -> WalletSnapshot:
+    snapshot = WalletSnapshot(wallet_id=wallet_id, operation_id=0, balance=0)
+    session.add(snapshot)
+    # The insert starts a write transaction, so on SQLite no trade can commit
+    # until the snapshot is taken; databases with row locks are held off by FOR UPDATE.
+    session.flush()
+
+    wallet = (
+        session.query(Wallet)
+        .filter(Wallet.id == wallet_id)
+        .populate_existing()
+        .with_for_update()
+        .one()
+    )
+    snapshot.balance = wallet.balance
+    # the archive too, the wallet may have no recent operations
+    operations = all_operations(lambda table: [table.wallet_id == wallet_id])
+    snapshot.operation_id = session.query(
+        func.coalesce(func.max(operations.c.id), 0)
+    ).scalar()
+    snapshot.currencies = [
+        CurrencyInWalletSnapshot(
+            currency_id=currency_id, currency_amount=currency_amount
+        )
+        for currency_id, currency_amount in session.query(
+            CurrencyInWallet.currency_id, CurrencyInWallet.currency_amount
+        ).filter(CurrencyInWallet.wallet_id == wallet_id)
+    ]
+
+    return snapshot
+
+
+def wallets_due_for_snapshot(session: Session, every: int) -> list[int]:
+    """Wallets with at least `every` operations since their last snapshot"""
+    last_snapshots = (
+        session.query(
+            WalletSnapshot.wallet_id,
+            func.max(WalletSnapshot.operation_id).label('operation_id'),
+        )
+        .group_by(WalletSnapshot.wallet_id)
+        .subquery()
+    )
+
+    return [
+        wallet_id
+        for wallet_id, in session.query(CurrencyOperation.wallet_id)
+        .outerjoin(
+            last_snapshots, last_snapshots.c.wallet_id == CurrencyOperation.wallet_id
+        )
+        .filter(CurrencyOperation.id > func.coalesce(last_snapshots.c.operation_id, 0))
+        .group_by(CurrencyOperation.wallet_id)
+        .having(func.count() >= every)
+    ]
+
+
+def snapshot_wallets(every: int) -> int:
+    """Snapshots every wallet which is due, each one in its own short transaction"""
+    with create_session() as session:
+        wallet_ids = wallets_due_for_snapshot(session, every)
+
+    for wallet_id in wallet_ids:
+        with create_session() as session:
+            take_snapshot(session, wallet_id)
+
+    return len(wallet_ids)
+
+
+def balance_at(
+    session: Session, wallet_id: int, moment: datetime
+) -> Optional[WalletModel]:
+    """
+    State of the wallet at the moment: the last snapshot taken before it
+    and the operations made after the snapshot replayed on top.
+    None if there is no snapshot that old.
+    """
+    snapshot = (
+        session.query(WalletSnapshot)
+        .filter(WalletSnapshot.wallet_id == wallet_id)
+        .filter(WalletSnapshot.created_at <= moment)
+        .order_by(WalletSnapshot.created_at.desc(), WalletSnapshot.id.desc())
+        .first()
+    )
+
+    if snapshot is None:
+        return None
+
+    balance = snapshot.balance
+    holdings = {c.currency_id: c.currency_amount for c in snapshot.currencies}
+
+    operations = all_operations(
+        lambda table: [
+            table.wallet_id == wallet_id,
+            table.id > snapshot.operation_id,
+            table.created_at <= moment,
+        ]
+    )
+    for operation in session.query(operations).order_by(operations.c.id):
+        if operation.type == CurrencyOperationType.BUY:
+            balance -= operation.exchange_rate * operation.amount
+            holdings[operation.currency_id] = (
+                holdings.get(operation.currency_id, Decimal('0')) + operation.amount
+            )
+        else:
+            balance += operation.exchange_rate * operation.amount
+            holdings[operation.currency_id] -= operation.amount
+
+    return WalletModel(
+        balance=balance,
+        currencies=[
+            CurrencyInWalletModel(currency_id=currency_id, currency_amount=amount)
+            for currency_id, amount in holdings.items()
+            if amount != 0
+        ],
+    )
@@ -0,0 +1,44 @@
+from typing import Callable, Iterator, Optional, Type
+
+from flask import Response
+from flask import current_app as app
+from flask import stream_with_context
+from pydantic import BaseModel
+from sqlalchemy.orm import Query, Session
+
+from exchange.database import create_read_session, create_session
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def ndjson_response(
+    make_query: Callable[[Session], Query],
+    model: Type[BaseModel],
+    user_name: Optional[str] = None,
+    from_primary: bool = False,
+) -> Response:
+    """
+    Streams the rows of the query as newline delimited JSON, one `model` per line.
+
+    Rows are fetched with `yield_per` and sent as soon as a chunk is serialized,
+    so neither the rows nor the response body are ever held in memory as a whole.
+    The session lives as long as the response is being streamed. `from_primary`
+    skips the replicas, for responses which have to be as fresh as their ETag.
+    """
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+
+    def generate() -> Iterator[str]:
+        with (
+            create_session() if from_primary else create_read_session(user_name)
+        ) as session:
+            lines = []
+            for row in make_query(session).yield_per(chunk_size):
+                lines.append(model.from_orm(row).json() + '\n')
+                if len(lines) == chunk_size:
+                    yield ''.join(lines)
+                    lines.clear()
+
+            if lines:
+                yield ''.join(lines)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,214 @@
+from http import HTTPStatus
+
+from flask import Blueprint
+from flask import current_app as app
+from flask_pydantic import validate
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from exchange.currency_operations import (
+    TradeFailed,
+    buy_currency,
+    outdated_rate_error,
+    sell_currency,
+    swap_currency,
+)
+from exchange.database import create_read_session, mark_user_write
+from exchange.encoding import compress_response
+from exchange.group_commit import run_transaction
+from exchange.memory_trades import swap_in_memory, trade_in_memory
+from exchange.models import Currency, CurrencyOperationType
+from exchange.models_schema import OperationModel, ResponseModel, StatusType, SwapModel
+from exchange.name_cache import get_currency, get_currency_quote, user_ids
+from exchange.profiling import time_routes
+from exchange.quotes import get_quote_table
+from exchange.rate_limiter import rate_limited
+
+trading_bp = Blueprint('trading', __name__)
+time_routes(trading_bp)
+trading_bp.after_request(compress_response)
+
+
+def conflict_error() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='Your wallet is being changed by another operation, please try again.',
+        ),
+        HTTPStatus.CONFLICT,
+    )
+
+
+def currency_not_found() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='There is no such cryptocurrency!',
+        ),
+        HTTPStatus.NOT_FOUND,
+    )
+
+
+def user_not_found() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='There is no such user!',
+        ),
+        HTTPStatus.NOT_FOUND,
+    )
+
+
+def same_currency_error() -> tuple[ResponseModel, int]:
+    return (
+        ResponseModel(
+            status=StatusType.ERROR,
+            error='A currency can not be swapped for itself',
+        ),
+        HTTPStatus.BAD_REQUEST,
+    )
+
+
+@trading_bp.route('/trade', methods=['POST'])
+@validate()
+@rate_limited
+def make_operation(body: OperationModel) -> tuple[ResponseModel, int]:
+    # marked before the write, so a read right after the commit can't hit a stale replica
+    mark_user_write(body.user_name)
+
+    if app.wallet_engine is not None:  # type: ignore
+        # nothing is written to the database, so there is no transaction to commit
+        with create_read_session(body.user_name) as session:
+            return trade_with_engine(session, body)
+
+    try:
+        return run_transaction(lambda session: trade(session, body))
+    except StaleDataError:
+        return conflict_error()
+
+
+def trade(session: Session, body: OperationModel) -> tuple[ResponseModel, int]:
+    currency = get_currency(session, body.currency_name)
+
+    if currency is None:
+        return currency_not_found()
+
+    # the wallet id is cached with the user, the wallet itself isn't loaded
+    ids = user_ids(session, body.user_name)
+
+    if ids is None:
+        return user_not_found()
+    _, wallet_id = ids
+
+    # checked again by the write, in case the rate changes in the meantime
+    if not currency.exchange_rate == body.exchange_rate:
+        return outdated_rate_error()
+
+    if body.operation == CurrencyOperationType.BUY:
+        return buy_currency(session, wallet_id, currency, body.currency_amount)
+    return sell_currency(session, wallet_id, currency, body.currency_amount)
+
+
+def trade_with_engine(
+    session: Session, body: OperationModel
+) -> tuple[ResponseModel, int]:
+    quotes = get_quote_table()
+    quote = get_currency_quote(quotes, body.currency_name)
+
+    if quote is None:
+        return currency_not_found()
+
+    ids = user_ids(session, body.user_name)
+
+    if ids is None:
+        return user_not_found()
+    _, wallet_id = ids
+
+    if quote.exchange_rate != body.exchange_rate:
+        return outdated_rate_error()
+
+    return trade_in_memory(
+        wallet_id, quote, body.operation, body.currency_amount, quotes.version
+    )
+
+
+@trading_bp.route('/swap', methods=['POST'])
+@validate()
+@rate_limited
+def swap_currencies(body: SwapModel) -> tuple[ResponseModel, int]:
+    mark_user_write(body.user_name)
+
+    if app.wallet_engine is not None:  # type: ignore
+        with create_read_session(body.user_name) as session:
+            return swap_with_engine(session, body)
+
+    try:
+        return run_transaction(lambda session: swap(session, body))
+    except StaleDataError:
+        return conflict_error()
+    except TradeFailed as e:
+        return e.response
+
+
+def swap(session: Session, body: SwapModel) -> tuple[ResponseModel, int]:
+    # both rates are read at once and used for both legs
+    currencies = {
+        currency.name: currency
+        for currency in session.query(Currency).filter(
+            Currency.name.in_((body.from_currency_name, body.to_currency_name))
+        )
+    }
+    from_currency = currencies.get(body.from_currency_name)
+    to_currency = currencies.get(body.to_currency_name)
+
+    if from_currency is None or to_currency is None:
+        return currency_not_found()
+
+    if from_currency is to_currency:
+        return same_currency_error()
+
+    # the wallet id is cached with the user, the wallet itself isn't loaded
+    ids = user_ids(session, body.user_name)
+
+    if ids is None:
+        return user_not_found()
+    _, wallet_id = ids
+
+    if (
+        from_currency.exchange_rate != body.from_exchange_rate
+        or to_currency.exchange_rate != body.to_exchange_rate
+    ):
+        return outdated_rate_error()
+
+    return swap_currency(
+        session, wallet_id, from_currency, to_currency, body.currency_amount
+    )
+
+
+def swap_with_engine(session: Session, body: SwapModel) -> tuple[ResponseModel, int]:
+    # both rates come from one table, so they are of the same version
+    quotes = get_quote_table()
+    from_quote = get_currency_quote(quotes, body.from_currency_name)
+    to_quote = get_currency_quote(quotes, body.to_currency_name)
+
+    if from_quote is None or to_quote is None:
+        return currency_not_found()
+
+    if from_quote.id == to_quote.id:
+        return same_currency_error()
+
+    ids = user_ids(session, body.user_name)
+
+    if ids is None:
+        return user_not_found()
+    _, wallet_id = ids
+
+    if (
+        from_quote.exchange_rate != body.from_exchange_rate
+        or to_quote.exchange_rate != body.to_exchange_rate
+    ):
+        return outdated_rate_error()
+
+    return swap_in_memory(
+        wallet_id, from_quote, to_quote, body.currency_amount, quotes.version
+    )
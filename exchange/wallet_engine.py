@@ -0,0 +1,293 @@
+import logging
+from datetime import datetime
+from decimal import Decimal
+from http import HTTPStatus
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Any, Optional
+
+from flask import Flask, current_app
+from sqlalchemy.orm import Session
+
+from exchange.currency_operations import outdated_rate_error
+from exchange.database import create_independent_session
+from exchange.journal import Journal
+from exchange.models import (
+    CurrencyInWallet,
+    CurrencyOperation,
+    CurrencyOperationType,
+    JournalCheckpoint,
+    Wallet,
+)
+from exchange.models_schema import (
+    CurrencyInWalletModel,
+    ResponseModel,
+    StatusType,
+    WalletModel,
+)
+from exchange.rate_version import get_rate_version
+from exchange.wallet_state import Leg, WalletState
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryWalletEngine:
+    """
+    Keeps balances and holdings of all wallets in memory.
+
+    Trades only mutate the memory and are made durable by the journal, one record
+    with all the legs of a trade. Every `compact_every` records a background
+    thread writes the state of the touched wallets and the operations to the SQL
+    tables, together with the sequence number of the last compacted record, and
+    empties the journal. On start the state is loaded from the tables and the
+    records after that sequence number are replayed.
+
+    The state belongs to one process: run a single worker with this engine.
+    """
+
+    def __init__(self, journal: Journal, compact_every: int):
+        self.journal = journal
+        self.compact_every = compact_every
+        self._wallets: dict[int, WalletState] = {}
+        self._loaded = False
+        self._seq = 0
+        # journal records which are not in the SQL tables yet
+        self._pending: list[dict[str, Any]] = []
+        self._lock = Lock()
+        self._compact_lock = Lock()
+        self._compaction: Optional[Thread] = None
+
+    def _load(self) -> None:
+        with create_independent_session() as session:
+            checkpoint = session.get(JournalCheckpoint, JournalCheckpoint.ID)
+            self._seq = checkpoint.seq if checkpoint is not None else 0
+
+            for wallet_id, balance in session.query(Wallet.id, Wallet.balance):
+                self._wallets[wallet_id] = WalletState(balance, {})
+            for wallet_id, currency_id, amount in session.query(
+                CurrencyInWallet.wallet_id,
+                CurrencyInWallet.currency_id,
+                CurrencyInWallet.currency_amount,
+            ):
+                self._wallets[wallet_id].holdings[currency_id] = amount
+
+        for record in self.journal.records():
+            if record['seq'] > self._seq:
+                self._wallets[record['wallet_id']].apply(record)
+                self._pending.append(record)
+                self._seq = record['seq']
+
+        self._loaded = True
+
+    def _wallet(self, wallet_id: int) -> WalletState:
+        if not self._loaded:
+            self._load()
+
+        wallet = self._wallets.get(wallet_id)
+        # registered after the start, so it has no operations in the journal yet
+        if wallet is None:
+            with create_independent_session() as session:
+                balance = session.query(Wallet.balance).filter(Wallet.id == wallet_id)
+                holdings = session.query(
+                    CurrencyInWallet.currency_id, CurrencyInWallet.currency_amount
+                ).filter(CurrencyInWallet.wallet_id == wallet_id)
+                wallet = WalletState(balance.scalar(), dict(holdings.all()))
+            self._wallets[wallet_id] = wallet
+
+        return wallet
+
+    def execute(
+        self, wallet_id: int, legs: list[Leg], rate_version: int
+    ) -> tuple[ResponseModel, int]:
+        """
+        Makes all the operations or none of them, at the rates of `rate_version`:
+        if the rates have changed since, none is made.
+        """
+        with self._lock:
+            if get_rate_version() != rate_version:
+                return outdated_rate_error()
+
+            wallet = self._wallet(wallet_id)
+
+            error = wallet.check(legs)
+            if error is not None:
+                return (
+                    ResponseModel(status=StatusType.ERROR, error=error),
+                    HTTPStatus.CONFLICT,
+                )
+
+            record: dict[str, Any] = {
+                'seq': self._seq + 1,
+                'wallet_id': wallet_id,
+                'created_at': datetime.now().isoformat(),
+                'legs': [
+                    {
+                        'currency_id': leg.currency_id,
+                        'type': leg.type.value,
+                        'amount': str(leg.amount),
+                        'exchange_rate': str(leg.exchange_rate),
+                    }
+                    for leg in legs
+                ],
+            }
+            # written before it is applied, so a failed write leaves the memory as is
+            ticket = self.journal.write(record)
+            self._seq = record['seq']
+            wallet.apply(record)
+            self._pending.append(record)
+            compact = len(self._pending) >= self.compact_every
+
+        self.journal.wait_durable(ticket)
+        if compact:
+            self._start_compaction()
+
+        return (
+            ResponseModel(
+                status=StatusType.OK,
+            ),
+            HTTPStatus.OK,
+        )
+
+    def wallet_model(self, wallet_id: int) -> WalletModel:
+        with self._lock:
+            wallet = self._wallet(wallet_id)
+            return WalletModel(
+                balance=wallet.balance,
+                currencies=[
+                    CurrencyInWalletModel(
+                        currency_id=currency_id, currency_amount=amount
+                    )
+                    for currency_id, amount in wallet.holdings.items()
+                ],
+            )
+
+    def compact_pending(self) -> None:
+        """
+        Compacts right away if any trades are not in the tables yet,
+        for reads of the tables which have to see all of them.
+        """
+        with self._lock:
+            if self._loaded and not self._pending:
+                return
+        self.compact()
+
+    def _start_compaction(self) -> None:
+        # off the request thread: the trade is durable already, and the database
+        # may be locked by the transaction of the very request making it
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = Thread(
+                target=self._compact_in_background,
+                name='wallet-compaction',
+                daemon=True,
+            )
+            self._compaction.start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Compaction of the wallet journal failed')
+
+    def wait_compacted(self) -> None:
+        """Waits for the background compaction, if one is running"""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def compact(self) -> None:
+        with self._compact_lock:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                records, self._pending = self._pending, []
+                seq = self._seq
+                states = {
+                    wallet_id: (
+                        self._wallets[wallet_id].balance,
+                        dict(self._wallets[wallet_id].holdings),
+                    )
+                    for wallet_id in {record['wallet_id'] for record in records}
+                }
+                self.journal.rotate()
+
+            try:
+                with create_independent_session() as session:
+                    self._write_states(session, states)
+                    session.bulk_insert_mappings(
+                        CurrencyOperation,
+                        [
+                            {
+                                'wallet_id': record['wallet_id'],
+                                'currency_id': leg['currency_id'],
+                                'type': CurrencyOperationType(leg['type']),
+                                'amount': Decimal(leg['amount']),
+                                'exchange_rate': Decimal(leg['exchange_rate']),
+                                'created_at': datetime.fromisoformat(
+                                    record['created_at']
+                                ),
+                            }
+                            for record in records
+                            for leg in record['legs']
+                        ],
+                    )
+                    session.merge(JournalCheckpoint(id=JournalCheckpoint.ID, seq=seq))
+            except Exception:
+                # the records are still in the old journal file, try again next time
+                with self._lock:
+                    self._pending[:0] = records
+                raise
+
+            self.journal.remove_old()
+
+    @staticmethod
+    def _write_states(
+        session: Session, states: dict[int, tuple[Decimal, dict[int, Decimal]]]
+    ) -> None:
+        for wallet_id, (balance, holdings) in states.items():
+            session.query(Wallet).filter(Wallet.id == wallet_id).update(
+                {Wallet.balance: balance, Wallet.version: Wallet.version + 1},
+                synchronize_session=False,
+            )
+
+            rows = {
+                row.currency_id: row
+                for row in session.query(CurrencyInWallet).filter(
+                    CurrencyInWallet.wallet_id == wallet_id
+                )
+            }
+            for currency_id, amount in holdings.items():
+                if currency_id in rows:
+                    rows.pop(currency_id).currency_amount = amount
+                else:
+                    session.add(
+                        CurrencyInWallet(
+                            wallet_id=wallet_id,
+                            currency_id=currency_id,
+                            currency_amount=amount,
+                        )
+                    )
+            for row in rows.values():
+                session.delete(row)
+
+
+def compact_wallet_engine() -> None:
+    """Brings the operations and wallets in the tables up to date with the engine"""
+    if current_app.wallet_engine is not None:  # type: ignore
+        current_app.wallet_engine.compact_pending()  # type: ignore
+
+
+def init_app(app: Flask) -> Flask:
+    app.wallet_engine = None  # type: ignore
+
+    if app.config['WALLET_ENGINE'] == 'memory':
+        app.wallet_engine = InMemoryWalletEngine(  # type: ignore
+            Journal(
+                Path(app.config['WALLET_JOURNAL_PATH']),
+                app.config['JOURNAL_SYNC_INTERVAL'],
+            ),
+            app.config['JOURNAL_COMPACT_EVERY'],
+        )
+
+    return app
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from typing import Any, NamedTuple, Optional
+
+from exchange.models import CurrencyOperationType
+
+
+class Leg(NamedTuple):
+    type: CurrencyOperationType
+    currency_id: int
+    amount: Decimal
+    exchange_rate: Decimal
+
+
+class WalletState:
+    __slots__ = ('balance', 'holdings')
+
+    def __init__(self, balance: Decimal, holdings: dict[int, Decimal]):
+        self.balance = balance
+        # currency id -> amount, only currencies with a positive amount
+        self.holdings = holdings
+
+    def apply(self, record: dict[str, Any]) -> None:
+        """Applies the legs of a journal record"""
+        for leg in record['legs']:
+            amount = Decimal(leg['amount'])
+            cost = Decimal(leg['exchange_rate']) * amount
+            currency_id = leg['currency_id']
+
+            if leg['type'] == CurrencyOperationType.BUY.value:
+                self.balance -= cost
+                self.holdings[currency_id] = (
+                    self.holdings.get(currency_id, Decimal('0')) + amount
+                )
+            else:
+                self.balance += cost
+                self.holdings[currency_id] -= amount
+                if self.holdings[currency_id] == 0:
+                    del self.holdings[currency_id]
+
+    def check(self, legs: list[Leg]) -> Optional[str]:
+        """Returns why the legs can't be made one after another, if they can't"""
+        balance = self.balance
+        holdings = dict(self.holdings)
+
+        for leg in legs:
+            cost = leg.exchange_rate * leg.amount
+            if leg.type == CurrencyOperationType.BUY:
+                if balance < cost:
+                    return 'You do not have enough money to make this transaction'
+                balance -= cost
+                holdings[leg.currency_id] = (
+                    holdings.get(leg.currency_id, 0) + leg.amount
+                )
+            elif leg.currency_id not in holdings:
+                return 'You do not have that currency'
+            elif holdings[leg.currency_id] < leg.amount:
+                return (
+                    'You are trying to sell more currency than you have in your wallet'
+                )
+            else:
+                balance += cost
+                holdings[leg.currency_id] -= leg.amount
+
+        return None
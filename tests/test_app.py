@@ -1,5 +1,6 @@
 # pylint: disable=too-many-lines
 # pylint: disable = too-many-arguments
+import json
 from decimal import Decimal
 from http import HTTPStatus
 
@@ -201,7 +202,7 @@ def test_get_user_operations_info(client, limit, page, expected_len_of_items):
 
     response = client.get(
         url_for(
-            'view.get_user_operations_info',
+            'history.get_user_operations_info',
             user_name='username',
             limit=limit,
             page=page,
@@ -215,7 +216,9 @@ def test_get_user_operations_info(client, limit, page, expected_len_of_items):
 
 def test_get_user_operations_info_error(client):
     response = client.get(
-        url_for('view.get_user_operations_info', user_name='username', limit=1, page=0)
+        url_for(
+            'history.get_user_operations_info', user_name='username', limit=1, page=0
+        )
     )
 
     assert response.status_code == HTTPStatus.NOT_FOUND
@@ -302,3 +305,125 @@ def test_make_operation(
     )
 
     assert response.status_code == expected_result
+
+
+def test_get_all_currencies_ndjson(client):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('45717')))
+        session.add(Currency(id=2, name='ethereum', exchange_rate=Decimal('3425.48')))
+
+    response = client.get('/currency/all', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.data.splitlines()] == [
+        {'id': 1, 'name': 'bitcoin', 'exchange_rate': 45717.0},
+        {'id': 2, 'name': 'ethereum', 'exchange_rate': 3425.48},
+    ]
+
+
+def test_get_user_operations_info_ndjson(client):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1))
+        for id_ in range(1, 4):
+            session.add(
+                CurrencyOperation(
+                    id=id_,
+                    currency_id=1,
+                    wallet_id=1,
+                    type=CurrencyOperationType.BUY,
+                    amount=Decimal(id_),
+                )
+            )
+
+    response = client.get(
+        url_for(
+            'history.get_user_operations_info', user_name='username', limit=2, page=0
+        ),
+        headers={'Accept': 'application/x-ndjson'},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert [json.loads(line)['amount'] for line in response.data.splitlines()] == [
+        1.0,
+        2.0,
+    ]
+
+
+def test_get_all_currencies_not_modified(client):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    response = client.get('/currency/all')
+    etag = response.headers['ETag']
+
+    response = client.get('/currency/all', headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['ETag'] == etag
+
+    # another representation of the same rates
+    response = client.get(
+        '/currency/all',
+        headers={'If-None-Match': etag, 'Accept': 'application/x-ndjson'},
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    # adding a currency changes the version
+    client.post('/currency/add', json={'name': 'ethereum'})
+    response = client.get('/currency/all', headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.get_json()['data']) == 2
+
+
+def test_get_currency_info_not_modified(client):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    url = url_for('view.get_currency_info', currency_name='bitcoin')
+    etag = client.get(url).headers['ETag']
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert not response.data
+
+
+@pytest.mark.parametrize(
+    ('from_currency_name', 'to_currency_name', 'user_name', 'rates', 'expected_result'),
+    [
+        ('ripple', 'ethereum', 'username', ('1000', '100'), HTTPStatus.NOT_FOUND),
+        ('bitcoin', 'ethereum', 'otheruser', ('1000', '100'), HTTPStatus.NOT_FOUND),
+        ('bitcoin', 'bitcoin', 'username', ('1000', '1000'), HTTPStatus.BAD_REQUEST),
+        ('bitcoin', 'ethereum', 'username', ('1000', '99'), HTTPStatus.CONFLICT),
+        ('bitcoin', 'ethereum', 'username', ('1000', '100'), HTTPStatus.OK),
+    ],
+    ids=[
+        'there_is_no_such_cryptocurrency',
+        'there_is_no_such_user',
+        'same_currency',
+        'outdated_exchange_rate',
+        'success',
+    ],
+)
+def test_swap_currencies(
+    client, from_currency_name, to_currency_name, user_name, rates, expected_result
+):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000')))
+        session.add(Currency(id=2, name='ethereum', exchange_rate=Decimal('100')))
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=1)
+        )
+
+    response = client.post(
+        '/swap',
+        json={
+            'user_name': user_name,
+            'from_currency_name': from_currency_name,
+            'to_currency_name': to_currency_name,
+            'currency_amount': Decimal('1'),
+            'from_exchange_rate': Decimal(rates[0]),
+            'to_exchange_rate': Decimal(rates[1]),
+        },
+    )
+
+    assert response.status_code == expected_result
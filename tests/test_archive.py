@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateTable
+
+from exchange.archive import archive_chunk
+from exchange.commands import archive_operations_command
+from exchange.database import create_session
+from exchange.models import (
+    CurrencyOperation,
+    CurrencyOperationArchive,
+    CurrencyOperationType,
+    User,
+    Wallet,
+    WalletSnapshot,
+)
+from exchange.models_schema import CurrencyInWalletModel
+from exchange.snapshots import balance_at
+from tests.test_jobs import run_job
+
+
+def add_operations():
+    """Two old and two recent buys of 1 for 10, after a snapshot of an empty wallet"""
+    long_ago = datetime.now() - timedelta(days=100)
+
+    with create_session() as session:
+        session.add(User(id=1, name='archived'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('960')))
+        session.add(
+            WalletSnapshot(
+                wallet_id=1,
+                operation_id=0,
+                balance=Decimal('1000'),
+                created_at=long_ago - timedelta(days=1),
+            )
+        )
+        for id_ in range(1, 5):
+            session.add(
+                CurrencyOperation(
+                    id=id_,
+                    wallet_id=1,
+                    currency_id=1,
+                    type=CurrencyOperationType.BUY,
+                    amount=Decimal('1'),
+                    exchange_rate=Decimal('10'),
+                    created_at=long_ago if id_ <= 2 else datetime.now(),
+                )
+            )
+
+
+def test_archive_operations_command(app, client):
+    add_operations()
+
+    result = app.test_cli_runner().invoke(
+        archive_operations_command, ['--older-than-days', '30', '--chunk-size', '1']
+    )
+    assert result.output == 'Archived 2 operations\n'
+
+    with create_session() as session:
+        assert [op.id for op in session.query(CurrencyOperation)] == [3, 4]
+        assert [op.id for op in session.query(CurrencyOperationArchive)] == [1, 2]
+
+        # the history is replayed from both tables
+        wallet = balance_at(session, 1, datetime.now())
+        assert wallet is not None
+        assert wallet.balance == Decimal('960')
+        assert wallet.currencies == [
+            CurrencyInWalletModel(currency_id=1, currency_amount=Decimal('4'))
+        ]
+
+    # pages go on from the main table into the archive
+    pages = [
+        client.get(
+            '/user/archived/operations', query_string={'limit': 3, 'page': page}
+        ).get_json()['data']
+        for page in (0, 1)
+    ]
+    assert [len(page) for page in pages] == [3, 1]
+    # in the order of ids, the archived ones first
+    assert pages[0][0]['created_at'] < pages[0][2]['created_at']
+
+    response = client.get(
+        '/user/archived/operations',
+        query_string={'limit': 10, 'page': 0},
+        headers={'Accept': 'application/x-ndjson'},
+    )
+    assert len(response.get_data(as_text=True).splitlines()) == 4
+
+
+def test_archive_operations_job(client):
+    add_operations()
+
+    data = run_job(client, 'archive_operations', older_than_days=30)
+    assert (data['status'], data['progress'], data['total']) == ('done', 2, 2)
+
+    with create_session() as session:
+        assert session.query(CurrencyOperationArchive).count() == 2
+
+
+@pytest.mark.parametrize('autoincrement', [True, False])
+def test_ids_of_archived_operations_are_not_reused(app, autoincrement):
+    if not autoincrement:
+        # as created by the versions before AUTOINCREMENT
+        table = CurrencyOperation.__table__
+        ddl = str(CreateTable(table).compile(app.db_engine))
+        with app.db_engine.begin() as connection:
+            table.drop(connection)
+            connection.execute(sa.text(ddl.replace(' AUTOINCREMENT', '')))
+    add_operations()
+
+    with create_session() as session:
+        # the last one stays, new ids are counted on from it
+        assert archive_chunk(session, datetime.now() + timedelta(days=1), 10) == 3
+    with create_session() as session:
+        session.add(
+            CurrencyOperation(
+                wallet_id=1,
+                currency_id=1,
+                type=CurrencyOperationType.SELL,
+                amount=Decimal('1'),
+                exchange_rate=Decimal('10'),
+            )
+        )
+
+    with create_session() as session:
+        assert [op.id for op in session.query(CurrencyOperation)] == [4, 5]
@@ -0,0 +1,163 @@
+# pylint: disable=redefined-outer-name
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm.exc import StaleDataError
+
+from exchange.concurrency import retry_on_conflict
+from exchange.database import create_independent_session, create_session
+from exchange.group_commit import run_transaction
+from exchange.models import (
+    Base,
+    Currency,
+    CurrencyOperation,
+    CurrencyOperationArchive,
+    User,
+    Wallet,
+)
+
+
+@pytest.fixture()
+def wallet():
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('1000')))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+
+def change_balance(amount):
+    with create_independent_session() as session:
+        session.get(Wallet, 1).balance += amount
+
+
+@pytest.mark.usefixtures('wallet')
+def test_lost_update_is_detected():
+    with pytest.raises(StaleDataError):
+        with create_session() as session:
+            wallet = session.get(Wallet, 1)
+            # another transaction commits in between the read and the write
+            change_balance(100)
+            wallet.balance -= 10
+
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert (wallet.balance, wallet.version) == (Decimal('1100'), 2)
+
+
+@pytest.mark.usefixtures('wallet')
+def test_run_transaction_retries_conflicts():
+    attempts = []
+
+    def work(session):
+        wallet = session.get(Wallet, 1)
+        attempts.append(wallet.version)
+        if len(attempts) == 1:
+            change_balance(100)
+        wallet.balance -= 10
+
+    run_transaction(work)
+
+    assert attempts == [1, 2]
+    with create_session() as session:
+        assert session.get(Wallet, 1).balance == Decimal('1090')
+
+
+def test_retries_are_bounded():
+    calls = []
+
+    def run():
+        calls.append(1)
+        raise StaleDataError()
+
+    with pytest.raises(StaleDataError):
+        retry_on_conflict(run, retries=2, backoff=0)
+    assert len(calls) == 3
+
+
+def test_upgrade_adds_version_columns(app):
+    Base.metadata.drop_all(app.db_engine)
+    # the wallet table before the version columns
+    with app.db_engine.begin() as connection:
+        connection.execute(
+            sa.text(
+                'CREATE TABLE wallet (id INTEGER PRIMARY KEY, user_id INTEGER, '
+                'balance NUMERIC(10, 8) NOT NULL)'
+            )
+        )
+        connection.execute(sa.text('INSERT INTO wallet VALUES (1, 1, 1000)'))
+
+    result = app.test_cli_runner().invoke(args=['upgrade_db'])
+    assert result.exit_code == 0, result.output
+    assert result.output == 'Added columns: wallet.version\n'
+
+    change_balance(100)
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert (wallet.balance, wallet.version) == (Decimal('1100'), 2)
+        # the missing tables are created
+        assert session.query(Currency).count() == 0
+
+    result = app.test_cli_runner().invoke(args=['upgrade_db'])
+    assert result.output == 'Up to date\n'
+
+
+# the schema created by the first version of the app
+BASELINE_SCHEMA = (
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, name VARCHAR(10) NOT NULL UNIQUE, '
+    'registration_date DATETIME NOT NULL)',
+    'CREATE TABLE currency (id INTEGER PRIMARY KEY, name VARCHAR(10) NOT NULL UNIQUE, '
+    'exchange_rate NUMERIC(10, 8) NOT NULL)',
+    'CREATE TABLE wallet (id INTEGER PRIMARY KEY, user_id INTEGER, '
+    'balance NUMERIC(10, 8) NOT NULL)',
+    'CREATE TABLE currency_in_wallet (id INTEGER PRIMARY KEY, '
+    'currency_amount NUMERIC(10, 8) NOT NULL, currency_id INTEGER, wallet_id INTEGER)',
+    'CREATE TABLE currency_operation (id INTEGER PRIMARY KEY, currency_id INTEGER, '
+    'wallet_id INTEGER, type VARCHAR(4) NOT NULL, amount NUMERIC(10, 8) NOT NULL)',
+)
+
+
+def test_upgrade_baseline_database(app):
+    Base.metadata.drop_all(app.db_engine)
+    with app.db_engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(sa.text(statement))
+        connection.execute(
+            sa.text("INSERT INTO currency_operation VALUES (1, 1, 1, 'BUY', 2)")
+        )
+
+    result = app.test_cli_runner().invoke(args=['upgrade_db'])
+    assert result.exit_code == 0, result.output
+    assert result.output == (
+        'Added columns: currency.version, wallet.version, currency_in_wallet.version, '
+        'currency_operation.exchange_rate, currency_operation.created_at\n'
+    )
+
+    with create_session() as session:
+        operation = session.get(CurrencyOperation, 1)
+        assert operation.exchange_rate is None
+        assert operation.created_at is not None
+        # the missing tables are created
+        assert session.query(CurrencyOperationArchive).count() == 0
+
+
+def test_upgrade_refuses_columns_without_default(app):
+    Base.metadata.drop_all(app.db_engine)
+    with app.db_engine.begin() as connection:
+        # a table without a required column
+        connection.execute(
+            sa.text(
+                'CREATE TABLE currency (id INTEGER PRIMARY KEY, '
+                'exchange_rate NUMERIC(10, 8) NOT NULL)'
+            )
+        )
+
+    result = app.test_cli_runner().invoke(args=['upgrade_db'])
+    assert result.exit_code == 1
+    assert 'currency.name can not be added' in result.output
+
+    # nothing is added if one of the columns can't be, no table is created either
+    inspector = sa.inspect(app.db_engine)
+    assert 'wallet' not in inspector.get_table_names()
+    columns = inspector.get_columns('currency')
+    assert 'version' not in {column['name'] for column in columns}
@@ -2,10 +2,13 @@ from decimal import Decimal
 from http import HTTPStatus
 
 import pytest
+from sqlalchemy import event
 
-from exchange.currency_operations import buy_currency, sell_currency
-from exchange.database import create_session
+from exchange import currency_operations
+from exchange.currency_operations import buy_currency, sell_currency, swap_currency
+from exchange.database import create_independent_session, create_session
 from exchange.models import Currency, CurrencyInWallet, User, Wallet
+from exchange.models_schema import ResponseModel, StatusType, SwapResultModel
 
 
 @pytest.mark.parametrize(
@@ -26,34 +29,18 @@ def test_buy_currency(exchange_rate, currency_amount, expected_result):
         session.add(currency)
         session.flush()
 
-        response = buy_currency(session, user, currency, currency_amount)
+        response = buy_currency(session, 1, currency, currency_amount)
 
     assert response[1] == expected_result
 
 
 @pytest.mark.parametrize(
-    ('currency_to_sell', 'currency_amount', 'expected_result'),
+    ('currency_id', 'currency_amount', 'expected_result'),
     [
-        (
-            Currency(id=2, name='litecoin', exchange_rate=Decimal('100')),
-            Decimal('1'),
-            HTTPStatus.CONFLICT,
-        ),
-        (
-            Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000')),
-            Decimal('100'),
-            HTTPStatus.CONFLICT,
-        ),
-        (
-            Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000')),
-            Decimal('3'),
-            HTTPStatus.OK,
-        ),
-        (
-            Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000')),
-            Decimal('20'),
-            HTTPStatus.OK,
-        ),
+        (2, Decimal('1'), HTTPStatus.CONFLICT),
+        (1, Decimal('100'), HTTPStatus.CONFLICT),
+        (1, Decimal('3'), HTTPStatus.OK),
+        (1, Decimal('20'), HTTPStatus.OK),
     ],
     ids=[
         'user_do_not_have_such_currency',
@@ -62,7 +49,7 @@ def test_buy_currency(exchange_rate, currency_amount, expected_result):
         'sell_full_amount',
     ],
 )
-def test_sell_currency(currency_to_sell, currency_amount, expected_result):
+def test_sell_currency(currency_id, currency_amount, expected_result):
     with create_session() as session:
         user = User(id=1, name='username')
         session.add(user)
@@ -74,6 +61,161 @@ def test_sell_currency(currency_to_sell, currency_amount, expected_result):
         )
         session.flush()
 
-        response = sell_currency(session, user, currency_to_sell, currency_amount)
+        currency = session.get(Currency, currency_id)
+        response = sell_currency(session, 1, currency, currency_amount)
 
     assert response[1] == expected_result
+
+
+def test_buy_currency_held_by_another_wallet():
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1))
+        session.add(User(id=2, name='otheruser'))
+        session.add(Wallet(id=2, user_id=2))
+        currency = Currency(id=1, name='bitcoin', exchange_rate=Decimal('100'))
+        session.add(currency)
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=2)
+        )
+        session.flush()
+
+        buy_currency(session, 1, currency, Decimal('1'))
+
+    with create_session() as session:
+        assert session.get(CurrencyInWallet, 1).currency_amount == Decimal('20')
+        assert session.get(Wallet, 1).currencies[0].currency_amount == Decimal('1')
+
+
+@pytest.mark.parametrize('trade', [buy_currency, sell_currency], ids=['buy', 'sell'])
+def test_trade_at_changed_rate(trade):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('1000')))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=1)
+        )
+
+    with create_session() as session:
+        currency = session.get(Currency, 1)
+        # the rate is changed after the trade has checked it
+        with create_independent_session() as other_session:
+            other_session.get(Currency, 1).exchange_rate = Decimal('105')
+
+        response = trade(session, 1, currency, Decimal('1'))
+
+    assert response[1] == HTTPStatus.CONFLICT
+    assert 'outdated exchange rate' in response[0].error
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert wallet.balance == Decimal('1000')
+        assert wallet.currencies[0].currency_amount == Decimal('20')
+
+
+@pytest.mark.parametrize(
+    ('currency_amount', 'expected_result', 'bought_amount'),
+    [
+        (Decimal('2'), HTTPStatus.OK, Decimal('17.73584905')),
+        (Decimal('30'), HTTPStatus.CONFLICT, None),
+        (Decimal('0.000000001'), HTTPStatus.CONFLICT, None),
+    ],
+    ids=['success', 'not_enough_currency', 'amount_is_too_small'],
+)
+def test_swap_currency(currency_amount, expected_result, bought_amount):
+    with create_session() as session:
+        user = User(id=1, name='username')
+        session.add(user)
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('0')))
+        bitcoin = Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000'))
+        ethereum = Currency(id=2, name='ethereum', exchange_rate=Decimal('100'))
+        session.add_all((bitcoin, ethereum))
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=1)
+        )
+        session.flush()
+
+        response = swap_currency(session, 1, bitcoin, ethereum, currency_amount)
+
+    assert response[1] == expected_result
+    if bought_amount is not None:
+        data = response[0].data
+        assert isinstance(data, SwapResultModel)
+        assert data.bought_amount == bought_amount
+        with create_session() as session:
+            wallet = session.get(Wallet, 1)
+            holdings = {c.currency_id: c.currency_amount for c in wallet.currencies}
+            assert holdings == {1: Decimal('18'), 2: bought_amount}
+            # only the rounding remainder is left of the proceeds
+            assert Decimal('0') <= wallet.balance < Decimal('0.000001')
+
+
+def test_failed_buy_rolls_back_swap(client, monkeypatch):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('0')))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('1000')))
+        session.add(Currency(id=2, name='ethereum', exchange_rate=Decimal('100')))
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=1)
+        )
+
+    def failing_buy(*_args):
+        return (
+            ResponseModel(status=StatusType.ERROR, error='failed'),
+            HTTPStatus.CONFLICT,
+        )
+
+    monkeypatch.setattr(currency_operations, 'buy_currency', failing_buy)
+    response = client.post(
+        '/swap',
+        json={
+            'user_name': 'username',
+            'from_currency_name': 'bitcoin',
+            'to_currency_name': 'ethereum',
+            'currency_amount': 2,
+            'from_exchange_rate': 1000,
+            'to_exchange_rate': 100,
+        },
+    )
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.get_json()['error'] == 'failed'
+
+    # the sold leg was rolled back with the failed one
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert wallet.balance == Decimal('0')
+        assert wallet.currencies[0].currency_amount == Decimal('20')
+
+
+def test_trades_have_no_read_phase(app):
+    with create_session() as session:
+        user = User(id=1, name='username')
+        session.add(user)
+        session.add(Wallet(id=1, user_id=1))
+        currency = Currency(id=1, name='bitcoin', exchange_rate=Decimal('100'))
+        session.add(currency)
+        session.flush()
+
+        statements = []
+
+        def record(_conn, _cursor, statement, *_args):
+            statements.append(statement.split()[0])
+
+        event.listen(app.db_engine, 'before_cursor_execute', record)
+        try:
+            buy_currency(session, 1, currency, Decimal('2'))
+            sell_currency(session, 1, currency, Decimal('2'))
+            session.flush()
+        finally:
+            event.remove(app.db_engine, 'before_cursor_execute', record)
+
+    # the checks are the conditions of the writes: buy adds the currency to the wallet,
+    # sell of the whole amount removes it
+    assert 'SELECT' not in statements
+    assert statements.count('UPDATE') == 3
+
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert wallet.currencies == []
+        assert wallet.version == 3
@@ -0,0 +1,148 @@
+# pylint: disable=redefined-outer-name
+import gc
+import os
+import tempfile
+import time
+from decimal import Decimal
+from http import HTTPStatus
+from multiprocessing import Process
+
+import pytest
+from flask import url_for
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session as OrmSession
+
+from exchange.database import (
+    RecentWrites,
+    Session,
+    create_read_session,
+    create_session,
+    has_recent_write,
+)
+from exchange.models import Base, Currency, User, Wallet
+
+
+@pytest.fixture()
+def replica_engine(app):
+    db_fd, database_file = tempfile.mkstemp()
+    engine = create_engine(f'sqlite:///{database_file}')
+    Base.metadata.create_all(engine)
+    app.replica_engines = [engine]
+
+    yield engine
+
+    app.replica_engines = []
+    engine.dispose()
+    os.close(db_fd)
+    os.unlink(database_file)
+
+
+def add_user(session, balance):
+    session.add(User(id=1, name='reader'))
+    session.add(Wallet(id=1, user_id=1, balance=balance))
+
+
+def test_read_session_without_replicas_uses_primary(app):
+    with create_read_session() as session:
+        assert session.get_bind() is app.db_engine
+
+
+def test_currencies_are_read_from_primary(client, replica_engine):
+    # the replica lags behind: it has a currency the primary no longer has
+    with OrmSession(replica_engine) as replica:
+        replica.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+        replica.commit()
+
+    # the responses carry the ETag of the current rates, so they mustn't be stale
+    response = client.get('/currency/all')
+    assert response.get_json()['data'] == []
+
+    response = client.get('/currency/all', headers={'Accept': 'application/x-ndjson'})
+    assert response.data == b''
+
+    response = client.get(url_for('view.get_currency_info', currency_name='bitcoin'))
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_user_reads_own_writes_after_trade(client, replica_engine):
+    with create_session() as session:
+        add_user(session, Decimal('1000'))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    # the replica lags behind: it only has the user, and with the old balance
+    with OrmSession(replica_engine) as replica:
+        add_user(replica, Decimal('555'))
+        replica.commit()
+
+    response = client.get(url_for('view.get_user_info', user_name='reader'))
+    assert response.get_json()['data']['wallet']['balance'] == 555.0
+    assert not has_recent_write('reader')
+
+    response = client.post(
+        '/trade',
+        json={
+            'currency_name': 'bitcoin',
+            'user_name': 'reader',
+            'operation': 'buy',
+            'currency_amount': 1,
+            'exchange_rate': 100,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert has_recent_write('reader')
+
+    response = client.get(url_for('view.get_user_info', user_name='reader'))
+    assert response.get_json()['data']['wallet']['balance'] == 894.0
+
+    response = client.get(
+        url_for('history.get_user_operations_info', user_name='reader', limit=5, page=0)
+    )
+    assert len(response.get_json()['data']) == 1
+
+
+def test_recent_writes_are_shared_with_forked_processes():
+    recent_writes = RecentWrites(slots=4096)
+
+    # the write is served by one worker, the read by another
+    process = Process(target=recent_writes.mark, args=('reader', time.monotonic()))
+    process.start()
+    process.join(timeout=5)
+
+    assert recent_writes.written_at('reader') > 0
+
+
+def test_session_is_removed_with_app_context(app):
+    with app.app_context():
+        Session()
+        assert Session.registry.has()
+
+    assert not Session.registry.has()
+
+
+def orm_instances():
+    gc.collect()
+    # by identity: instances of other tests, like parameters, are alive too
+    return {id(obj) for obj in gc.get_objects() if isinstance(obj, Base)}
+
+
+def test_trades_leave_no_instances_behind(client):
+    instances = orm_instances()
+    with create_session() as session:
+        add_user(session, Decimal('1000'))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    for operation in ('buy', 'sell') * 5:
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'bitcoin',
+                'user_name': 'reader',
+                'operation': operation,
+                'currency_amount': 1,
+                'exchange_rate': 100,
+            },
+        )
+        assert response.status_code == HTTPStatus.OK
+        client.get(url_for('view.get_user_info', user_name='reader'))
+
+    assert orm_instances() <= instances
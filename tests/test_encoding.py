@@ -0,0 +1,140 @@
+import gzip
+from collections import OrderedDict
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from flask import url_for
+
+from exchange.database import create_session
+from exchange.encoding import CBOR_MIMETYPE, cbor_dumps, prefers
+from exchange.models import Currency, User, Wallet
+from exchange.models_schema import StatusType
+
+
+# examples from the appendix A of RFC 8949
+@pytest.mark.parametrize(
+    ('value', 'encoded'),
+    [
+        (0, '00'),
+        (23, '17'),
+        (24, '1818'),
+        (1000, '1903e8'),
+        (1000000000000, '1b000000e8d4a51000'),
+        (18446744073709551616, 'c249010000000000000000'),
+        (-1, '20'),
+        (-1000, '3903e7'),
+        (1.1, 'fb3ff199999999999a'),
+        (False, 'f4'),
+        (None, 'f6'),
+        ('IETF', '6449455446'),
+        ('ü', '62c3bc'),
+        ([1, [2, 3]], '8201820203'),
+        ({'a': 1, 'b': [2, 3]}, 'a26161016162820203'),
+        (Decimal('273.15'), 'c48221196ab3'),
+        (Decimal('-0.5'), 'c4822024'),
+        # not from the RFC: the values of enums, subclasses like their bases
+        (True, 'f5'),
+        (StatusType.OK, '626f6b'),
+        (OrderedDict(a=(1,)), 'a161618101'),
+    ],
+)
+def test_cbor_dumps(value, encoded):
+    assert cbor_dumps(value).hex() == encoded
+
+
+def test_cbor_dumps_unknown_type():
+    with pytest.raises(TypeError):
+        cbor_dumps(object())
+
+
+@pytest.mark.parametrize(
+    ('accept', 'expected'),
+    [
+        (CBOR_MIMETYPE, True),
+        (f'application/json;q=0.5, {CBOR_MIMETYPE}', True),
+        (f'application/json, {CBOR_MIMETYPE}', False),
+        (f'application/json, {CBOR_MIMETYPE};q=0.5', False),
+        ('*/*', False),
+        ('application/x-ndjson', False),
+    ],
+)
+def test_prefers(app, accept, expected):
+    with app.test_request_context(headers={'Accept': accept}):
+        assert prefers(CBOR_MIMETYPE) is expected
+
+
+def test_currency_in_cbor(client):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100.5')))
+
+    response = client.get('/currency/all', headers={'Accept': CBOR_MIMETYPE})
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == CBOR_MIMETYPE
+    assert 'Accept' in response.vary
+    # the rate keeps the scale of the column
+    rate = Decimal('100.50000000')
+    assert response.data == cbor_dumps(
+        {
+            'status': 'ok',
+            'data': [{'id': 1, 'name': 'bitcoin', 'exchange_rate': rate}],
+            'error': None,
+        }
+    )
+
+    # the JSON representation has a different tag
+    json_response = client.get('/currency/all')
+    assert json_response.mimetype == 'application/json'
+    assert json_response.get_etag() != response.get_etag()
+
+
+def test_cbor_keeps_status(client):
+    response = client.get(
+        url_for('view.get_user_info', user_name='nobody'),
+        headers={'Accept': CBOR_MIMETYPE},
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.data == cbor_dumps(
+        {'status': 'error', 'data': None, 'error': 'There is no such user!'}
+    )
+
+
+def test_large_responses_are_compressed(client):
+    with create_session() as session:
+        for id_ in range(1, 51):
+            session.add(
+                Currency(id=id_, name=f'currency{id_}', exchange_rate=Decimal('10'))
+            )
+
+    plain = client.get('/currency/all')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.vary
+
+    response = client.get('/currency/all', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+    # the tag is weak, the client gets 304 with the same tag as the compressed body
+    etag, weak = response.get_etag()
+    assert weak
+    assert plain.headers['ETag'] == response.headers['ETag']
+    not_modified = client.get(
+        '/currency/all',
+        headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/"{etag}"'},
+    )
+    assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+    assert not_modified.headers['ETag'] == response.headers['ETag']
+
+
+def test_small_responses_are_not_compressed(client):
+    with create_session() as session:
+        session.add(User(id=1, name='user'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('1000')))
+
+    response = client.get(
+        url_for('view.get_user_info', user_name='user'),
+        headers={'Accept-Encoding': 'gzip'},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,107 @@
+# pylint: disable=redefined-outer-name
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from config import TestConfig
+from exchange import group_commit
+from exchange.database import create_session
+from exchange.group_commit import GroupCommitter
+from exchange.models import Currency, User, Wallet
+
+
+def add_currency(id_):
+    def work(session):
+        if id_ == 3:
+            raise ValueError('broken transaction')
+        session.add(Currency(id=id_, name=f'coin{id_}', exchange_rate=Decimal('1')))
+        return id_
+
+    return work
+
+
+def run_concurrently(committer, works):
+    with ThreadPoolExecutor(len(works)) as executor:
+        futures = [executor.submit(committer.run, work) for work in works]
+    return [future.exception() or future.result() for future in futures]
+
+
+@pytest.fixture()
+def commits(app):
+    commits = []
+
+    def on_commit(_):
+        commits.append(1)
+
+    event.listen(app.db_engine, 'commit', on_commit)
+    yield commits
+    event.remove(app.db_engine, 'commit', on_commit)
+
+
+def test_transactions_share_commit(commits):
+    committer = GroupCommitter(window=0.05, max_size=10)
+
+    results = run_concurrently(committer, [add_currency(i) for i in (1, 2, 4, 5)])
+
+    assert results == [1, 2, 4, 5]
+    assert len(commits) < 4
+    with create_session() as session:
+        assert session.query(Currency).count() == 4
+
+
+def test_failed_transaction_does_not_spoil_others():
+    committer = GroupCommitter(window=0.05, max_size=10)
+
+    results = run_concurrently(committer, [add_currency(i) for i in (1, 2, 3)])
+
+    assert results[:2] == [1, 2]
+    assert isinstance(results[2], ValueError)
+    with create_session() as session:
+        assert session.query(Currency).count() == 2
+
+
+def test_single_failed_transaction():
+    committer = GroupCommitter(window=0, max_size=10)
+
+    with pytest.raises(ValueError):
+        committer.run(add_currency(3))
+
+
+def test_trade_with_group_commit(app, client):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    app.group_committer = GroupCommitter(window=0, max_size=10)
+    try:
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'bitcoin',
+                'user_name': 'username',
+                'operation': 'buy',
+                'currency_amount': 1,
+                'exchange_rate': 100,
+            },
+        )
+    finally:
+        app.group_committer = None
+
+    assert response.status_code == HTTPStatus.OK
+    with create_session() as session:
+        assert session.get(Wallet, 1).balance == Decimal('894')
+
+
+def test_refused_with_wallet_engine():
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    app.config['GROUP_COMMIT_ENABLED'] = True
+    setattr(app, 'wallet_engine', object())
+
+    with pytest.raises(ValueError):
+        group_commit.init_app(app)
@@ -0,0 +1,225 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from flask import Flask
+
+from config import TestConfig
+from exchange.database import create_session
+from exchange.jobs import JOBS, init_app, job
+from exchange.models import (
+    Currency,
+    CurrencyInWallet,
+    CurrencyInWalletSnapshot,
+    CurrencyOperation,
+    CurrencyOperationType,
+    Job,
+    JobStatus,
+    User,
+    Wallet,
+    WalletSnapshot,
+)
+from exchange.snapshots import balance_at, take_snapshot
+
+ADMIN = {'Authorization': 'Bearer admin-token'}
+
+
+def run_job(client, name, **params):
+    response = client.post(
+        '/admin/jobs', json={'name': name, 'params': params}, headers=ADMIN
+    )
+    assert response.status_code == HTTPStatus.ACCEPTED
+    job_id = response.get_json()['data']['id']
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        data = client.get(f'/admin/jobs/{job_id}', headers=ADMIN).get_json()['data']
+        if data['status'] in {'done', 'failed'}:
+            return data
+        time.sleep(0.01)
+    raise TimeoutError(name)
+
+
+@pytest.fixture()
+def wallets(app):
+    """Two wallets with a snapshot, an operation after it and broken tables"""
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('10')))
+        for id_ in (1, 2):
+            session.add(User(id=id_, name=f'user{id_}'))
+            session.add(Wallet(id=id_, user_id=id_, balance=Decimal('1000')))
+        session.flush()
+        take_snapshot(session, 1)
+        take_snapshot(session, 2)
+
+    with create_session() as session:
+        for id_ in (1, 2):
+            session.add(
+                CurrencyOperation(
+                    wallet_id=id_,
+                    currency_id=1,
+                    type=CurrencyOperationType.BUY,
+                    amount=Decimal('2'),
+                    exchange_rate=Decimal('10'),
+                )
+            )
+        session.add(CurrencyInWallet(wallet_id=1, currency_id=1, currency_amount=5))
+
+    app.job_scheduler.chunk_size = 1
+    yield
+    app.job_scheduler.chunk_size = app.config['JOB_CHUNK_SIZE']
+
+
+def test_jobs_need_token(client):
+    assert client.get('/admin/jobs').status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.parametrize(
+    ('name', 'params', 'error'),
+    [
+        ('unknown', {}, 'There is no such job!'),
+        ('vacuum', {'wrong': 1}, "Wrong job params: got an unexpected keyword"),
+    ],
+)
+def test_wrong_job(client, name, params, error):
+    response = client.post(
+        '/admin/jobs', json={'name': name, 'params': params}, headers=ADMIN
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.get_json()['error'].startswith(error)
+
+
+def test_fill_db_job(client):
+    data = run_job(client, 'fill_db')
+    assert data['status'] == 'done'
+
+    with create_session() as session:
+        assert session.query(Currency).count() == 5
+
+    jobs = client.get('/admin/jobs', headers=ADMIN).get_json()['data']
+    assert jobs[0]['id'] == data['id']
+    assert client.get('/admin/jobs/1000', headers=ADMIN).status_code == (
+        HTTPStatus.NOT_FOUND
+    )
+
+
+@pytest.mark.usefixtures('wallets')
+def test_rebuild_holdings_and_balances(client):
+    data = run_job(client, 'rebuild_holdings')
+    assert (data['status'], data['progress'], data['total']) == ('done', 2, 2)
+    assert run_job(client, 'recompute_balances')['status'] == 'done'
+
+    with create_session() as session:
+        holdings = session.query(
+            CurrencyInWallet.wallet_id, CurrencyInWallet.currency_amount
+        ).order_by(CurrencyInWallet.wallet_id)
+        assert holdings.all() == [(1, Decimal('2')), (2, Decimal('2'))]
+        assert [wallet.balance for wallet in session.query(Wallet)] == [
+            Decimal('980'),
+            Decimal('980'),
+        ]
+
+
+@pytest.mark.usefixtures('wallets')
+def test_prune_operations(client):
+    with create_session() as session:
+        take_snapshot(session, 1)
+    with create_session() as session:
+        session.query(CurrencyOperation).update(
+            {CurrencyOperation.created_at: datetime.now() - timedelta(days=10)}
+        )
+
+    data = run_job(client, 'prune_operations', older_than_days=5)
+    assert (data['status'], data['progress'], data['total']) == ('done', 1, 1)
+
+    # the operation of the second wallet is after its last snapshot
+    with create_session() as session:
+        assert [op.wallet_id for op in session.query(CurrencyOperation)] == [2]
+
+    assert run_job(client, 'vacuum')['status'] == 'done'
+
+
+@pytest.mark.usefixtures('wallets')
+def test_prune_deletes_superseded_snapshots(client):
+    # wallet 1: snapshot, buy, snapshot, buy, snapshot, a day apart
+    with create_session() as session:
+        take_snapshot(session, 1)
+        session.add(
+            CurrencyOperation(
+                wallet_id=1,
+                currency_id=1,
+                type=CurrencyOperationType.BUY,
+                amount=Decimal('2'),
+                exchange_rate=Decimal('10'),
+            )
+        )
+    with create_session() as session:
+        take_snapshot(session, 1)
+
+    def days_ago(days):
+        return datetime.now() - timedelta(days=days)
+
+    with create_session() as session:
+        events = [
+            *session.query(WalletSnapshot).filter(WalletSnapshot.wallet_id == 1),
+            *session.query(CurrencyOperation).filter(CurrencyOperation.wallet_id == 1),
+        ]
+        events.sort(key=lambda event: event.created_at)
+        for days, event in zip(range(12, 7, -1), events):
+            event.created_at = days_ago(days)
+
+    # after the first buy, before the second snapshot
+    between = days_ago(10.5)
+    with create_session() as session:
+        first_snapshot = balance_at(session, 1, days_ago(11.5))
+        wallet = balance_at(session, 1, between)
+        assert first_snapshot is not None and wallet is not None
+        assert wallet.balance == first_snapshot.balance - 20
+
+    data = run_job(client, 'prune_operations', older_than_days=5)
+    assert (data['status'], data['progress']) == ('done', 2)
+
+    with create_session() as session:
+        # not the balance of the first snapshot, its operations are gone
+        assert balance_at(session, 1, between) is None
+        assert balance_at(session, 1, days_ago(7)) is not None
+        snapshots = session.query(WalletSnapshot).filter(WalletSnapshot.wallet_id == 1)
+        assert snapshots.count() == 1
+        assert session.query(CurrencyInWalletSnapshot).count() == 1
+
+
+def test_failed_job(client):
+    @job('failing')
+    def failing(_):
+        raise ValueError('Something went wrong')
+
+    try:
+        data = run_job(client, 'failing')
+    finally:
+        del JOBS['failing']
+
+    assert data['status'] == 'failed'
+    assert data['error'] == 'Something went wrong'
+    assert data['finished_at'] is not None
+
+
+def test_interrupted_jobs_are_failed(app):
+    statuses = (JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.DONE)
+    with create_session() as session:
+        for id_, status in enumerate(statuses, 1):
+            session.add(Job(id=id_, name='vacuum', status=status))
+
+    # the app of a restarted server
+    restarted = Flask(__name__)
+    restarted.config.from_object(TestConfig)
+    setattr(restarted, 'db_engine', app.db_engine)
+    init_app(restarted)
+
+    with create_session() as session:
+        assert [(job.status, job.error) for job in session.query(Job)] == [
+            (JobStatus.FAILED, 'interrupted'),
+            (JobStatus.FAILED, 'interrupted'),
+            (JobStatus.DONE, None),
+        ]
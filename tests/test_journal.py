@@ -0,0 +1,38 @@
+# pylint: disable=redefined-outer-name
+from decimal import Decimal
+
+import pytest
+
+from exchange.journal import Journal
+
+
+@pytest.fixture()
+def journal_path(tmp_path):
+    return tmp_path / 'wallets.journal'
+
+
+def test_journal(journal_path):
+    journal = Journal(journal_path, 0)
+    journal.write({'seq': 1})
+    journal.wait_durable(journal.write({'seq': 2}))
+    journal.rotate()
+    journal.wait_durable(journal.write({'seq': 3}))
+    journal.close()
+
+    # a record the process was killed in the middle of
+    with journal_path.open('ab') as file:
+        file.write(b'{"seq": 4')
+
+    assert [record['seq'] for record in journal.records()] == [1, 2, 3]
+
+
+def test_journal_write_failure(journal_path):
+    journal = Journal(journal_path, 0)
+    journal.wait_durable(journal.write({'seq': 1}))
+
+    with pytest.raises(TypeError):
+        journal.write({'seq': 2, 'amount': Decimal('1')})
+    journal.wait_durable(journal.write({'seq': 3}))
+    journal.close()
+
+    assert [record['seq'] for record in journal.records()] == [1, 3]
@@ -0,0 +1,68 @@
+import gc
+import tracemalloc
+from decimal import Decimal
+from http import HTTPStatus
+
+from exchange.database import create_session, remove_session
+from exchange.models import Base, Currency, User, Wallet
+
+USERS = 5
+CURRENCIES = 2
+# one round buys every currency for every user, the next one sells it back
+ROUND = USERS * CURRENCIES
+
+# a leak of a single operation per trade would be several times more
+MAX_GROWTH = 256 * 1024
+MAX_INSTANCES = 10
+
+
+def add_users_and_currencies():
+    with create_session() as session:
+        for id_ in range(1, CURRENCIES + 1):
+            session.add(
+                Currency(id=id_, name=f'currency{id_}', exchange_rate=Decimal('10'))
+            )
+        for id_ in range(1, USERS + 1):
+            session.add(User(id=id_, name=f'user{id_}'))
+            session.add(Wallet(id=id_, user_id=id_, balance=Decimal('1000000')))
+
+
+def trade(client, step):
+    response = client.post(
+        '/trade',
+        json={
+            'currency_name': f'currency{step // USERS % CURRENCIES + 1}',
+            'user_name': f'user{step % USERS + 1}',
+            'operation': 'sell' if step // ROUND % 2 else 'buy',
+            'currency_amount': '1',
+            'exchange_rate': '10',
+        },
+    )
+    assert response.status_code == HTTPStatus.OK, response.get_json()
+
+
+def live_instances():
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, Base))
+
+
+def test_trades_do_not_accumulate_memory(client):
+    add_users_and_currencies()
+    remove_session()
+    # the caches and pools are filled by the first trades
+    for step in range(2 * ROUND):
+        trade(client, step)
+
+    tracemalloc.start()
+    try:
+        gc.collect()
+        before, _ = tracemalloc.get_traced_memory()
+        for step in range(2 * ROUND, 30 * ROUND):
+            trade(client, step)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert after - before < MAX_GROWTH
+    assert live_instances() < MAX_INSTANCES
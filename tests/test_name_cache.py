@@ -0,0 +1,88 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+from sqlalchemy import event
+
+from exchange.database import create_session
+from exchange.models import Currency, User, Wallet
+from exchange.name_cache import LRUCache, cache_user, get_currency, get_user
+
+
+def test_lru_cache():
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.put('first', 1)
+    cache.put('second', 2)
+    assert cache.get('first') == 1
+
+    # "second" is the least recently used one
+    cache.put('third', 3)
+    assert len(cache) == 2
+    assert cache.get('second') is None
+
+    cache.invalidate('first')
+    assert cache.get('first') is None
+    assert cache.get('third') == 3
+
+
+def test_registration_fills_cache(app, client):
+    response = client.post('/user/registration', json={'name': 'cached'})
+    assert response.status_code == HTTPStatus.OK
+
+    user_id = response.get_json()['data']['id']
+    assert app.name_cache.users.get('cached') == (user_id, user_id)
+
+
+def test_stale_entry_is_replaced(app):
+    with create_session() as session:
+        session.add(User(id=1, name='first'))
+        session.add(Wallet(id=1, user_id=1))
+        session.add(User(id=2, name='second'))
+        session.add(Wallet(id=2, user_id=2))
+        session.add(Currency(id=7, name='dogecoin', exchange_rate=Decimal('1')))
+
+    # points to a row with another name now
+    cache_user('second', 1, 1)
+    app.name_cache.currencies.put('dogecoin', 3)
+
+    with create_session() as session:
+        user = get_user(session, 'second')
+        currency = get_currency(session, 'dogecoin')
+        assert user is not None and user.id == 2
+        assert currency is not None and currency.id == 7
+        assert get_user(session, 'nobody') is None
+
+    assert app.name_cache.users.get('second') == (2, 2)
+    assert app.name_cache.currencies.get('dogecoin') == 7
+
+
+def test_trade_does_not_load_wallet(app, client):
+    with create_session() as session:
+        session.add(User(id=1, name='trader'))
+        session.add(Wallet(id=1, user_id=1))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+    cache_user('trader', 1, 1)
+
+    selects = []
+
+    def record(_conn, _cursor, statement, *_args):
+        if statement.startswith('SELECT'):
+            selects.append(statement)
+
+    event.listen(app.db_engine, 'before_cursor_execute', record)
+    try:
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'bitcoin',
+                'user_name': 'trader',
+                'operation': 'buy',
+                'currency_amount': 1,
+                'exchange_rate': 100,
+            },
+        )
+    finally:
+        event.remove(app.db_engine, 'before_cursor_execute', record)
+
+    assert response.status_code == HTTPStatus.OK
+    # the user is checked by its cached id, the wallet id comes from the cache
+    assert not [select for select in selects if 'FROM wallet' in select]
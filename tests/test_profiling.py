@@ -0,0 +1,87 @@
+import threading
+from http import HTTPStatus
+
+from exchange.profiling import _profile_lock, sample_stacks, to_collapsed, to_speedscope
+
+ADMIN = {'Authorization': 'Bearer admin-token'}
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sample_stacks():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,))
+    thread.start()
+    try:
+        stacks = sample_stacks(0.05, 0.001)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert any(name == 'busy_loop' for stack in stacks for name, _, _ in stack)
+    # the sampling thread itself is not in the profile
+    assert not any(name == 'sample_stacks' for stack in stacks for name, _, _ in stack)
+
+    collapsed = to_collapsed(stacks)
+    assert 'busy_loop (' in collapsed
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed.splitlines())
+
+    speedscope = to_speedscope(stacks, 0.001)
+    frames = speedscope['shared']['frames']
+    profile = speedscope['profiles'][0]
+    assert len(profile['samples']) == len(profile['weights']) == len(stacks)
+    assert all(index < len(frames) for sample in profile['samples'] for index in sample)
+
+
+def test_debug_endpoints_need_token(client):
+    assert client.get('/debug/routes').status_code == HTTPStatus.UNAUTHORIZED
+    response = client.get(
+        '/debug/profile', headers={'Authorization': 'Bearer wrong-token'}
+    )
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.get_json()['error'] == 'Authentication required'
+
+    # the caller is checked before the parameters
+    response = client.get('/debug/profile?seconds=abc')
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_profile(client):
+    response = client.get('/debug/profile?seconds=0.02', headers=ADMIN)
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == 'text/plain'
+
+    response = client.get(
+        '/debug/profile?seconds=0.02&format=speedscope', headers=ADMIN
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json()['profiles'][0]['type'] == 'sampled'
+
+    response = client.get('/debug/profile?seconds=3600', headers=ADMIN)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_one_profile_at_a_time(client):
+    with _profile_lock:
+        response = client.get('/debug/profile?seconds=0.02', headers=ADMIN)
+    assert response.status_code == HTTPStatus.CONFLICT
+
+    # released after the rejected request too
+    response = client.get('/debug/profile?seconds=0.02', headers=ADMIN)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_route_timings(client):
+    client.get('/currency/all')
+    client.get('/currency/all')
+
+    response = client.get('/debug/routes', headers=ADMIN)
+    assert response.status_code == HTTPStatus.OK
+    timings = {t['endpoint']: t for t in response.get_json()['data']}
+    assert timings['view.get_all_currencies']['count'] >= 2
+    assert timings['view.get_all_currencies']['max_ms'] > 0
+    # only the routes of the exchange itself are timed
+    assert not any(endpoint.startswith('debug.') for endpoint in timings)
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from exchange.database import create_session
+from exchange.models import Currency
+from exchange.quotes import CommissionSchedule, get_quote, get_quote_table
+from exchange.rate_changer import RateChanger
+from exchange.rate_version import bump_rate_version, get_rate_version
+
+
+def test_commission_schedule():
+    schedule = CommissionSchedule(
+        Decimal('0.06'),
+        {'bitcoin': Decimal('0.01')},
+        ((Decimal('100'), Decimal('0.04')), (Decimal('1000'), Decimal('0.02'))),
+    )
+
+    assert schedule.commission('bitcoin', Decimal('5000')) == Decimal('0.01')
+    assert schedule.commission('ethereum', Decimal('5000')) == Decimal('0.02')
+    assert schedule.commission('ethereum', Decimal('500')) == Decimal('0.04')
+    assert schedule.commission('ethereum', Decimal('50')) == Decimal('0.06')
+
+    quote = schedule.quote(1, 'ethereum', Decimal('50'))
+    assert quote.buying_rate == Decimal('53')
+    assert quote.selling_rate == Decimal('47')
+
+
+def test_tick_builds_quote_table(app):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    RateChanger(0, 5, 6, app.commission_schedule).tick()
+
+    table = get_quote_table()
+    assert table.version == get_rate_version()
+    assert table.quotes[1].exchange_rate == Decimal('105')
+    assert table.quotes[1].buying_rate == Decimal('111.3')
+
+
+def test_stale_quote_is_not_used():
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+    bump_rate_version()
+    assert get_quote_table().quotes[1].exchange_rate == Decimal('100')
+
+    # changed without a new version, e.g. right after the table was built
+    with create_session() as session:
+        currency = session.get(Currency, 1)
+        currency.exchange_rate = Decimal('200')
+        assert get_quote(currency).buying_rate == Decimal('212')
+
+
+def test_get_extended_currencies(client):
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+        session.add(Currency(id=2, name='ethereum', exchange_rate=Decimal('50')))
+    bump_rate_version()
+
+    assert client.get('/currency/all?extended=true').get_json()['data'] == [
+        {
+            'id': 1,
+            'name': 'bitcoin',
+            'exchange_rate': 100.0,
+            'buying_rate': 106.0,
+            'selling_rate': 94.0,
+        },
+        {
+            'id': 2,
+            'name': 'ethereum',
+            'exchange_rate': 50.0,
+            'buying_rate': 53.0,
+            'selling_rate': 47.0,
+        },
+    ]
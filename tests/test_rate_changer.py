@@ -0,0 +1,147 @@
+import sys
+import time
+from decimal import Decimal
+from http import HTTPStatus
+from multiprocessing import Process
+
+from exchange.database import Session, create_session
+from exchange.models import Currency
+from exchange.rate_changer import RateChanger, create_rate_changer
+from exchange.rate_version import get_rate_version
+
+ADMIN = {'Authorization': 'Bearer admin-token'}
+
+
+def test_tick_changes_rates_and_version():
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+
+    version = get_rate_version()
+    RateChanger(sleep_time=0, changer_lower_bound=5, changer_upper_bound=6).tick()
+
+    with create_session() as session:
+        assert session.get(Currency, 1).exchange_rate == Decimal('105')
+    assert get_rate_version() == version + 1
+
+
+def test_failed_tick_is_logged(monkeypatch, caplog):
+    changer = RateChanger(sleep_time=0, changer_lower_bound=5, changer_upper_bound=6)
+    calls: list[None] = []
+
+    def tick():
+        Session()
+        calls.append(None)
+        if len(calls) == 2:
+            changer.stop()
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(changer, 'tick', tick)
+    changer.run()
+
+    # the changer goes on after a failed tick
+    assert len(calls) == 2
+    assert changer.stats.failed_ticks == 2
+    assert 'A tick of the rate changer failed' in caplog.text
+    assert not Session.registry.has()
+
+
+def run_ticks(monkeypatch, sleep_time, tick_time, ticks):
+    """Runs a changer whose ticks take `tick_time`, returns it and when they started"""
+    changer = RateChanger(sleep_time, changer_lower_bound=5, changer_upper_bound=6)
+    started = []
+
+    def tick():
+        started.append(time.monotonic())
+        time.sleep(tick_time)
+        if len(started) == ticks:
+            changer.stop()
+
+    monkeypatch.setattr(changer, 'tick', tick)
+    changer.start()
+    changer.join(timeout=5)
+    assert not changer.is_alive()
+    return changer, started
+
+
+def test_ticks_do_not_drift(monkeypatch):
+    changer, started = run_ticks(monkeypatch, sleep_time=0.05, tick_time=0.03, ticks=6)
+
+    # sleeping a period after every tick would take 5 * 0.08 seconds
+    assert started[-1] - started[0] < 5 * 0.05 + 0.07
+    assert changer.stats.ticks == 6
+    assert changer.stats.overruns == 0
+
+
+def test_long_ticks_skip_deadlines(monkeypatch):
+    changer, started = run_ticks(monkeypatch, sleep_time=0.02, tick_time=0.05, ticks=3)
+
+    # every tick runs past two deadlines, they are skipped instead of run late
+    assert changer.stats.overruns >= 4
+    assert started[-1] - started[0] >= 2 * 0.05
+
+
+def test_pause_and_stop(monkeypatch):
+    changer = RateChanger(sleep_time=0.01, changer_lower_bound=5, changer_upper_bound=6)
+    monkeypatch.setattr(changer, 'tick', lambda: None)
+    assert changer.daemon
+
+    changer.pause()
+    changer.start()
+    time.sleep(0.05)
+    assert changer.stats.ticks == 0
+
+    changer.resume()
+    deadline = time.monotonic() + 5
+    while changer.stats.ticks == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert changer.stats.ticks > 0
+
+    # also while paused
+    changer.pause()
+    changer.stop()
+    changer.join(timeout=5)
+    assert not changer.is_alive()
+
+
+def test_rate_changer_admin(app, client, monkeypatch):
+    response = client.get('/admin/rate_changer', headers=ADMIN)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    monkeypatch.setitem(app.config, 'IS_RATE_CHANGER', True)
+    response = client.post('/admin/rate_changer/pause', headers=ADMIN)
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json()['data']['paused']
+
+    response = client.post('/admin/rate_changer/resume', headers=ADMIN)
+    assert not response.get_json()['data']['paused']
+
+    response = client.get('/admin/rate_changer', headers=ADMIN)
+    assert response.get_json()['data'] == {
+        'paused': False,
+        'ticks': 0,
+        'overruns': 0,
+        'failed_ticks': 0,
+        'last_lag_ms': 0.0,
+        'max_lag_ms': 0.0,
+        'mean_lag_ms': 0.0,
+    }
+
+
+def test_rate_changer_state_is_shared_with_forked_processes(app):
+    # the one of the app is created before the workers are forked
+    assert create_rate_changer(app).state is app.rate_changer_state
+
+    changer = RateChanger(0.01, changer_lower_bound=5, changer_upper_bound=6)
+    state = changer.state
+
+    # a worker of the multi-process server pauses the changer of another process
+    process = Process(target=state.pause)
+    process.start()
+    process.join(timeout=5)
+
+    assert changer.paused
+    changer.stats.add(0.5)
+    process = Process(target=lambda: sys.exit(state.stats.ticks))
+    process.start()
+    process.join(timeout=5)
+    assert process.exitcode == 1
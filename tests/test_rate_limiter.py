@@ -0,0 +1,51 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+
+from exchange.rate_limiter import SharedTokenBucketLimiter, TokenBucketLimiter
+
+
+@pytest.mark.parametrize(
+    'limiter',
+    [TokenBucketLimiter(2, 3), SharedTokenBucketLimiter(2, 3, slots=8)],
+    ids=['memory', 'shared'],
+)
+def test_token_bucket(limiter):
+    # the burst is allowed, then tokens come back at the given rate
+    assert [limiter.acquire('key', now=10) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('key', now=10) == pytest.approx(0.5)
+    assert limiter.acquire('key', now=10.5) == 0
+    assert limiter.acquire('other', now=10.5) == 0
+
+
+def test_idle_keys_are_evicted():
+    limiter = TokenBucketLimiter(1, 2)
+    limiter.acquire('first', now=1)
+    limiter.acquire('second', now=2)
+    assert len(limiter) == 2
+
+    # "first" has been idle long enough for its bucket to refill
+    limiter.acquire('second', now=3.5)
+    assert len(limiter) == 1
+
+
+def test_trade_is_rate_limited(app, client):
+    app.user_rate_limiter = TokenBucketLimiter(1, 1)
+    trade = {
+        'currency_name': 'bitcoin',
+        'user_name': 'username',
+        'operation': 'buy',
+        'currency_amount': Decimal('1'),
+        'exchange_rate': Decimal('100'),
+    }
+
+    try:
+        assert client.post('/trade', json=trade).status_code == HTTPStatus.NOT_FOUND
+        response = client.post('/trade', json=trade)
+    finally:
+        app.user_rate_limiter = None
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['error'] == 'Too many requests, please slow down.'
@@ -0,0 +1,93 @@
+# pylint: disable=redefined-outer-name
+import os
+
+import click
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from config import TestConfig
+from exchange import start_rate_changer
+from exchange.rate_limiter import SharedTokenBucketLimiter
+from exchange.server import (
+    RESTART_DELAY_MAX,
+    RESTART_DELAY_MIN,
+    fork,
+    prepare_app,
+    reset_after_fork,
+    restart_delay,
+)
+
+
+@pytest.fixture()
+def bare_app():
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND='memory')
+    setattr(app, 'wallet_engine', None)
+    app.before_first_request_funcs.append(start_rate_changer)
+    return app
+
+
+def test_prepare_app(bare_app):
+    prepare_app(bare_app, workers=4)
+
+    assert start_rate_changer not in bare_app.before_first_request_funcs
+    assert isinstance(bare_app.user_rate_limiter, SharedTokenBucketLimiter)
+    assert isinstance(bare_app.ip_rate_limiter, SharedTokenBucketLimiter)
+
+
+def test_memory_wallet_engine_needs_one_worker(bare_app):
+    bare_app.wallet_engine = object()
+
+    with pytest.raises(click.UsageError):
+        prepare_app(bare_app, workers=2)
+    prepare_app(bare_app, workers=1)
+
+
+def test_fork():
+    assert os.waitpid(fork(lambda: None), 0)[1] == 0
+    # an exception in the child doesn't get into the code of the parent
+    assert os.WEXITSTATUS(os.waitpid(fork(lambda: 1 / 0), 0)[1]) == 1
+
+
+def test_reset_after_fork(tmp_path):
+    app = Flask(__name__)
+    db_engine = create_engine(f'sqlite:///{tmp_path / "db"}', poolclass=QueuePool)
+    replica_engines = [
+        create_engine(f'sqlite:///{tmp_path / "replica"}', poolclass=QueuePool)
+    ]
+    setattr(app, 'db_engine', db_engine)
+    setattr(app, 'replica_engines', replica_engines)
+    engines = [db_engine, *replica_engines]
+    pools = [engine.pool for engine in engines]
+    # pooled connections, as the parent leaves them
+    inherited = []
+    for engine in engines:
+        with engine.connect() as connection:
+            inherited.append(connection.connection.dbapi_connection)
+
+    reset_after_fork(app)
+
+    for engine, pool, dbapi_connection in zip(engines, pools, inherited):
+        assert engine.pool is not pool
+        assert engine.pool.checkedin() == 0
+        # still open for the parent
+        assert dbapi_connection.execute('SELECT 1').fetchone() == (1,)
+        with engine.connect() as connection:
+            assert connection.connection.dbapi_connection is not dbapi_connection
+
+
+@pytest.mark.parametrize(
+    ('previous', 'uptime', 'expected'),
+    [
+        (0.0, 60.0, 0.0),
+        (0.0, 1.0, RESTART_DELAY_MIN),
+        (1.0, 1.0, 2.0),
+        (RESTART_DELAY_MAX, 1.0, RESTART_DELAY_MAX),
+        (RESTART_DELAY_MAX, 60.0, 0.0),
+    ],
+)
+def test_restart_delay(previous, uptime, expected):
+    assert restart_delay(previous, uptime) == expected
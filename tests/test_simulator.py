@@ -0,0 +1,30 @@
+from exchange.models import Base
+from exchange.simulator import ScenarioModel, Simulator, TraderGroupModel
+
+SCENARIO = ScenarioModel(
+    currency_count=3,
+    duration=100,
+    tick_interval=10,
+    traders=[TraderGroupModel(count=3, trade_probability=0.5)],
+)
+
+
+def simulate(app, seed):
+    report = Simulator(app, SCENARIO, seed).run()
+    # every run starts from an empty database
+    Base.metadata.drop_all(app.db_engine)
+    Base.metadata.create_all(app.db_engine)
+    return report
+
+
+def test_simulation_is_reproducible(app):
+    first = simulate(app, seed=1)
+    second = simulate(app, seed=1)
+    other = simulate(app, seed=2)
+
+    assert first.ticks == 10
+    assert first.latency['trade'].count > 0
+    assert first.requests == second.requests
+    assert first.statuses == second.statuses
+    assert first.rates_digest == second.rates_digest
+    assert first.rates_digest != other.rates_digest
@@ -0,0 +1,107 @@
+from datetime import datetime
+from decimal import Decimal
+from http import HTTPStatus
+
+from flask import url_for
+
+from exchange.database import create_session
+from exchange.models import (
+    Currency,
+    CurrencyInWallet,
+    CurrencyOperation,
+    CurrencyOperationType,
+    User,
+    Wallet,
+    WalletSnapshot,
+)
+from exchange.snapshots import snapshot_wallets, take_snapshot
+
+
+def operation(id_, type_, amount, rate, created_at):
+    return CurrencyOperation(
+        id=id_,
+        currency_id=1,
+        wallet_id=1,
+        type=type_,
+        amount=Decimal(amount),
+        exchange_rate=Decimal(rate),
+        created_at=created_at,
+    )
+
+
+def test_take_snapshot():
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('500')))
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=20, currency_id=1, wallet_id=1)
+        )
+        session.add(operation(7, CurrencyOperationType.BUY, '20', '25', datetime.now()))
+
+    with create_session() as session:
+        take_snapshot(session, 1)
+
+    with create_session() as session:
+        snapshot = session.query(WalletSnapshot).one()
+        assert snapshot.operation_id == 7
+        assert snapshot.balance == Decimal('500')
+        assert [(c.currency_id, c.currency_amount) for c in snapshot.currencies] == [
+            (1, Decimal('20'))
+        ]
+
+
+def test_snapshot_wallets_every_n_operations():
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1))
+        for id_ in range(1, 4):
+            session.add(
+                operation(id_, CurrencyOperationType.BUY, '1', '1', datetime.now())
+            )
+
+    assert snapshot_wallets(every=4) == 0
+    assert snapshot_wallets(every=3) == 1
+    # all the operations are covered by the snapshot now
+    assert snapshot_wallets(every=1) == 0
+
+
+def test_get_user_balance_at(client):
+    client.post('/user/registration', json={'name': 'username'})
+    registered = datetime.now()
+
+    with create_session() as session:
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+        session.add(
+            operation(1, CurrencyOperationType.BUY, '2', '106', datetime(2100, 1, 1))
+        )
+        session.add(
+            operation(2, CurrencyOperationType.SELL, '0.5', '94', datetime(2100, 1, 2))
+        )
+
+    def balance_at(moment):
+        return client.get(
+            url_for('history.get_user_balance_at', user_name='username', at=moment)
+        )
+
+    assert balance_at(datetime(2000, 1, 1)).status_code == HTTPStatus.NOT_FOUND
+    assert balance_at(registered).get_json()['data'] == {
+        'balance': 1000.0,
+        'currencies': [],
+    }
+    assert balance_at(datetime(2100, 1, 1, 12)).get_json()['data'] == {
+        'balance': 788.0,
+        'currencies': [{'currency_id': 1, 'currency_amount': 2.0}],
+    }
+    assert balance_at(datetime(2100, 1, 3)).get_json()['data'] == {
+        'balance': 835.0,
+        'currencies': [{'currency_id': 1, 'currency_amount': 1.5}],
+    }
+
+
+def test_get_user_balance_at_error(client):
+    response = client.get(
+        url_for('history.get_user_balance_at', user_name='username', at=datetime.now())
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.get_json()['error'] == 'There is no such user!'
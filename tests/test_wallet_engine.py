@@ -0,0 +1,289 @@
+# pylint: disable=redefined-outer-name
+import json
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import event
+
+from exchange.database import create_session
+from exchange.journal import Journal
+from exchange.models import (
+    Currency,
+    CurrencyInWallet,
+    CurrencyOperation,
+    CurrencyOperationType,
+    JournalCheckpoint,
+    User,
+    Wallet,
+)
+from exchange.rate_version import bump_rate_version, get_rate_version
+from exchange.wallet_engine import InMemoryWalletEngine
+from exchange.wallet_state import Leg
+
+BUY = CurrencyOperationType.BUY
+SELL = CurrencyOperationType.SELL
+
+
+@pytest.fixture()
+def journal_path(tmp_path):
+    return tmp_path / 'wallets.journal'
+
+
+@pytest.fixture()
+def engine(app, journal_path):
+    with create_session() as session:
+        session.add(User(id=1, name='username'))
+        session.add(Wallet(id=1, user_id=1, balance=Decimal('1000')))
+        session.add(Currency(id=1, name='bitcoin', exchange_rate=Decimal('100')))
+        session.add(Currency(id=2, name='ethereum', exchange_rate=Decimal('10')))
+    # as if added by the endpoint, which makes the quote table be built again
+    bump_rate_version()
+
+    engine = InMemoryWalletEngine(Journal(journal_path, 0), compact_every=100)
+    app.wallet_engine = engine
+
+    yield engine
+
+    app.wallet_engine = None
+    engine.wait_compacted()
+    engine.journal.close()
+
+
+@pytest.mark.parametrize(
+    ('legs', 'expected_result', 'balance', 'holdings'),
+    [
+        ([Leg(BUY, 1, Decimal('2'), Decimal('100'))], HTTPStatus.OK, 800, {1: 2}),
+        ([Leg(BUY, 1, Decimal('20'), Decimal('100'))], HTTPStatus.CONFLICT, 1000, {}),
+        ([Leg(SELL, 1, Decimal('1'), Decimal('100'))], HTTPStatus.CONFLICT, 1000, {}),
+        (
+            [
+                Leg(BUY, 1, Decimal('2'), Decimal('100')),
+                Leg(SELL, 1, Decimal('2'), Decimal('90')),
+            ],
+            HTTPStatus.OK,
+            980,
+            {},
+        ),
+        (
+            [
+                Leg(BUY, 1, Decimal('2'), Decimal('100')),
+                Leg(SELL, 1, Decimal('3'), Decimal('90')),
+            ],
+            HTTPStatus.CONFLICT,
+            1000,
+            {},
+        ),
+    ],
+    ids=[
+        'buy',
+        'not_enough_money',
+        'no_such_currency',
+        'buy_and_sell',
+        'all_or_nothing',
+    ],
+)
+def test_execute(engine, legs, expected_result, balance, holdings):
+    response = engine.execute(1, legs, get_rate_version())
+
+    assert response[1] == expected_result
+    wallet = engine.wallet_model(1)
+    assert wallet.balance == balance
+    assert {c.currency_id: c.currency_amount for c in wallet.currencies} == holdings
+
+
+def test_outdated_rates_are_not_traded(engine):
+    rate_version = get_rate_version()
+    bump_rate_version()
+
+    response = engine.execute(
+        1, [Leg(BUY, 1, Decimal('2'), Decimal('100'))], rate_version
+    )
+
+    assert response[1] == HTTPStatus.CONFLICT
+    assert engine.wallet_model(1).balance == Decimal('1000')
+    assert not list(engine.journal.records())
+
+
+def test_trade_is_one_record(engine, journal_path):
+    engine.execute(
+        1,
+        [
+            Leg(BUY, 1, Decimal('2'), Decimal('100')),
+            Leg(SELL, 1, Decimal('2'), Decimal('90')),
+        ],
+        get_rate_version(),
+    )
+
+    # a crash can't leave half of a swap in the journal
+    lines = journal_path.read_bytes().splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record['seq'] == 1
+    assert [leg['type'] for leg in record['legs']] == ['buy', 'sell']
+
+
+def test_failed_write_is_not_applied(engine, monkeypatch):
+    def fail(_record):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(engine.journal, 'write', fail)
+    with pytest.raises(OSError):
+        engine.execute(
+            1, [Leg(BUY, 1, Decimal('2'), Decimal('100'))], get_rate_version()
+        )
+
+    monkeypatch.undo()
+    assert engine.wallet_model(1).balance == Decimal('1000')
+    engine.execute(1, [Leg(BUY, 1, Decimal('1'), Decimal('100'))], get_rate_version())
+    assert [record['seq'] for record in engine.journal.records()] == [1]
+
+
+def test_state_is_replayed_and_compacted(engine, journal_path):
+    engine.execute(1, [Leg(BUY, 1, Decimal('2'), Decimal('100'))], get_rate_version())
+    engine.execute(1, [Leg(BUY, 2, Decimal('3'), Decimal('10'))], get_rate_version())
+    engine.journal.close()
+
+    # the tables haven't been touched, the new engine replays the journal
+    with create_session() as session:
+        assert session.get(Wallet, 1).balance == Decimal('1000')
+
+    restarted = InMemoryWalletEngine(Journal(journal_path, 0), compact_every=3)
+    assert restarted.wallet_model(1).balance == Decimal('770')
+
+    # the third record triggers the compaction, in the background
+    restarted.execute(
+        1, [Leg(SELL, 1, Decimal('2'), Decimal('100'))], get_rate_version()
+    )
+    restarted.wait_compacted()
+
+    with create_session() as session:
+        wallet = session.get(Wallet, 1)
+        assert wallet.balance == Decimal('970')
+        assert [(c.currency_id, c.currency_amount) for c in wallet.currencies] == [
+            (2, Decimal('3'))
+        ]
+        assert session.query(CurrencyOperation).count() == 3
+        assert session.get(JournalCheckpoint, JournalCheckpoint.ID).seq == 3
+    assert not list(restarted.journal.records())
+    restarted.journal.close()
+
+    # nothing is applied twice after the compaction
+    reloaded = InMemoryWalletEngine(Journal(journal_path, 0), compact_every=3)
+    assert reloaded.wallet_model(1).balance == Decimal('970')
+
+
+def test_failed_compaction_is_logged(engine, monkeypatch, caplog):
+    def fail():
+        raise OSError('disk I/O error')
+
+    monkeypatch.setattr(engine, 'compact', fail)
+    engine.compact_every = 1
+    engine.execute(1, [Leg(BUY, 1, Decimal('2'), Decimal('100'))], get_rate_version())
+    engine.wait_compacted()
+
+    assert 'Compaction of the wallet journal failed' in caplog.text
+    # the trade itself is made
+    assert engine.wallet_model(1).balance == Decimal('800')
+
+
+@pytest.mark.usefixtures('engine')
+def test_trade_and_swap_with_engine(client):
+    with create_session() as session:
+        session.add(
+            CurrencyInWallet(id=1, currency_amount=5, currency_id=1, wallet_id=1)
+        )
+
+    response = client.post(
+        '/trade',
+        json={
+            'currency_name': 'bitcoin',
+            'user_name': 'username',
+            'operation': 'sell',
+            'currency_amount': 1,
+            'exchange_rate': 100,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.post(
+        '/swap',
+        json={
+            'user_name': 'username',
+            'from_currency_name': 'bitcoin',
+            'to_currency_name': 'ethereum',
+            'currency_amount': 1,
+            'from_exchange_rate': 100,
+            'to_exchange_rate': 10,
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    wallet = client.get('/user/username').get_json()['data']['wallet']
+    assert wallet['balance'] == pytest.approx(1094)
+    assert wallet['currencies'] == [
+        {'currency_id': 1, 'currency_amount': 3.0},
+        {'currency_id': 2, 'currency_amount': 8.86792452},
+    ]
+
+
+def test_trade_with_engine_only_reads(app, client, engine):
+    statements = []
+
+    def record(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(app.db_engine, 'before_cursor_execute', record)
+    try:
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'bitcoin',
+                'user_name': 'username',
+                'operation': 'buy',
+                'currency_amount': 1,
+                'exchange_rate': 100,
+            },
+        )
+    finally:
+        event.remove(app.db_engine, 'before_cursor_execute', record)
+
+    assert response.status_code == HTTPStatus.OK
+    assert statements
+    assert all(statement.startswith('SELECT') for statement in statements)
+    assert engine.wallet_model(1).balance < Decimal('1000')
+
+
+def test_history_includes_trades_not_compacted(client, engine):
+    engine.execute(1, [Leg(BUY, 1, Decimal('2'), Decimal('100'))], get_rate_version())
+
+    response = client.get(
+        '/user/username/operations', query_string={'limit': 10, 'page': 0}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [op['currency_id'] for op in response.get_json()['data']] == [1]
+    assert not list(engine.journal.records())
+
+
+def test_compaction_during_trades(client, engine):
+    # every trade is compacted, while its request still holds the database
+    engine.compact_every = 1
+    for operation in ('buy', 'sell', 'buy'):
+        response = client.post(
+            '/trade',
+            json={
+                'currency_name': 'bitcoin',
+                'user_name': 'username',
+                'operation': operation,
+                'currency_amount': 1,
+                'exchange_rate': 100,
+            },
+        )
+        assert response.status_code == HTTPStatus.OK
+        engine.wait_compacted()
+
+    with create_session() as session:
+        assert session.query(CurrencyOperation).count() == 3
+        assert session.get(Wallet, 1).balance == engine.wallet_model(1).balance
+    assert not list(engine.journal.records())